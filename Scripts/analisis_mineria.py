@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import os, sqlite3, itertools
+import os, itertools, argparse
 import pandas as pd
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 from sklearn.feature_extraction.text import TfidfVectorizer
 
+from cubos import enrutar_sql
+from cache_sql import leer_sql, imprimir_estadisticas
+from conexiones import conexion_lectura, imprimir_conexiones
+import medicion_consultas
+from medicion_consultas import medir_consulta, llamador, imprimir_mediciones
+
 DB = "salud_federada.db"
 OUT_DIR = "docs/analisis"
 FIG_DIR = "docs/figuras"
@@ -15,10 +21,10 @@ os.makedirs(FIG_DIR, exist_ok=True)
 
 # ---------- Utilidades ----------
 def q(sql, params=None):
-    con = sqlite3.connect(DB)
-    df = pd.read_sql_query(sql, con, params=params or [])
-    con.close()
-    return df
+    with conexion_lectura(DB) as con:   # del pool de solo lectura (conexiones.py)
+        sql_final = enrutar_sql(sql, con)
+        return medir_consulta(con, sql_final, lambda: leer_sql(sql_final, con, params),
+                              params, etiqueta=llamador())
 
 def guardar_tabla(df, nombre):
     ruta = os.path.join(OUT_DIR, nombre)
@@ -238,6 +244,16 @@ def reporte_md(figs, corr, inc, cent, tfidf_df, pct_multi, pron):
     return ruta_md
 
 def main():
+    global DB
+    ap = argparse.ArgumentParser(description="Análisis y minería: correlaciones, grafo, texto y pronóstico.")
+    ap.add_argument("--db", type=str, default=DB,
+                    help="Base a consultar: SQLite o la copia DuckDB (salud_federada.duckdb)")
+    ap.add_argument("--umbral-lento", type=float, default=medicion_consultas.UMBRAL_LENTA_MS,
+                    help="ms desde los que una consulta va a docs/perf/consultas_lentas.jsonl con su plan")
+    args = ap.parse_args()
+    DB = args.db
+    medicion_consultas.UMBRAL_LENTA_MS = args.umbral_lento
+
     cor = correlaciones()
     inc = tendencias_incrementos()
     cent, pairs = analisis_grafo()
@@ -245,6 +261,9 @@ def main():
     figs = figuras_clave()
     pron = pronostico_f10()
     md = reporte_md(figs, cor, inc, cent, tfidf_df, pct_multi, pron)
+    imprimir_estadisticas()
+    imprimir_conexiones()
+    imprimir_mediciones()
     print(f"[OK] Reporte: {md}")
 
 if __name__ == "__main__":
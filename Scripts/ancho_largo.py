@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ancho_largo.py
+Motor vectorizado ancho (F10..F19) → largo (cie10_code, valor) para las
+tablas de hechos.
+
+En lugar de DataFrame.melt sobre columnas object + astype(str).str...
+fila por fila:
+- El bloque F10..F19 se toma como UN arreglo NumPy 2-D (n filas × k códigos)
+  y se aplana en orden de columnas (mismo orden que melt)
+- Las dimensiones (entidad, edad, sexo, ...) se convierten a category UNA vez
+  sobre la tabla ancha y en el largo solo se repiten sus códigos enteros
+- El año queda como Int16 y cie10_code como category
+- Las normalizaciones de texto (strip/upper) se aplican a los valores
+  DISTINTOS, no a cada fila
+
+Los textos solo se materializan al escribir (to_sql / to_csv decodifican
+las categorías).
+"""
+
+import numpy as np
+import pandas as pd
+
+def es_categoria(ser: pd.Series) -> bool:
+    return isinstance(ser.dtype, pd.CategoricalDtype)
+
+def como_categoria(ser: pd.Series, fn=None) -> pd.Series:
+    """
+    Convierte `ser` a category aplicando `fn` (una transformación de Series,
+    p.ej. lambda s: s.astype(str).str.strip()) sobre los valores distintos.
+    Equivale a aplicar `fn` fila por fila. Categorías en orden lexicográfico
+    para que groupby/sort den el mismo orden que con texto.
+    """
+    if fn is None and es_categoria(ser):
+        return ser
+    codes, uniques = pd.factorize(ser, use_na_sentinel=False)
+    uniques = pd.Series(uniques, dtype=object if fn is not None else None)
+    if fn is not None:
+        uniques = fn(uniques)
+    cats = pd.Index(uniques.dropna().unique())
+    try:
+        cats = cats.sort_values()
+    except TypeError:
+        pass  # tipos mezclados: se conserva el orden de aparición
+    remap = cats.get_indexer(uniques)          # NaN → -1
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories=cats),
+                     index=ser.index, name=ser.name)
+
+def numerico(ser: pd.Series) -> pd.Series:
+    """pd.to_numeric(errors="coerce") que, si `ser` es category, convierte solo las categorías."""
+    if not es_categoria(ser):
+        return pd.to_numeric(ser, errors="coerce")
+    cats = pd.to_numeric(pd.Series(ser.cat.categories), errors="coerce").to_numpy(dtype="float64")
+    codes = ser.cat.codes.to_numpy()
+    return pd.Series(np.where(codes >= 0, cats[codes], np.nan), index=ser.index, name=ser.name)
+
+def anio_int16(ser: pd.Series) -> pd.Series:
+    """Año numérico como Int16 (nullable); si no son enteros, numérico tal cual."""
+    num = pd.to_numeric(ser, errors="coerce")
+    if num.notna().any() and not np.all(np.mod(num.dropna(), 1) == 0):
+        return num
+    return num.astype("Int16")
+
+def bloque_valores(df: pd.DataFrame, fcols: list[str], fill_value=0) -> np.ndarray:
+    """
+    Bloque F10..F19 como arreglo 2-D (n × k). Conversión a numérico con
+    errors="coerce"; si `fill_value` no es None, NaN → fill_value. Conserva
+    int64 cuando todas las columnas son enteras.
+    """
+    cols = [pd.to_numeric(df[c], errors="coerce").to_numpy() for c in fcols]
+    if not cols:
+        return np.empty((len(df), 0))
+    block = np.column_stack(cols)
+    if fill_value is not None and block.dtype.kind == "f":
+        block = np.where(np.isnan(block), fill_value, block)
+    return block
+
+def ancho_a_largo(df: pd.DataFrame, id_cols: list[str], fcols: list[str],
+                  var_name: str = "cie10_code", value_name: str = "valor",
+                  codigos=None, fill_value=0) -> pd.DataFrame:
+    """
+    Equivalente vectorizado de
+        df.melt(id_vars=id_cols, value_vars=fcols, var_name=..., value_name=...)
+    con las dimensiones como category y `var_name` como category cuyas
+    categorías son `codigos` (por defecto los nombres de fcols).
+    """
+    n, k = len(df), len(fcols)
+    filas = np.tile(np.arange(n), k)
+
+    out = {}
+    for c in id_cols:
+        ser = df[c]
+        if ser.dtype == object or pd.api.types.is_string_dtype(ser.dtype):
+            ser = como_categoria(ser)
+        out[c] = ser.take(filas).reset_index(drop=True)
+
+    codigos = list(fcols) if codigos is None else list(codigos)
+    out[var_name] = pd.Categorical.from_codes(np.repeat(np.arange(k), n), categories=codigos)
+    out[value_name] = bloque_valores(df, fcols, fill_value=fill_value).ravel(order="F")
+    return pd.DataFrame(out)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asesor_indices.py
+Asesor de índices para salud_federada.db guiado por la carga de trabajo real.
+
+Los índices de build_base_final.py están fijos (idx_*_keys, idx_txt_code...).
+Este script parte de las consultas que de verdad se ejecutan:
+- Carga de trabajo: docs/perf/registro_consultas.jsonl, que escribe
+  conexiones.py (con REGISTRAR_CONSULTAS=1) con cada SELECT/WITH de consultas_descriptivas,
+  analisis_mineria, consultas_llm, consultas_rag... (SQL distinto = una
+  consulta, con sus repeticiones y los scripts que la usan)
+- Por consulta: EXPLAIN QUERY PLAN y latencia (mejor de REPETICIONES)
+- Candidatos por tabla base del plan, a partir de cómo la consulta usa sus
+  columnas: igualdad (=, IN, JOIN) -> primer rango (BETWEEN, <, >, GLOB) ->
+  GROUP BY / ORDER BY; variante cubriente (más el resto de columnas leídas),
+  variante con GROUP BY / ORDER BY al frente (recorrido ya ordenado, sin
+  B-tree temporal) y variantes PARCIALES (WHERE col LIKE '...' /
+  col IS NOT NULL, que un índice normal no aprovecha)
+- Cada candidato se prueba "en hipótesis": se crea dentro de una
+  transacción, se mira si el plan lo usa y cuánto baja la latencia, y se
+  deshace (ROLLBACK). Se recomienda el mejor por consulta si acelera al
+  menos MEJORA_MINIMA (y AHORRO_MINIMO_MS); si un recomendado es prefijo
+  de otro de la misma tabla, queda solo el más largo
+- Con todos los recomendados juntos se mide antes/después de cada consulta;
+  con --crear se quedan en la base (nombre idx_asesor_*), si no se deshacen
+  (un índice nuevo cambia el plan: las filas empatadas en un ORDER BY pueden
+  salir en otro orden; crear índices también invalida la caché de cache_sql)
+
+Reporte: docs/perf/asesor_indices.md (latencias, DDL y planes).
+
+Uso:
+    python Scripts/asesor_indices.py              # solo propone
+    python Scripts/asesor_indices.py --crear      # crea los índices recomendados
+    python Scripts/asesor_indices.py --quitar     # borra los idx_asesor_*
+"""
+
+import argparse, hashlib, re, sqlite3, time
+from pathlib import Path
+
+from conexiones import leer_registro, REGISTRO_CONSULTAS
+from cache_sql import normalizar_sql
+from cubos import PALABRAS_SQL
+
+ROOT = Path(__file__).resolve().parent.parent
+DB_DEFAULT = ROOT / "salud_federada.db"
+OUT_MD = ROOT / "docs" / "perf" / "asesor_indices.md"
+
+REPETICIONES = 3        # mediciones por consulta (se toma la mejor)
+MEJORA_MINIMA = 1.2     # recomendar solo si acelera al menos 20 %
+AHORRO_MINIMO_MS = 0.5  # ... y ahorra al menos esto por ejecución (evita ruido)
+MAX_COLUMNAS = 6        # tope de columnas por índice
+PREFIJO = "idx_asesor_"
+
+RE_LITERAL = re.compile(r"'(?:[^']|'')*'")
+RE_PLAN_TABLA = re.compile(r"^(?:SCAN|SEARCH) (\w+)")
+RE_FROM = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.I)
+NO_ALIAS = PALABRAS_SQL | {"join", "left", "inner", "outer", "cross", "natural", "on", "using"}
+
+COL = r"(?:(\w+)\.)?(\w+)"
+VAL = r"(?:__lit\d+__|-?\d+(?:\.\d+)?|\?)"
+RE_IGUALDAD = [re.compile(rf"{COL}\s*(?:==?|\bIS\b)\s*{VAL}", re.I),
+               re.compile(rf"{VAL}\s*==?\s*{COL}", re.I),
+               re.compile(rf"{COL}\s+IN\s*\(", re.I)]
+RE_JOIN = re.compile(rf"{COL}\s*=\s*{COL}(?!\s*\()", re.I)
+RE_RANGO = [re.compile(rf"{COL}\s*(?:<=|>=|<|>)\s*{VAL}", re.I),
+            re.compile(rf"{COL}\s+BETWEEN\b", re.I),
+            re.compile(rf"{COL}\s+GLOB\s+__lit\d+__", re.I)]
+RE_ORDEN = re.compile(r"\b(?:GROUP|ORDER)\s+BY\s+(.+?)(?=\bHAVING\b|\bORDER\b|\bLIMIT\b|\)|$)", re.I | re.S)
+RE_PARCIAL = re.compile(r"(?<![\w.])(\w+)\s+(?:LIKE\s+__lit\d+__|IS\s+NOT\s+NULL)", re.I)
+RE_REFERENCIA = re.compile(rf"\b{COL}\b")
+
+# ------------------ Carga de trabajo ------------------
+def cargar_carga(ruta=None) -> list[dict]:
+    """Consultas distintas del registro: {'sql', 'veces', 'scripts'} (más frecuentes primero)."""
+    por_sql = {}
+    for e in leer_registro(ruta):
+        sql = e.get("sql", "").strip().rstrip(";").strip()
+        if not sql:
+            continue
+        d = por_sql.setdefault(normalizar_sql(sql), {"sql": sql, "veces": 0, "scripts": set()})
+        d["veces"] += 1
+        d["scripts"].add(e.get("script", "?"))
+    return sorted(por_sql.values(), key=lambda d: -d["veces"])
+
+# ------------------ Plan y latencia ------------------
+def plan(con, sql) -> list[str]:
+    return [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+def latencia_ms(con, sql) -> float:
+    con.execute(sql).fetchall()   # calentamiento (páginas en caché)
+    mejor = float("inf")
+    for _ in range(REPETICIONES):
+        t0 = time.perf_counter()
+        con.execute(sql).fetchall()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000
+
+# ------------------ Esquema ------------------
+def _objetos(con) -> dict:
+    """nombre -> (tipo, sql) de tablas y vistas."""
+    return {n: (t, s or "") for t, n, s in con.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE type IN ('table','view')")}
+
+def _columnas(con, tabla) -> set:
+    return {r[1] for r in con.execute(f"PRAGMA table_info({tabla})")}
+
+def _indices_existentes(con, tabla) -> list[list[str]]:
+    """Columnas de cada índice NO parcial de la tabla."""
+    out = []
+    for _, nombre, _, _, parcial in con.execute(f"PRAGMA index_list({tabla})"):
+        if not parcial:
+            out.append([r[2] for r in con.execute(f"PRAGMA index_info({nombre})")])
+    return out
+
+def _alias(textos, objetos) -> dict:
+    """alias -> tabla/vista, a partir de FROM/JOIN de la consulta y de las vistas que usa."""
+    alias, pendientes, vistos = {}, list(textos), set()
+    while pendientes:
+        texto = pendientes.pop()
+        for m in RE_FROM.finditer(texto):
+            nombre = m.group(1)
+            if nombre not in objetos:
+                continue
+            alias[nombre] = nombre
+            if m.group(2) and m.group(2).lower() not in NO_ALIAS:
+                alias[m.group(2)] = nombre
+            if objetos[nombre][0] == "view" and nombre not in vistos:
+                vistos.add(nombre)
+                pendientes.append(objetos[nombre][1])
+    return alias
+
+def tablas_del_plan(con, lineas, sql, objetos) -> list[str]:
+    """Tablas base (no virtuales ni internas) que recorre el plan, en orden."""
+    alias = _alias([sql], objetos)
+    out = []
+    for linea in lineas:
+        m = RE_PLAN_TABLA.match(linea)
+        tabla = alias.get(m.group(1), m.group(1)) if m else None
+        if (tabla in objetos and objetos[tabla][0] == "table" and tabla not in out
+                and not tabla.startswith("sqlite_") and "VIRTUAL" not in objetos[tabla][1].upper()):
+            out.append(tabla)
+    return out
+
+# ------------------ Candidatos ------------------
+def _unicos(cols):
+    return list(dict.fromkeys(cols))
+
+def _roles(masked, tabla, columnas, alias) -> dict:
+    """Columnas de `tabla` por uso en la consulta (solo el texto de la consulta, no de las vistas)."""
+    def es_de(q, c):
+        return c in columnas and (q is None or alias.get(q) == tabla)
+
+    def cols(patrones):
+        out = []
+        for rx in patrones:
+            for m in rx.finditer(masked):
+                g = m.groups()
+                out += [g[i + 1] for i in range(0, len(g), 2) if es_de(g[i], g[i + 1])]
+        return out
+
+    orden = []
+    for m in RE_ORDEN.finditer(masked):
+        orden += [c for q, c in RE_REFERENCIA.findall(m.group(1)) if es_de(q or None, c)]
+    return {
+        "igualdad": _unicos(cols(RE_IGUALDAD) + cols([RE_JOIN])),
+        "rango": _unicos(cols(RE_RANGO)),
+        "orden": _unicos(orden),
+        "resto": _unicos(c for q, c in RE_REFERENCIA.findall(masked) if es_de(q or None, c)),
+        "parciales": [m.group(0) for m in RE_PARCIAL.finditer(masked) if m.group(1) in columnas],
+    }
+
+def _ddl(tabla, cols, where=None) -> dict:
+    firma = f"{tabla}({','.join(cols)}){where or ''}"
+    nombre = f"{PREFIJO}{tabla}_{hashlib.sha1(firma.encode('utf-8')).hexdigest()[:8]}"
+    ddl = f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla}({', '.join(cols)})" + (f" WHERE {where}" if where else "")
+    return {"nombre": nombre, "tabla": tabla, "columnas": cols, "where": where, "ddl": ddl}
+
+def candidatos(con, sql, lineas, objetos) -> list[dict]:
+    literales = []
+    def _guardar(m):
+        literales.append(m.group(0))
+        return f"__lit{len(literales) - 1}__"
+    masked = RE_LITERAL.sub(_guardar, sql)
+    restaurar = lambda t: re.sub(r"__lit(\d+)__", lambda x: literales[int(x.group(1))], t)
+    alias = _alias([masked], objetos)
+
+    out = []
+    for tabla in tablas_del_plan(con, lineas, sql, objetos):
+        r = _roles(masked, tabla, _columnas(con, tabla), alias)
+        clave = _unicos(r["igualdad"] + r["rango"][:1] + r["orden"])
+        cubriente = _unicos(clave + r["resto"])
+        ordenado = _unicos(r["orden"] + r["igualdad"] + r["resto"]) if r["orden"] else []
+        existentes = _indices_existentes(con, tabla)
+        for cols in (clave, cubriente, ordenado):
+            if cols and len(cols) <= MAX_COLUMNAS and not any(e[:len(cols)] == cols for e in existentes):
+                out.append(_ddl(tabla, cols))
+        for termino in r["parciales"]:
+            if cubriente and len(cubriente) <= MAX_COLUMNAS:
+                out.append(_ddl(tabla, cubriente, restaurar(termino)))
+    return list({c["nombre"]: c for c in out}.values())
+
+# ------------------ Evaluación ------------------
+def _probar(con, ddls, medir):
+    """Crea `ddls` en una transacción, ejecuta medir() y deshace todo."""
+    con.execute("BEGIN")
+    try:
+        for ddl in ddls:
+            con.execute(ddl)
+        return medir()
+    finally:
+        con.execute("ROLLBACK")
+
+def evaluar(con, carga) -> list[dict]:
+    """Plan, latencia y mejor candidato de cada consulta (los índices no quedan en la base)."""
+    objetos = _objetos(con)
+    for i, c in enumerate(carga, start=1):
+        sql = c["sql"]
+        try:
+            c["plan_antes"] = plan(con, sql)
+            c["ms_antes"] = latencia_ms(con, sql)
+        except sqlite3.Error as e:
+            c["error"] = str(e)
+            print(f"[WARN] Consulta {i} no se pudo evaluar: {e}")
+            continue
+        c["recomendado"] = None
+        for cand in candidatos(con, sql, c["plan_antes"], objetos):
+            def medir():
+                p = plan(con, sql)
+                return p, (latencia_ms(con, sql) if any(cand["nombre"] in l for l in p) else None)
+            p, ms = _probar(con, [cand["ddl"]], medir)
+            if ms is not None and ms * MEJORA_MINIMA <= c["ms_antes"] and c["ms_antes"] - ms >= AHORRO_MINIMO_MS:
+                if c["recomendado"] is None or ms < c["recomendado"]["ms"]:
+                    c["recomendado"] = {**cand, "ms": ms}
+        rec = c["recomendado"]
+        print(f"[INFO] Consulta {i}/{len(carga)}: {c['ms_antes']:.2f} ms"
+              + (f" -> {rec['ms']:.2f} ms con {rec['nombre']}" if rec else " (sin índice que mejore)"))
+    return carga
+
+def recomendados(carga) -> list[dict]:
+    """Mejores candidatos sin repetir; se descartan los que son prefijo de otro (misma tabla y WHERE)."""
+    todos = list({c["recomendado"]["nombre"]: c["recomendado"] for c in carga if c.get("recomendado")}.values())
+    def cubierto(a):
+        return any(b is not a and b["tabla"] == a["tabla"] and b["where"] == a["where"]
+                   and len(b["columnas"]) > len(a["columnas"]) and b["columnas"][:len(a["columnas"])] == a["columnas"]
+                   for b in todos)
+    return [a for a in todos if not cubierto(a)]
+
+def medir_despues(con, carga, indices, crear=False):
+    """Latencia y plan de cada consulta con todos los índices recomendados a la vez."""
+    def medir():
+        for c in carga:
+            if "error" not in c:
+                c["plan_despues"] = plan(con, c["sql"])
+                c["ms_despues"] = latencia_ms(con, c["sql"])
+    if crear:
+        with con:
+            for ind in indices:
+                con.execute(ind["ddl"])
+        medir()
+    else:
+        _probar(con, [ind["ddl"] for ind in indices], medir)
+
+def quitar_indices(con) -> list[str]:
+    nombres = [r[0] for r in con.execute(
+        "SELECT name FROM sqlite_master WHERE type='index' AND name LIKE ?", (PREFIJO + "%",))]
+    for n in nombres:
+        con.execute(f"DROP INDEX IF EXISTS {n}")
+    return nombres
+
+# ------------------ Reporte ------------------
+def escribir_reporte(carga, indices, creados, ruta=OUT_MD):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("# Asesor de índices (carga de trabajo registrada)\n\n")
+        f.write(f"- Consultas distintas: {len(carga)}\n")
+        f.write(f"- Índices recomendados: {len(indices)} ({'creados' if creados else 'no creados; usar --crear'})\n\n")
+        if indices:
+            f.write("## DDL\n\n```sql\n" + ";\n".join(i["ddl"] for i in indices) + ";\n```\n\n")
+        f.write("## Latencia por consulta\n\n")
+        f.write("| # | veces | scripts | antes (ms) | después (ms) | mejora | índice |\n")
+        f.write("|---|---|---|---|---|---|---|\n")
+        for i, c in enumerate(carga, start=1):
+            if "error" in c:
+                f.write(f"| {i} | {c['veces']} | {', '.join(sorted(c['scripts']))} | error | | | |\n")
+                continue
+            antes, despues = c["ms_antes"], c.get("ms_despues", c["ms_antes"])
+            rec = c.get("recomendado")
+            f.write(f"| {i} | {c['veces']} | {', '.join(sorted(c['scripts']))} | {antes:.2f} | {despues:.2f}"
+                    f" | {antes / despues if despues else 0:.1f}x | {rec['nombre'] if rec else '-'} |\n")
+        f.write("\n## Consultas y planes\n\n")
+        for i, c in enumerate(carga, start=1):
+            f.write(f"### {i}\n\n```sql\n{c['sql']}\n```\n\n")
+            if "error" in c:
+                f.write(f"Error: {c['error']}\n\n")
+                continue
+            f.write("Plan antes: " + " / ".join(c["plan_antes"]) + "\n\n")
+            if c.get("plan_despues") and c["plan_despues"] != c["plan_antes"]:
+                f.write("Plan después: " + " / ".join(c["plan_despues"]) + "\n\n")
+    print(f"[OK] Reporte: {ruta}")
+
+# ------------------ Main ------------------
+def main():
+    ap = argparse.ArgumentParser(description="Asesor de índices guiado por el registro de consultas.")
+    ap.add_argument("--db", type=str, default=str(DB_DEFAULT), help="Base SQLite a analizar")
+    ap.add_argument("--registro", type=str, default=None,
+                    help=f"Registro de consultas (JSONL; por defecto {REGISTRO_CONSULTAS.name} y su rotación)")
+    ap.add_argument("--crear", action="store_true", help="Crear en la base los índices recomendados")
+    ap.add_argument("--quitar", action="store_true", help="Borrar los índices idx_asesor_* y salir")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        raise SystemExit(f"[ERROR] No existe la base: {args.db}")
+    con = sqlite3.connect(args.db, isolation_level=None)   # transacciones explícitas
+
+    if args.quitar:
+        nombres = quitar_indices(con)
+        print(f"[OK] Índices borrados: {len(nombres)}" + (f" ({', '.join(nombres)})" if nombres else ""))
+        con.close()
+        return
+
+    carga = cargar_carga(args.registro)
+    if not carga:
+        print(f"[WARN] Registro vacío: {args.registro or REGISTRO_CONSULTAS}")
+        print("       Corre antes con REGISTRAR_CONSULTAS=1 consultas_descriptivas.py, analisis_mineria.py, consultas_llm.py o consultas_rag.py")
+        con.close()
+        return
+    print(f"[INFO] {len(carga)} consultas distintas en {args.registro or REGISTRO_CONSULTAS}")
+
+    evaluar(con, carga)
+    indices = recomendados(carga)
+    medir_despues(con, carga, indices, crear=args.crear and bool(indices))
+    escribir_reporte(carga, indices, creados=args.crear and bool(indices))
+
+    print(f"\n[RESUMEN] {len(indices)} índices recomendados")
+    for ind in indices:
+        print(f"  {ind['ddl']}")
+    total_antes = sum(c["ms_antes"] for c in carga if "error" not in c)
+    total_despues = sum(c.get("ms_despues", c["ms_antes"]) for c in carga if "error" not in c)
+    print(f"  latencia total de la carga: {total_antes:.1f} ms -> {total_despues:.1f} ms")
+    if args.crear and indices:
+        print(f"[OK] Índices creados en {args.db}")
+    con.close()
+
+if __name__ == "__main__":
+    main()
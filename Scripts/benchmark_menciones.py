@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark_menciones.py
+Compara find_mentions (léxico compilado en trie, procesar_cowese_textos.py)
+con el ciclo anterior (find_mentions_lineal: un `in` por clave) sobre el
+corpus completo.
+
+- El corpus se lee en streaming con iter_sentences, por bloques de
+  BLOQUE oraciones; cada bloque se mide con los dos métodos (mismas oraciones)
+- Tiempo total, oraciones/s y aceleración
+- Diferencias: el trie exige que cada clave empiece una palabra (y que las
+  siglas de CLAVES_PALABRA_COMPLETA la terminen), así que solo cambian las
+  coincidencias a mitad de palabra: "thc" en "kthcx" desaparece y
+  "metanfetaminas" cuenta como metanfetamina en vez de anfetamina. Las
+  flexiones se conservan ("alcohol" en "alcoholismo", "cigarrillo" en
+  "cigarrillos"). Se cuentan por clave, con ejemplos
+
+Reporte: docs/perf/benchmark_menciones.md
+
+Uso:
+    python Scripts/benchmark_menciones.py --cowese CoWeSe.txt
+    python Scripts/benchmark_menciones.py --cowese CoWeSe_sample.txt --limit 100000
+"""
+
+import argparse, itertools, time
+from collections import Counter
+from pathlib import Path
+
+from procesar_cowese_textos import KEYS_TO_CIE10, iter_sentences, find_mentions, find_mentions_lineal
+
+ROOT = Path(__file__).resolve().parent.parent
+OUT_MD = ROOT / "docs" / "perf" / "benchmark_menciones.md"
+
+BLOQUE = 50_000      # oraciones por bloque medido
+EJEMPLOS = 3         # oraciones de ejemplo por clave que cambia
+
+def medir(ruta, limite=None) -> dict:
+    r = {"oraciones": 0, "lineal_s": 0.0, "trie_s": 0.0, "con_menciones_lineal": 0, "con_menciones_trie": 0,
+         "oraciones_distintas": 0, "quitadas": Counter(), "agregadas": Counter(), "ejemplos": {}}
+    with open(ruta, "r", encoding="utf-8", errors="ignore") as f:
+        oraciones = iter_sentences(f)
+        if limite:
+            oraciones = itertools.islice(oraciones, limite)
+        while True:
+            bloque = list(itertools.islice(oraciones, BLOQUE))
+            if not bloque:
+                break
+            t0 = time.perf_counter()
+            lineal = [find_mentions_lineal(s, KEYS_TO_CIE10) for s in bloque]
+            t1 = time.perf_counter()
+            trie = [find_mentions(s, KEYS_TO_CIE10) for s in bloque]
+            t2 = time.perf_counter()
+            r["lineal_s"] += t1 - t0
+            r["trie_s"] += t2 - t1
+            r["oraciones"] += len(bloque)
+            for s, a, b in zip(bloque, lineal, trie):
+                r["con_menciones_lineal"] += bool(a)
+                r["con_menciones_trie"] += bool(b)
+                if a == b:
+                    continue
+                r["oraciones_distintas"] += 1
+                for k, code in set(a) - set(b):
+                    r["quitadas"][(k, code)] += 1
+                    r["ejemplos"].setdefault((k, code), [])
+                    if len(r["ejemplos"][(k, code)]) < EJEMPLOS:
+                        r["ejemplos"][(k, code)].append(s)
+                for k, code in set(b) - set(a):
+                    r["agregadas"][(k, code)] += 1
+            print(f"[INFO] {r['oraciones']:,} oraciones | lineal {r['lineal_s']:.1f} s | trie {r['trie_s']:.1f} s")
+    return r
+
+def escribir_reporte(r, ruta_corpus, ruta=OUT_MD):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    n = r["oraciones"]
+    acel = r["lineal_s"] / r["trie_s"] if r["trie_s"] else 0.0
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write("# Benchmark de find_mentions: trie vs ciclo por clave\n\n")
+        f.write(f"- Corpus: {ruta_corpus} ({n:,} oraciones, {len(KEYS_TO_CIE10)} claves)\n")
+        f.write(f"- Ciclo por clave (`in`, subcadenas): {r['lineal_s']:.2f} s ({n / r['lineal_s'] if r['lineal_s'] else 0:,.0f} oraciones/s)\n")
+        f.write(f"- Trie (clave al inicio de palabra): {r['trie_s']:.2f} s ({n / r['trie_s'] if r['trie_s'] else 0:,.0f} oraciones/s)\n")
+        f.write(f"- Aceleración: {acel:.2f}x\n")
+        f.write(f"- Oraciones con menciones: {r['con_menciones_lineal']:,} (ciclo) / {r['con_menciones_trie']:,} (trie)\n")
+        f.write(f"- Oraciones con resultado distinto: {r['oraciones_distintas']:,}\n\n")
+        if r["quitadas"] or r["agregadas"]:
+            f.write("## Diferencias por clave\n\n")
+            f.write("Solo el ciclo (coincidencias a mitad de palabra o siglas dentro de otra palabra) y solo el trie\n")
+            f.write("(la clave al inicio de la palabra que antes quedaba tapada, p. ej. metanfetamina en vez de anfetamina).\n\n")
+            f.write("| clave | código | solo ciclo | solo trie |\n|---|---|---|---|\n")
+            for k, code in sorted(set(r["quitadas"]) | set(r["agregadas"]),
+                                  key=lambda x: -(r["quitadas"][x] + r["agregadas"][x])):
+                f.write(f"| {k} | {code} | {r['quitadas'][(k, code)]:,} | {r['agregadas'][(k, code)]:,} |\n")
+            f.write("\n## Ejemplos (solo ciclo)\n\n")
+            for (k, code), ejemplos in r["ejemplos"].items():
+                f.write(f"### {k} ({code})\n\n" + "".join(f"- {s[:200]}\n" for s in ejemplos) + "\n")
+    print(f"[OK] Reporte: {ruta}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark de find_mentions: trie vs ciclo por clave.")
+    ap.add_argument("--cowese", type=str, required=True, help="Ruta a CoWeSe.txt")
+    ap.add_argument("--limit", type=int, default=None, help="Limitar número de oraciones")
+    args = ap.parse_args()
+
+    ruta = Path(args.cowese)
+    if not ruta.exists():
+        raise SystemExit(f"[ERROR] No existe el archivo: {ruta}")
+    r = medir(ruta, args.limit)
+    if not r["oraciones"]:
+        raise SystemExit(f"[ERROR] Sin oraciones en {ruta}")
+    print(f"[OK] {r['oraciones']:,} oraciones | lineal {r['lineal_s']:.2f} s | trie {r['trie_s']:.2f} s"
+          f" ({r['lineal_s'] / r['trie_s']:.2f}x) | {r['oraciones_distintas']:,} con resultado distinto")
+    escribir_reporte(r, ruta)
+
+if __name__ == "__main__":
+    main()
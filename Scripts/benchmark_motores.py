@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+benchmark_motores.py
+Compara SQLite y DuckDB con el SQL de análisis del proyecto a varias escalas.
+
+- Consultas: los SELECT/WITH literales de consultas_descriptivas.py y
+  analisis_mineria.py (se leen del código con ast, sin ejecutar los scripts)
+- Escalas (--escalas, por defecto 1 10 100): copia de salud_federada.db en
+  .cache/benchmark/ con los hechos (hechos_defunciones, hechos_urgencias)
+  repetidos k veces; texto, grafo y dimensiones quedan igual. La copia 1x se
+  exporta a DuckDB una sola vez (motor_duckdb.py) y cada escala se arma
+  dentro de DuckDB con el mismo INSERT ... SELECT
+- Las consultas van directo a la base (sin caché ni reescritura a cubos:
+  los cubos de la copia no están escalados) vía conexiones.leer_df, mejor
+  tiempo de --repeticiones (1 desde 100x)
+- Por consulta se verifica que los dos motores den el mismo resultado
+  (sin importar el orden de filas empatadas)
+
+Sin duckdb solo se mide SQLite (con aviso).
+
+Reporte: docs/perf/benchmark_motores.md y benchmark_motores.csv.
+
+Uso:
+    python Scripts/benchmark_motores.py
+    python Scripts/benchmark_motores.py --escalas 1 10 --repeticiones 5
+"""
+
+import argparse, ast, shutil, sqlite3, time
+from pathlib import Path
+
+import pandas as pd
+
+import conexiones
+from conexiones import abrir_lectura, leer_df, duckdb_disponible, RE_LECTURA
+from esquema_estrella import HECHOS_TABLAS
+
+ROOT = Path(__file__).resolve().parent.parent
+DB_DEFAULT = ROOT / "salud_federada.db"
+DIR_BENCH = ROOT / ".cache" / "benchmark"
+OUT_MD = ROOT / "docs" / "perf" / "benchmark_motores.md"
+OUT_CSV = ROOT / "docs" / "perf" / "benchmark_motores.csv"
+
+SCRIPTS_CONSULTAS = ["consultas_descriptivas.py", "analisis_mineria.py"]
+ESCALAS = [1, 10, 100]
+REPETICIONES = 3
+ESCALA_UNA_REPETICION = 100   # desde esta escala se mide una sola vez
+
+# ------------------ Consultas ------------------
+def consultas_de_scripts(nombres=SCRIPTS_CONSULTAS) -> list[dict]:
+    """SQL literal (SELECT/WITH, sin parámetros) de los scripts, sin repetir."""
+    vistas, out = set(), []
+    for nombre in nombres:
+        arbol = ast.parse((Path(__file__).resolve().parent / nombre).read_text(encoding="utf-8"))
+        for nodo in ast.walk(arbol):
+            if not (isinstance(nodo, ast.Constant) and isinstance(nodo.value, str)):
+                continue
+            sql = nodo.value.strip()
+            if not RE_LECTURA.match(sql) or "?" in sql:
+                continue
+            clave = " ".join(sql.split())
+            if clave not in vistas:
+                vistas.add(clave)
+                out.append({"id": len(out) + 1, "script": nombre, "linea": nodo.lineno, "sql": sql})
+    return out
+
+# ------------------ Bases escaladas ------------------
+def _escalar(con, k):
+    """Repite k veces las filas de cada tabla de hechos (mismo SQL en SQLite y DuckDB)."""
+    for tabla in HECHOS_TABLAS.values():
+        con.execute(f"CREATE TEMP TABLE _base AS SELECT * FROM {tabla}")
+        for _ in range(k - 1):
+            con.execute(f"INSERT INTO {tabla} SELECT * FROM _base")
+        con.execute("DROP TABLE _base")
+
+def base_sqlite(origen, k) -> Path:
+    ruta = DIR_BENCH / f"salud_x{k}.db"
+    shutil.copyfile(origen, ruta)
+    if k > 1:
+        con = sqlite3.connect(ruta)
+        with con:
+            _escalar(con, k)
+        con.close()
+    return ruta
+
+def base_duckdb(ruta_1x_duckdb, k) -> Path:
+    import duckdb
+    ruta = DIR_BENCH / f"salud_x{k}.duckdb"
+    if ruta != ruta_1x_duckdb:
+        ruta.with_name(ruta.name + ".wal").unlink(missing_ok=True)
+        shutil.copyfile(ruta_1x_duckdb, ruta)
+        con = duckdb.connect(str(ruta))
+        _escalar(con, k)
+        con.execute("CHECKPOINT")
+        con.close()
+    return ruta
+
+def borrar_base(ruta):
+    for sufijo in ("", ".wal", "-wal", "-shm"):   # DuckDB deja .wal; SQLite en modo WAL, -wal y -shm
+        ruta.with_name(ruta.name + sufijo).unlink(missing_ok=True)
+
+# ------------------ Medición ------------------
+def medir(ruta, consultas, repeticiones) -> dict:
+    """id -> (mejor tiempo en ms, DataFrame) o (None, error)."""
+    con = abrir_lectura(ruta)
+    res = {}
+    try:
+        for c in consultas:
+            mejor, df = None, None
+            try:
+                for _ in range(repeticiones):
+                    t0 = time.perf_counter()
+                    df = leer_df(con, c["sql"])
+                    ms = (time.perf_counter() - t0) * 1000
+                    mejor = ms if mejor is None else min(mejor, ms)
+            except Exception as e:
+                res[c["id"]] = (None, str(e).splitlines()[0])
+                continue
+            res[c["id"]] = (mejor, df)
+    finally:
+        con.close()
+    return res
+
+def _ordenado(df):
+    return df.sort_values(list(df.columns), kind="mergesort").reset_index(drop=True) if len(df.columns) else df
+
+def mismos_resultados(a, b) -> bool:
+    """Mismas columnas y filas (el orden de filas empatadas puede variar entre motores)."""
+    if not (isinstance(a, pd.DataFrame) and isinstance(b, pd.DataFrame)) or list(a.columns) != list(b.columns):
+        return False
+    try:
+        pd.testing.assert_frame_equal(_ordenado(a), _ordenado(b), check_dtype=False, check_exact=False)
+        return True
+    except (AssertionError, TypeError):
+        return False
+
+# ------------------ Reporte ------------------
+def escribir_reporte(filas, consultas, ruta_md=OUT_MD, ruta_csv=OUT_CSV):
+    ruta_md.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.DataFrame(filas)
+    df.to_csv(ruta_csv, index=False)
+    with open(ruta_md, "w", encoding="utf-8") as f:
+        f.write("# Benchmark de motores: SQLite vs DuckDB\n\n")
+        f.write(f"- Consultas: {len(consultas)} (de {', '.join(SCRIPTS_CONSULTAS)})\n")
+        f.write("- Escala k: hechos_defunciones y hechos_urgencias repetidos k veces\n")
+        f.write("- Tiempos en ms (mejor de las repeticiones), sin caché ni cubos\n\n")
+        f.write("## Total por escala\n\n| escala | filas de hechos | SQLite (ms) | DuckDB (ms) | aceleración | resultados iguales |\n")
+        f.write("|---|---|---|---|---|---|\n")
+        for k, g in df.groupby("escala", sort=True):
+            s, d = g["sqlite_ms"].sum(), g["duckdb_ms"].sum()
+            iguales = g["iguales"].dropna().astype(bool)
+            f.write(f"| {k}x | {int(g['filas_hechos'].iloc[0]):,} | {s:,.1f} | "
+                    + (f"{d:,.1f} | {s / d:.1f}x" if d else "- | -")
+                    + (f" | {int(iguales.sum())}/{len(iguales)} |\n" if len(iguales) else " | - |\n"))
+        f.write("\n## Por consulta\n\n| escala | # | script | SQLite (ms) | DuckDB (ms) | aceleración | iguales |\n")
+        f.write("|---|---|---|---|---|---|---|\n")
+        for r in filas:
+            s, d = r["sqlite_ms"], r["duckdb_ms"]
+            f.write(f"| {r['escala']}x | {r['consulta']} | {r['script']} | "
+                    + (f"{s:,.1f}" if pd.notna(s) else "error") + " | "
+                    + (f"{d:,.1f}" if pd.notna(d) else "-") + " | "
+                    + (f"{s / d:.1f}x" if pd.notna(s) and pd.notna(d) and d else "-") + " | "
+                    + ({True: "sí", False: "NO"}.get(r["iguales"], "-")) + " |\n")
+        f.write("\n## Consultas\n\n")
+        for c in consultas:
+            f.write(f"### {c['id']} ({c['script']}:{c['linea']})\n\n```sql\n{c['sql']}\n```\n\n")
+    print(f"[OK] Reporte: {ruta_md}")
+    print(f"[OK] CSV: {ruta_csv}")
+
+# ------------------ Main ------------------
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark SQLite vs DuckDB con el SQL de análisis a varias escalas.")
+    ap.add_argument("--db", type=str, default=str(DB_DEFAULT), help="Base SQLite de origen")
+    ap.add_argument("--escalas", type=int, nargs="+", default=ESCALAS, help="Factores de escala de los hechos")
+    ap.add_argument("--repeticiones", type=int, default=REPETICIONES, help="Mediciones por consulta (se toma la mejor)")
+    ap.add_argument("--conservar", action="store_true", help="No borrar las bases escaladas de .cache/benchmark/")
+    args = ap.parse_args()
+
+    if not Path(args.db).exists():
+        raise SystemExit(f"[ERROR] No existe la base: {args.db}")
+    conexiones.REGISTRAR_CONSULTAS = False   # el benchmark no es carga de trabajo real
+    con_duckdb = duckdb_disponible()
+    if not con_duckdb:
+        print("[WARN] duckdb no está instalado: solo se mide SQLite (pip install duckdb)")
+
+    consultas = consultas_de_scripts()
+    print(f"[INFO] {len(consultas)} consultas de {', '.join(SCRIPTS_CONSULTAS)}")
+    DIR_BENCH.mkdir(parents=True, exist_ok=True)
+
+    ruta_1x_duckdb = None
+    if con_duckdb:
+        from motor_duckdb import exportar_a_duckdb
+        ruta_1x_duckdb = exportar_a_duckdb(args.db, DIR_BENCH / "salud_x1.duckdb")
+
+    filas = []
+    for k in sorted(set(args.escalas)):
+        reps = 1 if k >= ESCALA_UNA_REPETICION else args.repeticiones
+        t0 = time.perf_counter()
+        ruta_s = base_sqlite(args.db, k)
+        con = sqlite3.connect(ruta_s)
+        n_hechos = sum(con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in HECHOS_TABLAS.values())
+        con.close()
+        ruta_d = base_duckdb(ruta_1x_duckdb, k) if con_duckdb else None
+        print(f"[INFO] Escala {k}x: {n_hechos:,} filas de hechos (bases listas en {time.perf_counter() - t0:.1f} s)")
+
+        res_s = medir(ruta_s, consultas, reps)
+        res_d = medir(ruta_d, consultas, reps) if con_duckdb else {}
+        for c in consultas:
+            ms_s, df_s = res_s[c["id"]]
+            ms_d, df_d = res_d.get(c["id"], (None, None))
+            iguales = mismos_resultados(df_s, df_d) if con_duckdb else None
+            if ms_s is None or (con_duckdb and ms_d is None):
+                print(f"[WARN] Consulta {c['id']} falló en {'SQLite' if ms_s is None else 'DuckDB'}: "
+                      f"{df_s if ms_s is None else df_d}")
+            elif iguales is False:
+                print(f"[WARN] Consulta {c['id']}: resultados distintos entre motores")
+            filas.append({"escala": k, "filas_hechos": n_hechos, "consulta": c["id"], "script": c["script"],
+                          "sqlite_ms": ms_s, "duckdb_ms": ms_d, "iguales": iguales})
+        tot_s = sum(f["sqlite_ms"] or 0 for f in filas if f["escala"] == k)
+        tot_d = sum(f["duckdb_ms"] or 0 for f in filas if f["escala"] == k)
+        print(f"[OK] Escala {k}x: SQLite {tot_s:,.1f} ms" + (f" | DuckDB {tot_d:,.1f} ms ({tot_s / tot_d:.1f}x)" if tot_d else ""))
+
+        if not args.conservar:
+            borrar_base(ruta_s)
+            if ruta_d is not None and ruta_d != ruta_1x_duckdb:
+                borrar_base(ruta_d)
+    if ruta_1x_duckdb is not None and not args.conservar:
+        borrar_base(ruta_1x_duckdb)
+
+    escribir_reporte(filas, consultas)
+
+if __name__ == "__main__":
+    main()
@@ -5,16 +5,45 @@ build_base_final.py
 Construye la base federada (SQLite) automáticamente:
 - Si existen archivos LIMPIOS (dedup): carga esos
 - Si no, busca archivos CRUDOS (F10..F19 anchos + cowese_matches) y los procesa
+- Los hechos se leen de la capa Parquet (Data/Parquet, ver capa_parquet.py)
+  cuando existe, con proyección de columnas y poda por fuente/anio
+
+- Con --incremental solo reemplaza las particiones por año (anio) de los
+  hechos cuyo contenido cambió; el resto de la base queda intacta
+- Materializa cubos pre-agregados de los hechos (cubos.py); en modo
+  incremental se refrescan solo los años reemplazados
+- Hechos en esquema estrella (esquema_estrella.py): dimensiones con claves
+  enteras, hechos angostos hechos_* y vistas fact_* con las columnas de siempre
+- Cada construcción/actualización escribe un build_id nuevo en build_info
+  (huella de la base para la caché de resultados, cache_sql.py)
+- Con --engine duckdb además exporta tablas y vistas a <outdb>.duckdb
+  (columnar, motor_duckdb.py); los scripts de consulta la usan con --db
 
 Uso:
     python Scripts/build_base_final.py
     python Scripts/build_base_final.py --outdb salud_federada.db
+    python Scripts/build_base_final.py --incremental --anios 2024
+    python Scripts/build_base_final.py --engine duckdb
 """
 
-import os, sys, re, sqlite3, argparse
+import os, sys, re, sqlite3, argparse, datetime
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from lector_csv import leer_csv
+from ancho_largo import ancho_a_largo, anio_int16
+from carga_masiva import sesion_carga, cargar_tabla, filas_sql
+from cubos import crear_cubos, refrescar_cubos
+from cache_sql import registrar_build
+from crear_vista_unificada import TABLA_MAT, VISTA_CALCULO, refrescar_unificado
+from conexiones import requerir_duckdb
+from motor_duckdb import exportar_a_duckdb
+from consultas_texto import crear_fts
+from esquema_estrella import (HECHOS_TABLAS, COLS_HECHOS, crear_esquema_estrella,
+                              borrar_esquema_estrella, crear_indices_hechos, a_claves)
+from capa_parquet import DS_PSA_CLEAN, DS_HECHOS_DEDUP, pyarrow_disponible, existe_dataset, leer_particiones
+
 # ------------------ Config (rutas por defecto) ------------------
 ROOT = Path(__file__).resolve().parent.parent
 DATA = ROOT / "Data"
@@ -39,17 +68,37 @@ TXT_RAW   = TEXT / "cowese_matches.csv"
 F_CODES = [f"F{n}" for n in range(10,20)]  # F10..F19
 CIE_PATTERN = re.compile(r"^F1[0-9](\..+)?$", re.I)
 
+# Columnas proyectadas al leer hechos desde Parquet
+FACT_COLS = ["anio","entidad_norm","sexo","edad_quinquenal","cie10_code","valor"]
+YEAR_CANDS = ["anio","anio_defuncion","year","fecha","periodo"]
+ENT_CANDS = ["entidad_norm","entidad_defuncion_etq","entidad","entidad_defuncion","estado","Entidad","nom_ent","nombre_entidad"]
+RAW_COLS = YEAR_CANDS + ENT_CANDS + ["edad_quinquenal","sexo"] + F_CODES
+
+# Tablas de hechos por fuente y registro de particiones cargadas (modo incremental)
+FACT_TABLES = {"defunciones": "fact_defunciones", "urgencias": "fact_urgencias"}
+META_PARTICIONES = "carga_particiones"
+
 # ------------------ Utilidades ------------------
 def load_csv_safe(path: Path):
     if not path.exists():
         print(f"[WARN] No existe: {path}", file=sys.stderr)
         return None
-    for enc in ("utf-8","latin-1"):
-        try:
-            return pd.read_csv(path, sep=None, engine="python", encoding=enc)
-        except Exception:
-            continue
-    return pd.read_csv(path, encoding="latin-1")
+    return leer_csv(path)
+
+def parquet_disponible(dataset: str, fuente: str) -> bool:
+    if not existe_dataset(dataset, fuente):
+        return False
+    if not pyarrow_disponible():
+        print(f"[WARN] Existe Parquet {dataset}/fuente={fuente} pero falta pyarrow; se usa CSV.", file=sys.stderr)
+        return False
+    return True
+
+def load_hechos(dataset: str, fuente: str, csv_path: Path, columnas, anios=None):
+    """Hechos desde Parquet (proyección + poda de particiones) o, si no hay, desde CSV."""
+    if parquet_disponible(dataset, fuente):
+        print(f"[INFO] Leyendo Parquet: {dataset}/fuente={fuente}")
+        return leer_particiones(dataset, fuente, columnas=columnas, anios=anios)
+    return load_csv_safe(csv_path)
 
 def connect_db(path: Path):
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -59,7 +108,7 @@ def connect_db(path: Path):
     con.execute("PRAGMA synchronous = NORMAL;")
     return con
 
-def detect_year_col(df, candidates=("anio","anio_defuncion","year","fecha","periodo")):
+def detect_year_col(df, candidates=tuple(YEAR_CANDS)):
     for c in candidates:
         if c in df.columns:
             return c
@@ -72,7 +121,7 @@ def detect_year_col(df, candidates=("anio","anio_defuncion","year","fecha","peri
 def normalize_entidad_col(df):
     df = df.copy()
     # entidad_norm
-    for col in ["entidad_norm","entidad_defuncion_etq","entidad","entidad_defuncion","estado","Entidad","nom_ent","nombre_entidad"]:
+    for col in ENT_CANDS:
         if col in df.columns:
             df["entidad_norm"] = df[col]
             break
@@ -82,24 +131,26 @@ def normalize_entidad_col(df):
     return df
 
 def wide_to_tidy(df, fuente):
-    """De ancho (F10..F19) a tidy estándar (sin cve_entidad)."""
-    df = df.copy()
+    """
+    De ancho (F10..F19) a tidy estándar (sin cve_entidad).
+    Vectorizado (ancho_largo.py): dimensiones y cie10_code como category,
+    anio como Int16 y valor como int64.
+    """
     ycol = detect_year_col(df)
     if ycol:
-        try:
+        # Primero numérico (anio=2015); solo si no hay números, fecha (2015-01-01).
+        # to_datetime sobre enteros los toma como nanosegundos (→ 1970).
+        num = pd.to_numeric(df[ycol], errors="coerce")
+        if num.notna().any():
+            anio = anio_int16(num)
+        else:
             dt = pd.to_datetime(df[ycol], errors="coerce")
-            if dt.notna().any():
-                df["anio"] = dt.dt.year
-            else:
-                df["anio"] = pd.to_numeric(df[ycol], errors="coerce")
-                if df["anio"].isna().all():
-                    df = df.rename(columns={ycol:"anio"})
-        except Exception:
-            df = df.rename(columns={ycol:"anio"})
+            anio = dt.dt.year.astype("Int16") if dt.notna().any() else df[ycol]
     else:
-        df["anio"] = pd.NA
+        anio = pd.Series(pd.NA, index=df.index, dtype="Int16")
 
     df = normalize_entidad_col(df)
+    df["anio"] = anio
     if "edad_quinquenal" not in df.columns:
         df["edad_quinquenal"] = pd.NA
     if "sexo" not in df.columns:
@@ -110,14 +161,11 @@ def wide_to_tidy(df, fuente):
         raise ValueError("No se detectaron columnas F10..F19 en formato ancho.")
 
     keep = ["anio","entidad_norm","edad_quinquenal","sexo"]
-    melted = df[keep + f_present].melt(
-        id_vars=keep, value_vars=f_present,
-        var_name="cie10_code", value_name="valor"
-    )
-    melted["cie10_code"] = melted["cie10_code"].astype(str).str.upper().str.strip()
-    melted["valor"] = pd.to_numeric(melted["valor"], errors="coerce").fillna(0).astype(int)
-    melted["fuente"] = fuente
-    return melted
+    tidy = ancho_a_largo(df, keep, f_present, var_name="cie10_code", value_name="valor",
+                         codigos=[c.upper().strip() for c in f_present])
+    tidy["valor"] = tidy["valor"].astype("int64")
+    tidy["fuente"] = fuente
+    return tidy
 
 # ------------------ Schema/Vistas/Índices ------------------
 def create_schema(con, use_text_catalog=True):
@@ -126,9 +174,11 @@ def create_schema(con, use_text_catalog=True):
     # Suspende FKs mientras reseteamos el esquema
     cur.execute("PRAGMA foreign_keys = OFF;")
 
-    # Primero: eliminar vistas que puedan referenciar tablas
-    cur.executescript("""
+    # Primero: eliminar vistas que puedan referenciar tablas (y v_unificado materializada)
+    cur.executescript(f"""
     DROP VIEW IF EXISTS v_unificado;
+    DROP VIEW IF EXISTS {VISTA_CALCULO};
+    DROP TABLE IF EXISTS {TABLA_MAT};
     DROP VIEW IF EXISTS v_eventos;
     DROP VIEW IF EXISTS v_eventos_por_codigo;
     DROP VIEW IF EXISTS v_eventos_con_texto;
@@ -149,29 +199,21 @@ def create_schema(con, use_text_catalog=True):
     DROP TABLE IF EXISTS cie10_edges;   -- hija
     DROP TABLE IF EXISTS cie10_nodes;   -- padre
 
-    DROP TABLE IF EXISTS fact_defunciones;
-    DROP TABLE IF EXISTS fact_urgencias;
+    DROP TABLE IF EXISTS carga_particiones;
     """)
+    # fact_* (tablas en bases anteriores, vistas ahora), hechos angostos y dimensiones
+    borrar_esquema_estrella(con)
 
-    # Crear esquema limpio
+    # Crear esquema limpio: hechos en esquema estrella (esquema_estrella.py)
+    crear_esquema_estrella(con)
     cur.executescript("""
-    CREATE TABLE fact_defunciones (
-      anio INTEGER,
-      entidad_norm TEXT,
-      edad_quinquenal TEXT,
-      sexo TEXT,
-      cie10_code TEXT,
-      valor INTEGER,
-      fuente TEXT DEFAULT 'defunciones'
-    );
-    CREATE TABLE fact_urgencias (
+    CREATE TABLE carga_particiones (
+      tabla TEXT,
       anio INTEGER,
-      entidad_norm TEXT,
-      edad_quinquenal TEXT,
-      sexo TEXT,
-      cie10_code TEXT,
-      valor INTEGER,
-      fuente TEXT DEFAULT 'urgencias'
+      filas INTEGER,
+      firma TEXT,
+      actualizado TEXT,
+      PRIMARY KEY (tabla, anio)
     );
 
     CREATE TABLE cie10_nodes(
@@ -253,9 +295,8 @@ def create_views(con, use_text_catalog=True):
 
 def create_indexes(con, use_text_catalog=True):
     cur = con.cursor()
+    crear_indices_hechos(con)
     cur.executescript("""
-    CREATE INDEX IF NOT EXISTS idx_def_keys ON fact_defunciones(anio, entidad_norm, cie10_code);
-    CREATE INDEX IF NOT EXISTS idx_urg_keys ON fact_urgencias(anio, entidad_norm, cie10_code);
     CREATE INDEX IF NOT EXISTS idx_nodes_code ON cie10_nodes(code);
     CREATE INDEX IF NOT EXISTS idx_edges_src  ON cie10_edges(source);
     CREATE INDEX IF NOT EXISTS idx_edges_tgt  ON cie10_edges(target);
@@ -266,17 +307,8 @@ def create_indexes(con, use_text_catalog=True):
         CREATE INDEX IF NOT EXISTS idx_txt_code ON texto_frases(cie10_code);
         CREATE INDEX IF NOT EXISTS idx_map_hash ON texto_frases_x_docs(phrase_hash);
         """)
-        # FTS opcional (si está disponible)
-        try:
-            cur.executescript("""
-            DROP TABLE IF EXISTS texto_frases_fts;
-            CREATE VIRTUAL TABLE texto_frases_fts
-            USING fts5(sentence_norm, content='texto_frases', content_rowid='rowid');
-            INSERT INTO texto_frases_fts(rowid, sentence_norm)
-            SELECT rowid, sentence_norm FROM texto_frases;
-            """)
-        except Exception as e:
-            print("[WARN] FTS5 no disponible:", e)
+        # FTS opcional (si está disponible), sincronizado por triggers (consultas_texto.py)
+        crear_fts(con)
     else:
         cur.executescript("CREATE INDEX IF NOT EXISTS idx_texto_cie10 ON texto_matches(cie10_code);")
     con.commit()
@@ -286,128 +318,253 @@ def build_from_clean(con):
     print("[INFO] Construyendo desde LIMPIOS (dedup)…")
     create_schema(con, use_text_catalog=True)
 
-    # Hechos
-    dfd = load_csv_safe(DEF_CLEAN)
-    dfu = load_csv_safe(URG_CLEAN)
-    for df, name in [(dfd,"defunciones"), (dfu,"urgencias")]:
-        if df is None:
-            print(f"[ERROR] Falta CSV limpio: {name}", file=sys.stderr); sys.exit(1)
-        need = {"anio","entidad_norm","sexo","edad_quinquenal","cie10_code","valor"}
-        miss = need - set(df.columns)
-        if miss:
-            print(f"[ERROR] {name} dedup faltan columnas: {miss}", file=sys.stderr); sys.exit(1)
-    dfd.to_sql("fact_defunciones", con, if_exists="append", index=False)
-    dfu.to_sql("fact_urgencias",  con, if_exists="append", index=False)
-
-    # Grafo
-    nodes = load_csv_safe(NODES_CLEAN)
-    edges = load_csv_safe(EDGES_CLEAN)
-    if nodes is None or edges is None:
-        print("[ERROR] Faltan nodes/edges limpios", file=sys.stderr); sys.exit(1)
-    if "code" not in nodes.columns:
-        if "cie10_code" in nodes.columns:
-            nodes = nodes.rename(columns={"cie10_code":"code"})
-        else:
-            print("[ERROR] nodes_dedup sin columna 'code'", file=sys.stderr); sys.exit(1)
-    keep_nodes = ["code"] + ([c for c in ["descripcion"] if c in nodes.columns])
-    nodes[keep_nodes].drop_duplicates(subset=["code"]).to_sql("cie10_nodes", con, if_exists="append", index=False)
-
-    for c in ["source","target","rel_type"]:
-        if c not in edges.columns:
-            print(f"[ERROR] edges_dedup falta columna: {c}", file=sys.stderr); sys.exit(1)
-    keep_edges = ["source","target","rel_type"]
-    edges[keep_edges].drop_duplicates().to_sql("cie10_edges", con, if_exists="append", index=False)
-
-    # Textos (frases + mapeo)
-    phrases = load_csv_safe(TXT_PHRASES)
-    mapping = load_csv_safe(TXT_MAP)
-    if phrases is None or mapping is None:
-        print("[ERROR] Faltan frases/mapa limpios", file=sys.stderr); sys.exit(1)
-    need_p = {"phrase_hash","cie10_code","sentence_norm"}
-    miss_p = need_p - set(phrases.columns)
-    need_m = {"phrase_hash","doc_id","sent_id"}
-    miss_m = need_m - set(mapping.columns)
-    if miss_p or miss_m:
-        print(f"[ERROR] text_frases/map faltan columnas: {miss_p or ''} {miss_m or ''}", file=sys.stderr); sys.exit(1)
-    phrases.to_sql("texto_frases", con, if_exists="append", index=False)
-    mapping.to_sql("texto_frases_x_docs", con, if_exists="append", index=False)
+    with sesion_carga(con) as stats:
+        # Hechos
+        dfd = load_hechos(DS_HECHOS_DEDUP, "defunciones", DEF_CLEAN, FACT_COLS)
+        dfu = load_hechos(DS_HECHOS_DEDUP, "urgencias",   URG_CLEAN, FACT_COLS)
+        for df, name in [(dfd,"defunciones"), (dfu,"urgencias")]:
+            if df is None:
+                print(f"[ERROR] Falta CSV limpio: {name}", file=sys.stderr); sys.exit(1)
+            need = {"anio","entidad_norm","sexo","edad_quinquenal","cie10_code","valor"}
+            miss = need - set(df.columns)
+            if miss:
+                print(f"[ERROR] {name} dedup faltan columnas: {miss}", file=sys.stderr); sys.exit(1)
+        cargar_tabla(con, HECHOS_TABLAS["defunciones"], a_claves(con, dfd, "defunciones"), stats)
+        cargar_tabla(con, HECHOS_TABLAS["urgencias"], a_claves(con, dfu, "urgencias"), stats)
+        registrar_particiones(con, "fact_defunciones", dfd)
+        registrar_particiones(con, "fact_urgencias", dfu)
+
+        # Grafo
+        nodes = load_csv_safe(NODES_CLEAN)
+        edges = load_csv_safe(EDGES_CLEAN)
+        if nodes is None or edges is None:
+            print("[ERROR] Faltan nodes/edges limpios", file=sys.stderr); sys.exit(1)
+        if "code" not in nodes.columns:
+            if "cie10_code" in nodes.columns:
+                nodes = nodes.rename(columns={"cie10_code":"code"})
+            else:
+                print("[ERROR] nodes_dedup sin columna 'code'", file=sys.stderr); sys.exit(1)
+        keep_nodes = ["code"] + ([c for c in ["descripcion"] if c in nodes.columns])
+        cargar_tabla(con, "cie10_nodes", nodes[keep_nodes].drop_duplicates(subset=["code"]), stats)
+
+        for c in ["source","target","rel_type"]:
+            if c not in edges.columns:
+                print(f"[ERROR] edges_dedup falta columna: {c}", file=sys.stderr); sys.exit(1)
+        keep_edges = ["source","target","rel_type"]
+        cargar_tabla(con, "cie10_edges", edges[keep_edges].drop_duplicates(), stats)
+
+        # Textos (frases + mapeo)
+        phrases = load_csv_safe(TXT_PHRASES)
+        mapping = load_csv_safe(TXT_MAP)
+        if phrases is None or mapping is None:
+            print("[ERROR] Faltan frases/mapa limpios", file=sys.stderr); sys.exit(1)
+        need_p = {"phrase_hash","cie10_code","sentence_norm"}
+        miss_p = need_p - set(phrases.columns)
+        need_m = {"phrase_hash","doc_id","sent_id"}
+        miss_m = need_m - set(mapping.columns)
+        if miss_p or miss_m:
+            print(f"[ERROR] text_frases/map faltan columnas: {miss_p or ''} {miss_m or ''}", file=sys.stderr); sys.exit(1)
+        cargar_tabla(con, "texto_frases", phrases, stats)
+        cargar_tabla(con, "texto_frases_x_docs", mapping, stats)
 
     create_views(con, use_text_catalog=True)
     create_indexes(con, use_text_catalog=True)
+    crear_cubos(con)
 
 def build_from_raw(con):
     print("[INFO] Construyendo desde CRUDOS…")
     create_schema(con, use_text_catalog=False)
 
-    # Hechos (ancho → tidy)
-    df_def = load_csv_safe(DEF_RAW)
-    df_urg = load_csv_safe(URG_RAW)
-    if df_def is None and df_urg is None:
-        print("[ERROR] No hay CSV crudos (defunciones/urgencias).", file=sys.stderr); sys.exit(1)
-    if df_def is not None:
-        tidy_def = wide_to_tidy(df_def, "defunciones")
-        tidy_def.to_sql("fact_defunciones", con, if_exists="append", index=False)
-        print(f"[OK] Defunciones (crudo→tidy): {len(tidy_def):,}")
-    if df_urg is not None:
-        tidy_urg = wide_to_tidy(df_urg, "urgencias")
-        tidy_urg.to_sql("fact_urgencias", con, if_exists="append", index=False)
-        print(f"[OK] Urgencias (crudo→tidy): {len(tidy_urg):,}")
-
-    # Grafo
-    nodes = load_csv_safe(NODES_RAW)
-    edges = load_csv_safe(EDGES_RAW)
-    if nodes is not None:
-        if "cie10_code" in nodes.columns and "code" not in nodes.columns:
-            nodes = nodes.rename(columns={"cie10_code":"code"})
-        if "descripcion" not in nodes.columns:
-            for cand in ["desc","description","label","nombre","name"]:
-                if cand in nodes.columns:
-                    nodes = nodes.rename(columns={cand:"descripcion"})
-                    break
-        keep = [c for c in ["code","descripcion"] if c in nodes.columns]
-        nodes[keep].to_sql("cie10_nodes", con, if_exists="append", index=False)
-        print(f"[OK] Nodes (crudo): {len(nodes):,}")
-    if edges is not None:
-        ren = {}
-        if "source" not in edges.columns:
-            for c in ["src","from","origen"]:
-                if c in edges.columns: ren[c]="source"; break
-        if "target" not in edges.columns:
-            for c in ["dst","to","destino"]:
-                if c in edges.columns: ren[c]="target"; break
-        if "rel_type" not in edges.columns and "tipo" in edges.columns:
-            ren["tipo"] = "rel_type"
-        elif "rel_type" not in edges.columns:
-            for c in ["type","relation","label"]:
-                if c in edges.columns: ren[c]="rel_type"; break
-        if ren:
-            edges = edges.rename(columns=ren)
-        keep = [c for c in ["source","target","rel_type"] if c in edges.columns]
-        edges[keep].to_sql("cie10_edges", con, if_exists="append", index=False)
-        print(f"[OK] Edges (crudo): {len(edges):,}")
-
-    # Texto crudo (cowese_matches)
-    tm = load_csv_safe(TXT_RAW)
-    if tm is not None:
-        ren = {}
-        for a,b in [("cie10","cie10_code"),("doc","doc_id"),("sent","sent_id")]:
-            if a in tm.columns and b not in tm.columns:
-                ren[a]=b
-        tm = tm.rename(columns=ren)
-        keep = [c for c in ["doc_id","sent_id","sentence","keyword","cie10_code","anio","cve_entidad"] if c in tm.columns]
-        tm = tm[keep]
-        tm.to_sql("texto_matches", con, if_exists="append", index=False)
-        print(f"[OK] texto_matches (crudo): {len(tm):,}")
+    with sesion_carga(con) as stats:
+        # Hechos (ancho → tidy)
+        df_def = load_hechos(DS_PSA_CLEAN, "defunciones", DEF_RAW, RAW_COLS)
+        df_urg = load_hechos(DS_PSA_CLEAN, "urgencias",   URG_RAW, RAW_COLS)
+        if df_def is None and df_urg is None:
+            print("[ERROR] No hay CSV crudos (defunciones/urgencias).", file=sys.stderr); sys.exit(1)
+        if df_def is not None:
+            tidy_def = wide_to_tidy(df_def, "defunciones")
+            cargar_tabla(con, HECHOS_TABLAS["defunciones"], a_claves(con, tidy_def, "defunciones"), stats)
+            registrar_particiones(con, "fact_defunciones", tidy_def)
+            print(f"[OK] Defunciones (crudo→tidy): {len(tidy_def):,}")
+        if df_urg is not None:
+            tidy_urg = wide_to_tidy(df_urg, "urgencias")
+            cargar_tabla(con, HECHOS_TABLAS["urgencias"], a_claves(con, tidy_urg, "urgencias"), stats)
+            registrar_particiones(con, "fact_urgencias", tidy_urg)
+            print(f"[OK] Urgencias (crudo→tidy): {len(tidy_urg):,}")
+
+        # Grafo
+        nodes = load_csv_safe(NODES_RAW)
+        edges = load_csv_safe(EDGES_RAW)
+        if nodes is not None:
+            if "cie10_code" in nodes.columns and "code" not in nodes.columns:
+                nodes = nodes.rename(columns={"cie10_code":"code"})
+            if "descripcion" not in nodes.columns:
+                for cand in ["desc","description","label","nombre","name"]:
+                    if cand in nodes.columns:
+                        nodes = nodes.rename(columns={cand:"descripcion"})
+                        break
+            keep = [c for c in ["code","descripcion"] if c in nodes.columns]
+            cargar_tabla(con, "cie10_nodes", nodes[keep], stats)
+            print(f"[OK] Nodes (crudo): {len(nodes):,}")
+        if edges is not None:
+            ren = {}
+            if "source" not in edges.columns:
+                for c in ["src","from","origen"]:
+                    if c in edges.columns: ren[c]="source"; break
+            if "target" not in edges.columns:
+                for c in ["dst","to","destino"]:
+                    if c in edges.columns: ren[c]="target"; break
+            if "rel_type" not in edges.columns and "tipo" in edges.columns:
+                ren["tipo"] = "rel_type"
+            elif "rel_type" not in edges.columns:
+                for c in ["type","relation","label"]:
+                    if c in edges.columns: ren[c]="rel_type"; break
+            if ren:
+                edges = edges.rename(columns=ren)
+            keep = [c for c in ["source","target","rel_type"] if c in edges.columns]
+            cargar_tabla(con, "cie10_edges", edges[keep], stats)
+            print(f"[OK] Edges (crudo): {len(edges):,}")
+
+        # Texto crudo (cowese_matches)
+        tm = load_csv_safe(TXT_RAW)
+        if tm is not None:
+            ren = {}
+            for a,b in [("cie10","cie10_code"),("doc","doc_id"),("sent","sent_id")]:
+                if a in tm.columns and b not in tm.columns:
+                    ren[a]=b
+            tm = tm.rename(columns=ren)
+            keep = [c for c in ["doc_id","sent_id","sentence","keyword","cie10_code","anio","cve_entidad"] if c in tm.columns]
+            tm = tm[keep]
+            cargar_tabla(con, "texto_matches", tm, stats)
+            print(f"[OK] texto_matches (crudo): {len(tm):,}")
 
     create_views(con, use_text_catalog=False)
     create_indexes(con, use_text_catalog=False)
+    crear_cubos(con)
+
+# ------------------ Carga incremental por año ------------------
+def firmas_por_anio(df) -> dict:
+    """
+    {anio: (filas, firma)} de los hechos agregados. La firma es la suma (mod 2^64)
+    de los hashes de fila: no depende del orden ni del tipo de origen (CSV/Parquet).
+    """
+    norm = pd.DataFrame({
+        "anio": pd.to_numeric(df["anio"], errors="coerce").astype("Int64"),
+        **{c: df[c].astype(str) for c in ["entidad_norm","sexo","edad_quinquenal","cie10_code"]},
+        "valor": pd.to_numeric(df["valor"], errors="coerce").astype("Int64"),
+    })
+    h = pd.util.hash_pandas_object(norm, index=False).to_numpy()
+    out = {}
+    for anio, idx in norm.groupby("anio").indices.items():
+        out[int(anio)] = (len(idx), f"{int(h[idx].sum(dtype=np.uint64)):016x}")
+    return out
+
+def registrar_particiones(con, tabla, df, firmas=None):
+    firmas = firmas_por_anio(df) if firmas is None else firmas
+    ahora = datetime.datetime.now().isoformat(timespec="seconds")
+    con.executemany(
+        f"INSERT OR REPLACE INTO {META_PARTICIONES}(tabla, anio, filas, firma, actualizado) VALUES (?,?,?,?,?)",
+        [(tabla, a, n, f, ahora) for a, (n, f) in firmas.items()])
+
+def firmas_guardadas(con, tabla) -> dict:
+    try:
+        rows = con.execute(f"SELECT anio, filas, firma FROM {META_PARTICIONES} WHERE tabla=?", (tabla,))
+        return {a: (n, f) for a, n, f in rows}
+    except sqlite3.OperationalError:
+        return {}  # base construida antes del registro: todas las particiones cuentan como cambiadas
+
+def existen_tablas(con, tablas) -> bool:
+    nombres = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    return set(tablas) <= nombres
+
+def load_tidy_incremental(fuente, desde_limpios, anios=None):
+    """
+    Hechos tidy tal como los carga la construcción completa (build_from_clean /
+    build_from_raw, sin volver a agregar): mismas filas y mismas firmas, así una
+    partición recargada queda igual que tras reconstruir.
+    """
+    if desde_limpios:
+        csv_path = DEF_CLEAN if fuente == "defunciones" else URG_CLEAN
+        df = load_hechos(DS_HECHOS_DEDUP, fuente, csv_path, FACT_COLS, anios=anios)
+    else:
+        csv_path = DEF_RAW if fuente == "defunciones" else URG_RAW
+        df = load_hechos(DS_PSA_CLEAN, fuente, csv_path, RAW_COLS, anios=anios)
+        df = wide_to_tidy(df, fuente) if df is not None else None
+    if df is None:
+        return None
+    df = df.copy()
+    df["anio"] = pd.to_numeric(df["anio"], errors="coerce")
+    if anios is not None:
+        df = df[df["anio"].isin(anios)]
+    return df[FACT_COLS]
+
+def build_incremental(con, desde_limpios, anios=None) -> dict:
+    """
+    Reemplaza en los hechos (hechos_defunciones/hechos_urgencias) solo las
+    particiones anio cuya firma cambió respecto a la última carga (o las de
+    --anios). Los años cargados que ya no están en el insumo se borran (y salen
+    de carga_particiones). Cada partición
+    se reemplaza en una transacción (DELETE + INSERT) y después se refrescan
+    esos años en los cubos (y en mv_unificado si existe); índices, vistas,
+    grafo y textos no se tocan.
+    Devuelve {fuente: [anios reemplazados]}.
+    """
+    print("[INFO] Carga incremental por año (" + ("LIMPIOS" if desde_limpios else "CRUDOS") + ")…")
+    con.execute(f"""CREATE TABLE IF NOT EXISTS {META_PARTICIONES} (
+      tabla TEXT, anio INTEGER, filas INTEGER, firma TEXT, actualizado TEXT,
+      PRIMARY KEY (tabla, anio))""")
+    cambios = {}
+    for fuente, tabla in FACT_TABLES.items():
+        df = load_tidy_incremental(fuente, desde_limpios, anios)
+        if df is None:
+            print(f"[WARN] Sin insumo para {fuente}; se conserva lo cargado.", file=sys.stderr)
+            continue
+        nuevas = firmas_por_anio(df)
+        previas = firmas_guardadas(con, tabla)
+        hechos = HECHOS_TABLAS[fuente]
+        cambiados = sorted(a for a, fir in nuevas.items() if previas.get(a) != fir)
+        # años cargados (registrados o presentes en los hechos) que ya no vienen en el insumo
+        cargados = set(previas) | {int(a) for (a,) in con.execute(f"SELECT DISTINCT anio FROM {hechos}")
+                                   if a is not None}
+        if anios is not None:
+            cargados &= set(anios)
+        desaparecidos = sorted(cargados - set(nuevas))
+        cambios[fuente] = sorted(cambiados + desaparecidos)
+        if not cambios[fuente]:
+            print(f"[OK] {tabla}: sin cambios ({len(nuevas)} años revisados)")
+            continue
+
+        # filas angostas (claves enteras); los valores nuevos entran a las dimensiones
+        angosto = a_claves(con, df, fuente)
+        ins = f"INSERT INTO {hechos}({', '.join(COLS_HECHOS)}) VALUES ({', '.join('?' * len(COLS_HECHOS))})"
+        for anio in cambiados:
+            parte = angosto[angosto["anio"] == anio]
+            with con:  # una transacción por partición
+                borradas = con.execute(f"DELETE FROM {hechos} WHERE anio = ?", (anio,)).rowcount
+                con.executemany(ins, filas_sql(parte, COLS_HECHOS))
+            print(f"[OK] {tabla} anio={anio}: {borradas:,} → {len(parte):,} filas")
+        for anio in desaparecidos:
+            with con:
+                borradas = con.execute(f"DELETE FROM {hechos} WHERE anio = ?", (anio,)).rowcount
+                con.execute(f"DELETE FROM {META_PARTICIONES} WHERE tabla = ? AND anio = ?", (tabla, anio))
+            print(f"[OK] {tabla} anio={anio}: {borradas:,} → 0 filas (ya no está en el insumo)")
+        registrar_particiones(con, tabla, df, {a: nuevas[a] for a in cambiados})
+        con.commit()
+        refrescar_cubos(con, fuente, cambios[fuente])
+        refrescar_unificado(con, [f"sql_{fuente}"], cambios[fuente])   # si v_unificado está materializada
+    return cambios
 
 # ------------------ QA exprés ------------------
-def qa_summary(con):
+def qa_summary(con, anios=None):
+    """Resumen/QA de la base; con `anios` solo sobre esas particiones (carga incremental)."""
     cur = con.cursor()
+    filtro = ""
+    if anios is not None:
+        filtro = f"WHERE anio IN ({', '.join(str(int(a)) for a in anios)})"
+        print(f"\n[QA] Solo particiones anio: {', '.join(str(int(a)) for a in anios)}")
     print("\n[RESUMEN v_eventos]")
     try:
-        for src, cnt, tot in cur.execute("SELECT fuente, COUNT(*), SUM(valor) FROM v_eventos GROUP BY fuente;"):
+        for src, cnt, tot in cur.execute(f"SELECT fuente, COUNT(*), SUM(valor) FROM v_eventos {filtro} GROUP BY fuente;"):
             print(f"  {src:12s}  filas={cnt:,}  suma_valor={tot:,}")
     except Exception as e:
         print("  (vacio)", e)
@@ -416,22 +573,22 @@ def qa_summary(con):
     q_dup = """
     SELECT COUNT(*) FROM (
       SELECT anio, entidad_norm, sexo, edad_quinquenal, cie10_code, COUNT(*) c
-      FROM {tbl}
+      FROM {tbl} {filtro}
       GROUP BY 1,2,3,4,5 HAVING c>1
     );
     """
     try:
-        d1 = cur.execute(q_dup.format(tbl="fact_defunciones")).fetchone()[0]
-        d2 = cur.execute(q_dup.format(tbl="fact_urgencias")).fetchone()[0]
+        d1 = cur.execute(q_dup.format(tbl="fact_defunciones", filtro=filtro)).fetchone()[0]
+        d2 = cur.execute(q_dup.format(tbl="fact_urgencias", filtro=filtro)).fetchone()[0]
         print(f"  defunciones={d1} | urgencias={d2}")
     except Exception as e:
         print("  (no disponible)", e)
 
     print("\n[QA] Códigos en hechos NO presentes en nodes:")
     try:
-        missing = cur.execute("""
+        missing = cur.execute(f"""
             SELECT COUNT(*) FROM (
-              SELECT DISTINCT cie10_code FROM v_eventos
+              SELECT DISTINCT cie10_code FROM v_eventos {filtro}
               EXCEPT
               SELECT code FROM cie10_nodes
             );
@@ -444,14 +601,40 @@ def qa_summary(con):
 def main():
     ap = argparse.ArgumentParser(description="Constructor automático de salud_federada.db (clean primero, si no raw).")
     ap.add_argument("--outdb", type=str, default=str(DB_DEFAULT), help="Ruta de salida de la base SQLite")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Reemplazar solo las particiones anio de hechos que cambiaron (sin reconstruir)")
+    ap.add_argument("--anios", type=int, nargs="+", default=None,
+                    help="Con --incremental: limitar la revisión/carga a estos años")
+    ap.add_argument("--engine", choices=["sqlite", "duckdb"], default="sqlite",
+                    help="duckdb: además exporta la base a <outdb>.duckdb (columnar) para las consultas")
     args = ap.parse_args()
+    if args.engine == "duckdb":
+        requerir_duckdb()
 
     # Autodetección
-    have_clean = all(p.exists() for p in [DEF_CLEAN, URG_CLEAN, NODES_CLEAN, EDGES_CLEAN, TXT_PHRASES, TXT_MAP])
-    have_raw   = any(p.exists() for p in [DEF_RAW, URG_RAW, NODES_RAW, EDGES_RAW, TXT_RAW])
-
+    have_def_clean = DEF_CLEAN.exists() or parquet_disponible(DS_HECHOS_DEDUP, "defunciones")
+    have_urg_clean = URG_CLEAN.exists() or parquet_disponible(DS_HECHOS_DEDUP, "urgencias")
+    have_clean = have_def_clean and have_urg_clean and \
+                 all(p.exists() for p in [NODES_CLEAN, EDGES_CLEAN, TXT_PHRASES, TXT_MAP])
+    have_raw   = any(p.exists() for p in [DEF_RAW, URG_RAW, NODES_RAW, EDGES_RAW, TXT_RAW]) or \
+                 any(existe_dataset(DS_PSA_CLEAN, f) for f in ("defunciones","urgencias"))
+
+    ruta_duckdb = Path(args.outdb).with_suffix(".duckdb")
+    exportar = False   # la copia DuckDB se exporta ya cerrada la conexión de carga
     con = connect_db(Path(args.outdb))
     try:
+        if args.incremental and (have_clean or have_raw):
+            if existen_tablas(con, HECHOS_TABLAS.values()):
+                cambios = build_incremental(con, desde_limpios=have_clean, anios=args.anios)
+                anios = sorted({a for lista in cambios.values() for a in lista})
+                if anios:
+                    registrar_build(con, "incremental")
+                    qa_summary(con, anios=anios)
+                print(f"\n[OK] Base actualizada en: {Path(args.outdb).resolve()}")
+                exportar = bool(anios) or not ruta_duckdb.exists()
+                return
+            print("[WARN] La base no tiene tablas de hechos; se construye completa.", file=sys.stderr)
+
         if have_clean:
             build_from_clean(con)
         elif have_raw:
@@ -462,10 +645,14 @@ def main():
             print("  O bien CRUDOS:", DEF_RAW, URG_RAW, NODES_RAW, EDGES_RAW, TXT_RAW, sep="\n  - ")
             sys.exit(1)
 
+        registrar_build(con, "completa")
         qa_summary(con)
         print(f"\n[OK] Base creada en: {Path(args.outdb).resolve()}")
+        exportar = True
     finally:
         con.close()
+        if exportar and args.engine == "duckdb":
+            exportar_a_duckdb(args.outdb, ruta_duckdb)
 
 if __name__ == "__main__":
     main()
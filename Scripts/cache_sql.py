@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cache_sql.py
+Caché persistente (en disco) de resultados SQL para los reportes
+(consultas_descriptivas.py, analisis_mineria.py, perfilado_resumen.py).
+
+- Clave = sha256(SQL normalizado + parámetros + huella de la base)
+  * SQL normalizado: espacios colapsados fuera de literales, sin ';' final
+  * Huella: build_id de la tabla build_info (la escribe build_base_final.py
+    en cada construcción/actualización) + PRAGMA schema_version; si la base
+    no tiene build_info, tamaño y mtime del archivo. En DuckDB (copia que
+    exporta build_base_final.py --engine duckdb) el build_id + el motor
+- Cada resultado se guarda en columnar (Parquet, requiere pyarrow) en
+  .cache/sql/; el índice .cache/sql/indice.json lleva tamaño y último uso
+- Varios procesos comparten la caché: al escribir el índice se relee el de
+  disco bajo un bloqueo de archivo (indice.lock) y se le aplican solo los
+  cambios de este proceso; los Parquet que no figuran en el índice (de
+  escrituras perdidas o interrumpidas) se borran
+- Desalojo LRU: al guardar, si el total supera CACHE_MAX_BYTES se borran
+  las entradas usadas hace más tiempo
+- Estadísticas de aciertos/fallos por ejecución y acumuladas
+
+Sin pyarrow (o con USAR_CACHE = False) las consultas se ejecutan siempre.
+Los errores SQL no se cachean.
+
+Uso:
+    from cache_sql import leer_sql, consultar_filas, imprimir_estadisticas
+    df = leer_sql(sql, con)                       # como pd.read_sql_query
+    cols, rows = consultar_filas(con, sql)        # como cursor.fetchall
+"""
+
+import hashlib, json, os, re, sqlite3, threading, time, uuid, datetime
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+import pandas as pd
+
+from capa_parquet import pyarrow_disponible
+from conexiones import es_duckdb, leer_df, filas
+
+ROOT = Path(__file__).resolve().parent.parent
+CACHE_DIR = ROOT / ".cache" / "sql"
+INDICE_PATH = CACHE_DIR / "indice.json"
+BLOQUEO_PATH = CACHE_DIR / "indice.lock"
+
+USAR_CACHE = True
+CACHE_MAX_BYTES = 256 * 1024 * 1024   # tope del directorio de caché
+TABLA_BUILD = "build_info"
+EDAD_MIN_HUERFANO = 300   # s; un Parquet recién escrito aún puede estar por indexarse
+
+RE_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+_indice = None
+_cambios = None             # lo que este proceso cambió desde la última escritura del índice
+_lock = threading.RLock()   # índice compartido entre hilos (consultas concurrentes)
+_local = threading.local()  # origen de la última consulta de cada hilo
+_sesion = {"aciertos": 0, "fallos": 0, "sin_cache": 0}
+
+# ------------------ Huella de la base ------------------
+def registrar_build(con, origen: str):
+    """Nuevo build_id en build_info (invalida la caché de resultados de esta base)."""
+    con.execute(f"CREATE TABLE IF NOT EXISTS {TABLA_BUILD} (build_id TEXT, origen TEXT, creado TEXT)")
+    con.execute(f"DELETE FROM {TABLA_BUILD}")
+    con.execute(f"INSERT INTO {TABLA_BUILD}(build_id, origen, creado) VALUES (?,?,?)",
+                (uuid.uuid4().hex, origen, datetime.datetime.now().isoformat(timespec="seconds")))
+    con.commit()
+
+def huella_db(con) -> str | None:
+    """Identifica el contenido de la base; None si no se puede (base en memoria)."""
+    if es_duckdb(con):
+        try:
+            fila = con.execute(f"SELECT build_id FROM {TABLA_BUILD} LIMIT 1").fetchone()
+        except Exception:
+            return None
+        return f"duckdb:{fila[0]}" if fila else None
+    esquema = con.execute("PRAGMA schema_version").fetchone()[0]
+    try:
+        fila = con.execute(f"SELECT build_id FROM {TABLA_BUILD} LIMIT 1").fetchone()
+        if fila:
+            return f"build:{fila[0]}:{esquema}"
+    except sqlite3.Error:
+        pass
+    ruta = next((r[2] for r in con.execute("PRAGMA database_list") if r[1] == "main"), "")
+    if not ruta:
+        return None
+    st = os.stat(ruta)
+    return f"archivo:{st.st_size}:{st.st_mtime_ns}:{esquema}"
+
+def normalizar_sql(sql: str) -> str:
+    partes = RE_LITERAL.split(sql.strip().rstrip(";").strip())
+    return "".join(p if i % 2 else " ".join(p.split()) for i, p in enumerate(partes))
+
+def clave_consulta(sql, params, huella, tipo) -> str:
+    texto = json.dumps([tipo, normalizar_sql(sql), list(params or []), huella], default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+# ------------------ Índice (LRU) ------------------
+def _leer_indice() -> dict:
+    try:
+        with open(INDICE_PATH, "r", encoding="utf-8") as f:
+            indice = json.load(f)
+    except (OSError, ValueError):
+        indice = {}
+    indice.setdefault("entradas", {})
+    indice.setdefault("aciertos", 0)
+    indice.setdefault("fallos", 0)
+    return indice
+
+def _sin_cambios() -> dict:
+    return {"nuevas": {}, "usos": {}, "borradas": set(), "aciertos": 0, "fallos": 0}
+
+def _cargar_indice() -> dict:
+    global _indice, _cambios
+    if _indice is None:
+        _indice, _cambios = _leer_indice(), _sin_cambios()
+    return _indice
+
+@contextmanager
+def _bloqueo_indice():
+    """Bloqueo exclusivo entre procesos (flock / msvcrt.locking) sobre indice.lock."""
+    with open(BLOQUEO_PATH, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _mezclar_cambios(indice: dict, cambios: dict):
+    """Aplica al índice leído de disco lo que hizo este proceso (altas, bajas, usos, contadores)."""
+    entradas = indice["entradas"]
+    for clave in cambios["borradas"]:
+        entradas.pop(clave, None)
+    entradas.update(cambios["nuevas"])
+    for clave, uso in cambios["usos"].items():
+        if clave in entradas:
+            entradas[clave]["uso"] = max(entradas[clave]["uso"], uso)
+    indice["aciertos"] += cambios["aciertos"]
+    indice["fallos"] += cambios["fallos"]
+
+def _barrer_huerfanos(indice: dict):
+    """Borra los Parquet de la caché que no figuran en el índice."""
+    listados = {e["archivo"] for e in indice["entradas"].values()}
+    limite = time.time() - EDAD_MIN_HUERFANO
+    for ruta in CACHE_DIR.glob("*.parquet"):
+        try:
+            if ruta.name not in listados and ruta.stat().st_mtime < limite:
+                ruta.unlink()
+        except OSError:
+            pass
+
+def _guardar_indice():
+    """Relee el índice de disco bajo el bloqueo, le mezcla los cambios de este proceso y lo reescribe."""
+    global _indice, _cambios
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with _bloqueo_indice():
+            indice = _leer_indice()
+            _mezclar_cambios(indice, _cambios)
+            _desalojar(indice)
+            _barrer_huerfanos(indice)
+            tmp = INDICE_PATH.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(indice, f, indent=1, ensure_ascii=False)
+            os.replace(tmp, INDICE_PATH)
+    except OSError:
+        return  # la caché es opcional; los cambios se reintentan en la próxima escritura
+    _indice, _cambios = indice, _sin_cambios()
+
+def _desalojar(indice: dict):
+    """Borra entradas por último uso (más antiguo primero) hasta quedar bajo el tope."""
+    entradas = indice["entradas"]
+    total = sum(e["bytes"] for e in entradas.values())
+    for clave, e in sorted(entradas.items(), key=lambda kv: kv[1]["uso"]):
+        if total <= CACHE_MAX_BYTES:
+            break
+        (CACHE_DIR / e["archivo"]).unlink(missing_ok=True)
+        total -= e["bytes"]
+        del entradas[clave]
+
+def _buscar(clave):
+    indice = _cargar_indice()
+    e = indice["entradas"].get(clave)
+    if e is None:
+        return None
+    import pyarrow.parquet as pq
+    try:
+        tabla = pq.read_table(CACHE_DIR / e["archivo"])
+    except Exception:
+        del indice["entradas"][clave]   # archivo borrado o corrupto: cuenta como fallo
+        _cambios["nuevas"].pop(clave, None)
+        _cambios["borradas"].add(clave)
+        return None
+    e["uso"] = _cambios["usos"][clave] = time.time()
+    return tabla
+
+def _guardar(clave, tabla, sql):
+    import pyarrow.parquet as pq
+    indice = _cargar_indice()
+    archivo = f"{clave[:32]}.parquet"
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        pq.write_table(tabla, CACHE_DIR / archivo)
+    except Exception:
+        return
+    indice["entradas"][clave] = _cambios["nuevas"][clave] = {
+        "archivo": archivo,
+        "bytes": (CACHE_DIR / archivo).stat().st_size,
+        "uso": time.time(),
+        "sql": normalizar_sql(sql)[:200],
+    }
+    _cambios["borradas"].discard(clave)
+
+def _identicos(a, b) -> bool:
+    """Mismo resultado, incluidos tipos (1 y 1.0 no son iguales en un CSV)."""
+    if isinstance(b, pd.DataFrame):
+        return list(a.columns) == list(b.columns) and a.dtypes.equals(b.dtypes) and a.equals(b)
+    return a[0] == b[0] and len(a[1]) == len(b[1]) and all(
+        x == y and type(x) is type(y) for fa, fb in zip(a[1], b[1]) for x, y in zip(fa, fb))
+
+def _con_cache(con, sql, params, tipo, ejecutar, a_tabla, de_tabla):
+    """Resultado desde la caché o ejecutando la consulta (y guardándolo)."""
+    huella = huella_db(con) if USAR_CACHE and pyarrow_disponible() else None
+    _local.origen = "base"
+    if huella is None:
+        _sesion["sin_cache"] += 1
+        return ejecutar()
+    clave = clave_consulta(sql, params, huella, tipo)
+    with _lock:
+        indice = _cargar_indice()
+        tabla = _buscar(clave)
+        if tabla is not None:
+            _sesion["aciertos"] += 1
+            indice["aciertos"] += 1
+            _cambios["aciertos"] += 1
+            _guardar_indice()
+    if tabla is not None:
+        _local.origen = "cache"
+        return de_tabla(tabla)
+
+    res = ejecutar()
+    try:
+        tabla = a_tabla(res)
+        if tabla is not None and not _identicos(de_tabla(tabla), res):
+            tabla = None   # p. ej. enteros y reales en una columna: Parquet los igualaría
+    except Exception:
+        tabla = None   # tipos mezclados en una columna, nombres repetidos...
+    with _lock:
+        indice = _cargar_indice()   # otro hilo pudo reemplazarlo al guardar
+        _sesion["fallos"] += 1
+        indice["fallos"] += 1
+        _cambios["fallos"] += 1
+        if tabla is not None:
+            _guardar(clave, tabla, sql)
+        _guardar_indice()
+    return res
+
+# ------------------ API ------------------
+def leer_sql(sql, con, params=None) -> pd.DataFrame:
+    """pd.read_sql_query con caché (mismos dtypes al leer de la caché)."""
+    def a_tabla(df):
+        import pyarrow as pa
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    return _con_cache(
+        con, sql, params, "df",
+        ejecutar=lambda: leer_df(con, sql, params),
+        a_tabla=a_tabla,
+        de_tabla=lambda t: t.to_pandas(),
+    )
+
+def consultar_filas(con, sql, params=()):
+    """(columnas, filas) como cursor.execute + fetchall, con caché."""
+    def ejecutar():
+        return filas(con, sql, params)
+
+    def a_tabla(res):
+        import pyarrow as pa
+        cols, rows = res
+        if not cols:
+            return None
+        datos = list(zip(*rows)) if rows else [[] for _ in cols]
+        return pa.Table.from_arrays([pa.array(list(c)) for c in datos], names=[f"c{i}" for i in range(len(cols))],
+                                    metadata={"columnas": json.dumps(cols)})
+
+    def de_tabla(t):
+        cols = json.loads(t.schema.metadata[b"columnas"])
+        return cols, list(zip(*[t.column(i).to_pylist() for i in range(t.num_columns)]))
+
+    return _con_cache(con, sql, params, "filas", ejecutar, a_tabla, de_tabla)
+
+def origen_ultima_consulta() -> str | None:
+    """'cache' o 'base' según de dónde salió la última consulta de este hilo (y lo olvida)."""
+    origen = getattr(_local, "origen", None)
+    _local.origen = None
+    return origen
+
+def estadisticas() -> dict:
+    with _lock:
+        indice = _cargar_indice()
+        return {
+            **_sesion,
+            "entradas": len(indice["entradas"]),
+            "bytes": sum(e["bytes"] for e in indice["entradas"].values()),
+            "aciertos_total": indice["aciertos"],
+            "fallos_total": indice["fallos"],
+        }
+
+def imprimir_estadisticas():
+    st = estadisticas()
+    consultas = st["aciertos"] + st["fallos"]
+    tasa = 100.0 * st["aciertos"] / consultas if consultas else 0.0
+    print(f"[CACHE] aciertos={st['aciertos']} fallos={st['fallos']} ({tasa:.0f}% aciertos)"
+          f" | sin caché={st['sin_cache']} | {st['entradas']} entradas, {st['bytes'] / 1e6:.1f} MB"
+          f" | acumulado: {st['aciertos_total']} aciertos / {st['fallos_total']} fallos")
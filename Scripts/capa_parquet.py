@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+capa_parquet.py
+Capa intermedia Parquet entre la limpieza y build_base_final.py.
+
+Cada dataset vive en Data/Parquet/<nombre>/ particionado estilo Hive:
+    Data/Parquet/<nombre>/fuente=<fuente>/anio=<anio>/parte-*.parquet
+
+- Los pasos de limpieza escriben con tipos fijos (anio int16, dimensiones
+  como diccionario/categoría) y así no se vuelve a inferir tipos al leer
+- La lectura proyecta solo las columnas pedidas y poda particiones por
+  fuente (directorio) y por anio (filtro sobre la partición)
+
+Requiere pyarrow (opcional: sin él los scripts siguen usando CSV).
+"""
+
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+PARQUET_DIR = ROOT / "Data" / "Parquet"
+
+# Datasets usados por el pipeline
+DS_PSA_CLEAN = "psa_clean"        # ancho F10..F19 (limpiar_psa.py)
+DS_HECHOS_DEDUP = "hechos_dedup"  # largo agregado (limpiar_csv_sql.py)
+
+DIMENSIONES = ["entidad_norm", "sexo", "edad_quinquenal", "cie10_code"]
+
+def pyarrow_disponible() -> bool:
+    try:
+        import pyarrow.dataset  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def requerir_pyarrow():
+    if not pyarrow_disponible():
+        raise SystemExit("La salida Parquet requiere pyarrow: pip install pyarrow")
+
+def ruta_fuente(nombre: str, fuente: str) -> Path:
+    return PARQUET_DIR / nombre / f"fuente={fuente}"
+
+def existe_dataset(nombre: str, fuente: str) -> bool:
+    d = ruta_fuente(nombre, fuente)
+    return d.is_dir() and any(d.rglob("*.parquet"))
+
+def _particion_anio():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("anio", pa.int16())]), flavor="hive")
+
+# ------------------ Escritura ------------------
+def borrar_fuente(nombre: str, fuente: str):
+    """Elimina la partición completa de una fuente (antes de reescribirla)."""
+    shutil.rmtree(ruta_fuente(nombre, fuente), ignore_errors=True)
+
+def preparar_anio(df: pd.DataFrame, col_anio: str) -> pd.DataFrame:
+    """Agrega/normaliza la columna de partición 'anio' como Int16."""
+    df = df.copy()
+    df["anio"] = pd.to_numeric(df[col_anio], errors="coerce").astype("Int16")
+    return df
+
+def escribir_particiones(df: pd.DataFrame, nombre: str, fuente: str, parte: int = 0):
+    """
+    Escribe `df` (debe traer columna 'anio') bajo <nombre>/fuente=<fuente>/anio=*/.
+    `parte` distingue archivos cuando se escribe por bloques; para reescribir
+    una fuente completa llamar antes a borrar_fuente().
+    """
+    requerir_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    df = df.copy()
+    for c in DIMENSIONES:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    destino = ruta_fuente(nombre, fuente)
+    destino.mkdir(parents=True, exist_ok=True)
+    ds.write_dataset(
+        table, destino, format="parquet",
+        partitioning=_particion_anio(),
+        basename_template=f"parte-{parte}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+# ------------------ Lectura ------------------
+def leer_particiones(nombre: str, fuente: str, columnas=None, anios=None) -> pd.DataFrame:
+    """
+    Lee el dataset de una fuente con proyección de columnas (se ignoran las
+    que no existan) y poda de particiones por `anios` (iterable de años).
+    Las dimensiones vuelven como category (to_sql las escribe como texto).
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(ruta_fuente(nombre, fuente), format="parquet",
+                         partitioning=_particion_anio())
+    if columnas is not None:
+        columnas = [c for c in columnas if c in dataset.schema.names]
+    filtro = None
+    if anios is not None:
+        filtro = ds.field("anio").isin([int(a) for a in anios])
+
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
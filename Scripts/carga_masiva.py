@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+carga_masiva.py
+Carga masiva de DataFrames a SQLite para build_base_final.py.
+
+En lugar de DataFrame.to_sql (enlaza fila por fila y confirma por tabla):
+- Todas las tablas se insertan con executemany en lotes, dentro de UNA
+  transacción
+- Durante la carga se usan pragmas de carga (sin journal, sin fsync, caché
+  grande, bloqueo exclusivo); al terminar se restauran los de la conexión
+- Los índices se crean DESPUÉS de la carga (create_indexes)
+- Se reporta filas/s por tabla
+
+Sin journal no hay rollback seguro: si la carga falla a la mitad la base
+queda incompleta y hay que reconstruirla (es lo que hace build_base_final).
+
+Uso:
+    from carga_masiva import sesion_carga, cargar_tabla
+    with sesion_carga(con) as stats:
+        cargar_tabla(con, "fact_urgencias", df, stats)
+"""
+
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+LOTE_FILAS = 50_000          # filas por executemany
+CACHE_KIB = 256 * 1024       # cache_size durante la carga (KiB)
+
+PRAGMAS_CARGA = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -CACHE_KIB,
+    "locking_mode": "EXCLUSIVE",
+    "temp_store": "MEMORY",
+}
+
+# ------------------ Conversión a tipos Python ------------------
+def _columna_py(ser: pd.Series) -> list:
+    """Columna como lista de tipos que sqlite3 sabe enlazar (NaN/NA → None)."""
+    if ser.isna().any():
+        return ser.astype(object).where(ser.notna(), None).tolist()
+    if isinstance(ser.dtype, pd.CategoricalDtype) or ser.dtype.kind not in "biuf":
+        return ser.astype(object).tolist()
+    return ser.tolist()
+
+def filas_sql(df: pd.DataFrame, cols: list[str]):
+    """Filas de df[cols] como tuplas de tipos Python, en lotes de LOTE_FILAS."""
+    for ini in range(0, len(df), LOTE_FILAS):
+        parte = df.iloc[ini:ini + LOTE_FILAS]
+        yield from zip(*[_columna_py(parte[c]) for c in cols])
+
+# ------------------ Pragmas / transacción ------------------
+def _pragma(con, nombre):
+    return con.execute(f"PRAGMA {nombre};").fetchone()[0]
+
+@contextmanager
+def sesion_carga(con):
+    """
+    Aplica PRAGMAS_CARGA, abre una transacción y al salir confirma, restaura
+    los pragmas previos e imprime el resumen de filas/s. Entrega una lista
+    donde cargar_tabla acumula sus métricas.
+    """
+    previos = {k: _pragma(con, k) for k in PRAGMAS_CARGA}
+    con.commit()
+    for k, v in PRAGMAS_CARGA.items():
+        con.execute(f"PRAGMA {k} = {v};")
+    stats = []
+    t0 = time.perf_counter()
+    con.execute("BEGIN;")
+    try:
+        yield stats
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        for k, v in previos.items():
+            con.execute(f"PRAGMA {k} = {v};")
+        # salir de locking_mode=EXCLUSIVE solo libera el candado al siguiente acceso
+        con.execute("SELECT 1 FROM sqlite_master LIMIT 1;").fetchall()
+    imprimir_resumen(stats, time.perf_counter() - t0)
+
+def _existe_tabla(con, tabla) -> bool:
+    return con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (tabla,)).fetchone() is not None
+
+# tipos de columna que usa to_sql sin SQLAlchemy (pandas.io.sql._SQL_TYPES)
+TIPOS_SQL = {"string": "TEXT", "floating": "REAL", "integer": "INTEGER", "timedelta64": "INTEGER",
+             "datetime": "TIMESTAMP", "datetime64": "TIMESTAMP", "date": "DATE", "time": "TIME",
+             "boolean": "INTEGER"}
+
+def crear_tabla(con, tabla: str, df: pd.DataFrame):
+    """
+    CREATE TABLE con el esquema que le daría to_sql (tipo según el dtype de
+    cada columna), en la misma conexión y sin confirmar: to_sql hace COMMIT
+    y cerraría la transacción de sesion_carga.
+    """
+    cols = ", ".join(f'"{c}" {TIPOS_SQL.get(pd.api.types.infer_dtype(df[c].iloc[:0], skipna=True), "TEXT")}'
+                     for c in df.columns)
+    con.execute(f'CREATE TABLE "{tabla}" ({cols})')
+
+# ------------------ Carga ------------------
+def cargar_tabla(con, tabla: str, df: pd.DataFrame, stats: list | None = None) -> dict:
+    """
+    Inserta df en `tabla` con executemany por lotes (sin confirmar: la
+    transacción la controla sesion_carga). Si la tabla no existe se crea con
+    el esquema que le daría to_sql (crear_tabla), dentro de la misma transacción.
+    """
+    if not _existe_tabla(con, tabla):
+        crear_tabla(con, tabla, df)
+    cols = list(df.columns)
+    ins = f"INSERT INTO {tabla}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+
+    t0 = time.perf_counter()
+    con.executemany(ins, filas_sql(df, cols))
+    seg = time.perf_counter() - t0
+
+    st = {"tabla": tabla, "filas": len(df), "seg": seg, "filas_s": len(df) / seg if seg > 0 else 0.0}
+    if stats is not None:
+        stats.append(st)
+    return st
+
+def imprimir_resumen(stats: list, total_seg: float):
+    if not stats:
+        return
+    print("\n[CARGA] tabla                         filas        seg      filas/s")
+    for st in stats:
+        print(f"  {st['tabla']:<28s} {st['filas']:>10,} {st['seg']:>10.2f} {st['filas_s']:>12,.0f}")
+    filas = sum(st["filas"] for st in stats)
+    print(f"  {'TOTAL (transacción)':<28s} {filas:>10,} {total_seg:>10.2f} {filas / total_seg if total_seg else 0:>12,.0f}")
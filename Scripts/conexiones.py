@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+conexiones.py
+Conexiones SQLite de SOLO LECTURA, afinadas y reutilizadas, para los scripts
+de análisis y LLM (consultas_descriptivas, analisis_mineria, perfilado_resumen,
+consultas_llm, consultas_rag, consultas_predictivas).
+
+En lugar de sqlite3.connect(DB) con la configuración por defecto en cada
+consulta:
+- La base se abre con URI mode=ro y PRAGMA query_only (ningún script de
+  análisis puede modificarla por error)
+- I/O mapeado en memoria (mmap_size), caché de páginas grande y temporales
+  en memoria (ORDER BY / GROUP BY grandes sin tocar disco)
+- Un pool pequeño por base, seguro entre hilos: conexion_lectura() entrega
+  una conexión libre (o abre una nueva hasta TAMANO_POOL) y la devuelve al
+  salir del with; cada hilo que consulta a la vez usa su propia conexión
+- Contador de consultas por conexión: las que pasan por leer_df() / filas()
+  (las de cache_sql); PRAGMAs, huella de la base y lecturas internas de
+  FTS5 no cuentan
+- Registro de consultas (opcional: variable de entorno REGISTRAR_CONSULTAS=1):
+  cada SELECT/WITH que llega a la base se agrega a
+  docs/perf/registro_consultas.jsonl (script + SQL con parámetros ya
+  sustituidos); es la carga de trabajo que analiza asesor_indices.py. Se
+  omiten las lecturas internas (sqlite_*, pragma_*, tablas sombra de FTS5,
+  build_info, cubos_meta) y al pasar de MAX_REGISTRO_BYTES el archivo rota a
+  registro_consultas.1.jsonl (se conservan los dos)
+- Dos motores detrás de la misma fábrica: una ruta *.duckdb (la que escribe
+  build_base_final.py --engine duckdb) se abre con DuckDB en read_only,
+  cualquier otra con SQLite. leer_df() y filas() leen igual de los dos
+  (las sumas enteras de DuckDB, HUGEINT, vuelven como int64 igual que en
+  SQLite). DuckDB es opcional: pip install duckdb
+
+Uso:
+    from conexiones import conexion_lectura, imprimir_conexiones
+    with conexion_lectura("salud_federada.db") as con:   # o "salud_federada.duckdb"
+        df = leer_df(con, sql)
+    imprimir_conexiones()
+"""
+
+import json, os, queue, re, sqlite3, sys, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+TAMANO_POOL = 4
+# Registro de consultas: solo si se pide (REGISTRAR_CONSULTAS=1 python Scripts/...)
+REGISTRAR_CONSULTAS = os.environ.get("REGISTRAR_CONSULTAS", "") not in ("", "0")
+REGISTRO_CONSULTAS = Path(__file__).resolve().parent.parent / "docs" / "perf" / "registro_consultas.jsonl"
+REGISTRO_ANTERIOR = REGISTRO_CONSULTAS.with_suffix(".1.jsonl")
+MAX_REGISTRO_BYTES = 16 * 1024 * 1024   # desde aquí el registro rota a REGISTRO_ANTERIOR
+MMAP_BYTES = 256 * 1024 * 1024   # mmap_size
+CACHE_KIB = 128 * 1024           # cache_size por conexión (KiB)
+
+EXT_DUCKDB = (".duckdb", ".ddb")   # extensiones que se abren con DuckDB
+
+PRAGMAS_LECTURA = {
+    "query_only": "ON",
+    "mmap_size": MMAP_BYTES,
+    "cache_size": -CACHE_KIB,
+    "temp_store": "MEMORY",
+}
+
+_pools = {}        # ruta -> {"libres": LifoQueue, "abiertas": [con], "lock": Lock}
+_contadores = {}   # id(con) -> {"ruta", "consultas", "prestamos"}
+_lock = threading.Lock()
+_lock_registro = threading.Lock()
+RE_LECTURA = re.compile(r"\s*(SELECT|WITH)\b", re.I)
+# Lecturas internas que no son carga de trabajo: catálogo de SQLite, funciones
+# pragma_*, tablas sombra de FTS5 y metadatos (cache_sql.TABLA_BUILD, cubos.META_CUBOS)
+RE_INTERNA = re.compile(r"\b(sqlite_\w+|pragma_\w+|\w+_fts_(config|data|idx|docsize|content)|build_info|cubos_meta)\b", re.I)
+
+# ------------------ Registro de consultas ------------------
+def registrar_consulta(sentencia: str):
+    """Agrega una consulta de lectura al registro (los PRAGMA y demás se omiten)."""
+    if not REGISTRAR_CONSULTAS or not RE_LECTURA.match(sentencia) or RE_INTERNA.search(sentencia):
+        return
+    linea = json.dumps({"script": Path(sys.argv[0] or "?").name, "sql": sentencia}, ensure_ascii=False)
+    with _lock_registro:
+        try:
+            REGISTRO_CONSULTAS.parent.mkdir(parents=True, exist_ok=True)
+            if REGISTRO_CONSULTAS.exists() and REGISTRO_CONSULTAS.stat().st_size >= MAX_REGISTRO_BYTES:
+                os.replace(REGISTRO_CONSULTAS, REGISTRO_ANTERIOR)
+            with open(REGISTRO_CONSULTAS, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+        except OSError:
+            pass  # el registro es opcional
+
+def leer_registro(ruta=None) -> list[dict]:
+    """
+    Entradas {'script', 'sql'} del registro de consultas (lista vacía si no
+    existe); sin `ruta`, también las del registro ya rotado.
+    """
+    entradas = []
+    for r in ([ruta] if ruta else [REGISTRO_ANTERIOR, REGISTRO_CONSULTAS]):
+        try:
+            with open(r, "r", encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        e = json.loads(linea)
+                    except ValueError:
+                        continue   # línea cortada por otro proceso
+                    if not RE_INTERNA.search(e.get("sql", "")):   # registros de antes del filtro
+                        entradas.append(e)
+        except OSError:
+            pass
+    return entradas
+
+# ------------------ Motores ------------------
+def motor_de(db) -> str:
+    """'duckdb' para rutas *.duckdb / *.ddb, 'sqlite' para el resto."""
+    return "duckdb" if Path(str(db)).suffix.lower() in EXT_DUCKDB else "sqlite"
+
+def duckdb_disponible() -> bool:
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def requerir_duckdb():
+    if not duckdb_disponible():
+        raise SystemExit("El motor duckdb requiere duckdb: pip install duckdb")
+
+def es_duckdb(con) -> bool:
+    return type(con).__module__.lstrip("_").split(".")[0] == "duckdb"   # _duckdb.DuckDBPyConnection
+
+def _abrir_duckdb(ruta):
+    requerir_duckdb()
+    import duckdb
+    con = duckdb.connect(ruta, read_only=True)
+    _contadores[id(con)] = {"ruta": ruta, "consultas": 0, "prestamos": 0}
+    return con
+
+def _contar(con, sql):
+    """Cuenta una consulta de leer_df/filas; en DuckDB también la registra (en SQLite, el trace callback)."""
+    c = _contadores.get(id(con))
+    if c is not None:
+        c["consultas"] += 1
+    if es_duckdb(con):
+        registrar_consulta(sql)
+
+def _arrow_a_pandas(tabla) -> pd.DataFrame:
+    """DECIMAL(38,0) (SUM de enteros en DuckDB) -> int64, como en SQLite."""
+    import pyarrow as pa
+    for i, campo in enumerate(tabla.schema):
+        if pa.types.is_decimal(campo.type) and campo.type.scale == 0:
+            tabla = tabla.set_column(i, campo.name, tabla.column(i).cast(pa.int64()))
+    return tabla.to_pandas()
+
+# ------------------ Lectura (ambos motores) ------------------
+def leer_df(con, sql, params=None) -> pd.DataFrame:
+    """pd.read_sql_query para una conexión SQLite o DuckDB."""
+    _contar(con, sql)
+    if not es_duckdb(con):
+        return pd.read_sql_query(sql, con, params=params or [])
+    res = con.execute(sql, list(params or []))
+    a_arrow = getattr(res, "to_arrow_table", None) or res.fetch_arrow_table
+    return _arrow_a_pandas(a_arrow())
+
+def filas(con, sql, params=()):
+    """(columnas, filas) como cursor.execute + fetchall, para SQLite o DuckDB."""
+    cur = con.cursor()
+    _contar(con, sql)
+    cur.execute(sql, list(params) if es_duckdb(con) else params)
+    cols = [c[0] for c in cur.description] if cur.description else []
+    return cols, cur.fetchall()
+
+def plan_consulta(con, sql, params=None) -> list[str]:
+    """EXPLAIN QUERY PLAN (SQLite, una línea por paso) o EXPLAIN (DuckDB) de `sql`."""
+    if es_duckdb(con):
+        filas_plan = con.execute(f"EXPLAIN {sql}", list(params or [])).fetchall()
+        return [l for r in filas_plan for l in str(r[-1]).splitlines() if l.strip()]
+    return [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+
+# ------------------ Apertura ------------------
+def _ruta(db) -> str:
+    return str(Path(db).resolve())
+
+def abrir_lectura(db):
+    """
+    Conexión nueva de solo lectura: SQLite con PRAGMAS_LECTURA y registro de
+    consultas (trace callback), o DuckDB (read_only) si la ruta es *.duckdb.
+    """
+    ruta = _ruta(db)
+    if not Path(ruta).exists():
+        raise FileNotFoundError(f"No existe la base: {ruta}")
+    if motor_de(ruta) == "duckdb":
+        return _abrir_duckdb(ruta)
+    con = sqlite3.connect(f"{Path(ruta).as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    for k, v in PRAGMAS_LECTURA.items():
+        con.execute(f"PRAGMA {k} = {v};")
+    _contadores[id(con)] = {"ruta": ruta, "consultas": 0, "prestamos": 0}
+    con.set_trace_callback(registrar_consulta)
+    return con
+
+# ------------------ Pool ------------------
+def _pool(ruta) -> dict:
+    with _lock:
+        if ruta not in _pools:
+            _pools[ruta] = {"libres": queue.LifoQueue(), "abiertas": [], "lock": threading.Lock()}
+        return _pools[ruta]
+
+def tomar_conexion(db):
+    """Conexión libre del pool (la abre si hay cupo; si no, espera a que se libere una)."""
+    ruta = _ruta(db)
+    pool = _pool(ruta)
+    try:
+        con = pool["libres"].get_nowait()
+    except queue.Empty:
+        with pool["lock"]:
+            nueva = len(pool["abiertas"]) < TAMANO_POOL
+            if nueva:
+                con = abrir_lectura(ruta)
+                pool["abiertas"].append(con)
+        if not nueva:
+            con = pool["libres"].get()
+    _contadores[id(con)]["prestamos"] += 1
+    return con
+
+def devolver_conexion(con):
+    pool = _pools.get(_contadores[id(con)]["ruta"])
+    if pool is not None and con in pool["abiertas"]:
+        pool["libres"].put(con)
+    else:
+        con.close()
+
+@contextmanager
+def conexion_lectura(db):
+    """with conexion_lectura(db) as con: ... (la conexión vuelve al pool al salir)."""
+    con = tomar_conexion(db)
+    try:
+        yield con
+    finally:
+        devolver_conexion(con)
+
+def cerrar_pool(db=None):
+    """Cierra las conexiones del pool de `db` (o de todos)."""
+    rutas = [_ruta(db)] if db is not None else list(_pools)
+    for ruta in rutas:
+        pool = _pools.pop(ruta, None)
+        for con in (pool or {}).get("abiertas", []):
+            con.close()
+
+# ------------------ Contadores ------------------
+def estadisticas_conexiones() -> list[dict]:
+    """Una fila por conexión abierta: ruta, consultas (leer_df / filas) y veces prestada."""
+    filas = []
+    for ruta, pool in _pools.items():
+        for i, con in enumerate(pool["abiertas"], start=1):
+            c = _contadores[id(con)]
+            filas.append({"base": Path(ruta).name, "conexion": i,
+                          "consultas": c["consultas"], "prestamos": c["prestamos"]})
+    return filas
+
+def imprimir_conexiones():
+    filas = estadisticas_conexiones()
+    if not filas:
+        return
+    print("[CONEXIONES] base                     con  consultas  préstamos")
+    for f in filas:
+        print(f"  {f['base']:<28s} {f['conexion']:>3} {f['consultas']:>10} {f['prestamos']:>10}")
@@ -8,23 +8,49 @@ Resuelve las 10 preguntas DESCRIPTIVAS del proyecto usando SQL + pandas,
 y genera gráficas con un estilo profesional, márgenes ampliados,
 tipografía grande y sin texto cortado.
 
+Cada pregunta hace su SQL, escribe sus CSV y devuelve las gráficas a dibujar
+(nombre, función de dibujo, datos). Las gráficas se dibujan con la API de
+objetos (Figure + backend Agg), sin estado global de pyplot.
+
+Con --concurrente el SQL de las 10 preguntas corre en un pool de hilos (cada
+hilo con su propia conexión de solo lectura) y las gráficas en un pool de
+procesos. Los CSV son idénticos a los del modo secuencial.
+
 Salida:
 - CSV por pregunta en: docs/consultas_descriptivas/
 - Gráficas en: docs/figuras_descriptivas/
+
+Uso:
+    python Scripts/consultas_descriptivas.py
+    python Scripts/consultas_descriptivas.py --concurrente --procesos 0
+    python Scripts/consultas_descriptivas.py --db salud_federada.duckdb
 """
 
 import os
-import sqlite3
 import re
+import argparse
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from cubos import enrutar_sql
+from cache_sql import leer_sql, imprimir_estadisticas
+from conexiones import conexion_lectura, imprimir_conexiones, TAMANO_POOL
+from consultas_texto import sql_frases
+import medicion_consultas
+from medicion_consultas import medir_consulta, llamador, imprimir_mediciones
 
 DB_PATH = "salud_federada.db"
 OUT_DIR = "docs/consultas_descriptivas"
 FIG_DIR = "docs/figuras_descriptivas"
 
+# términos de alarma de la pregunta 10 ("x*" = palabras que empiezan con x)
+TERMINOS_ALARMA = ["grave*", "urgente*", "intoxicac*", "riesgo*", "coma*"]
+
 os.makedirs(OUT_DIR, exist_ok=True)
 os.makedirs(FIG_DIR, exist_ok=True)
 
@@ -45,23 +71,24 @@ plt.rcParams.update({
     "legend.fontsize": 12,
 })
 
-def ajustar_margenes():
+def ajustar_margenes(fig):
     """Evita textos cortados en TODAS las gráficas."""
-    plt.tight_layout()
-    plt.subplots_adjust(left=0.30, right=0.95, top=0.90, bottom=0.20)
+    fig.tight_layout()
+    fig.subplots_adjust(left=0.30, right=0.95, top=0.90, bottom=0.20)
 
 
 # =====================================================
 # AUXILIARES GENERALES
 # =====================================================
 
-def conectar():
-    return sqlite3.connect(DB_PATH)
-
-
 def ejecutar_sql(conn, sql, params=None):
     try:
-        df = pd.read_sql_query(sql, conn, params=params or [])
+        # agregaciones sobre hechos → cubo pre-agregado más pequeño (cubos.py);
+        # resultado desde la caché en disco si la base no cambió (cache_sql.py)
+        sql_final = enrutar_sql(sql, conn)
+        # tiempo, filas y bytes por consulta; las lentas, con su plan (medicion_consultas.py)
+        df = medir_consulta(conn, sql_final, lambda: leer_sql(sql_final, conn, params),
+                            params, etiqueta=llamador())
         return df
     except Exception as e:
         print(f"[ERROR] Falló la consulta SQL:\n{sql}\n{e}\n")
@@ -77,8 +104,21 @@ def guardar_csv(df, nombre_base):
     print(f"[OK] CSV guardado: {ruta}")
 
 
-def configurar_plt():
-    plt.clf()
+def renderizar(grafica):
+    """
+    Dibuja y guarda una gráfica (nombre_png, funcion, datos) en una Figure
+    propia con el backend Agg: no usa el estado global de pyplot, así que
+    puede correr en otro proceso.
+    """
+    nombre, dibujar, datos = grafica
+    fig = Figure()                     # figsize y estilo desde rcParams
+    FigureCanvasAgg(fig)
+    dibujar(fig.add_subplot(), *datos)
+    ajustar_margenes(fig)
+    ruta = os.path.join(FIG_DIR, nombre)
+    fig.savefig(ruta)
+    print(f"[OK] {nombre} guardada")
+    return ruta
 
 
 # =====================================================
@@ -147,20 +187,18 @@ def pregunta_1(conn):
     df = ejecutar_sql(conn, sql)
     guardar_csv(df, "pregunta01_evolucion_F10_por_sexo")
     if df.empty:
-        return
+        return []
+    return [("pregunta01.png", dibujar_1, (df,))]
 
-    configurar_plt()
-    for sexo, sub in df.groupby("sexo"):
-        plt.plot(sub["anio"], sub["total"], marker="o", label=sexo)
 
-    plt.title("Evolución de defunciones por F10 (2011–2016) por sexo")
-    plt.xlabel("Año")
-    plt.ylabel("Defunciones")
-    plt.legend()
-    ajustar_margenes()
+def dibujar_1(ax, df):
+    for sexo, sub in df.groupby("sexo"):
+        ax.plot(sub["anio"], sub["total"], marker="o", label=sexo)
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta01.png"))
-    print("[OK] pregunta01.png guardada")
+    ax.set_title("Evolución de defunciones por F10 (2011–2016) por sexo")
+    ax.set_xlabel("Año")
+    ax.set_ylabel("Defunciones")
+    ax.legend()
 
 
 def pregunta_2(conn):
@@ -175,18 +213,15 @@ def pregunta_2(conn):
     df = ejecutar_sql(conn, sql)
     guardar_csv(df, "pregunta02_urgencias_F12_2015")
     if df.empty:
-        return
+        return []
+    return [("pregunta02.png", dibujar_2, (df.head(10),))]
 
-    top = df.head(10)
-    configurar_plt()
-    plt.barh(top["entidad_norm"], top["total"])
-    plt.gca().invert_yaxis()
-    plt.title("Top entidades con urgencias por F12 (2015)")
-    plt.xlabel("Urgencias")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta02.png"))
-    print("[OK] pregunta02.png guardada")
+def dibujar_2(ax, top):
+    ax.barh(top["entidad_norm"], top["total"])
+    ax.invert_yaxis()
+    ax.set_title("Top entidades con urgencias por F12 (2015)")
+    ax.set_xlabel("Urgencias")
 
 
 def pregunta_3(conn):
@@ -202,14 +237,12 @@ def pregunta_3(conn):
         "Total": total.iloc[0, 0] if not total.empty else 0
     }])
     guardar_csv(df, "pregunta03_proporcion_F14")
+    return [("pregunta03.png", dibujar_3, (df,))]
 
-    configurar_plt()
-    plt.pie(df.iloc[0], labels=["F14", "Otras sustancias"], autopct='%1.1f%%')
-    plt.title("Proporción F14 vs F10–F19 (2015)")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta03.png"))
-    print("[OK] pregunta03.png guardada")
+def dibujar_3(ax, df):
+    ax.pie(df.iloc[0], labels=["F14", "Otras sustancias"], autopct='%1.1f%%')
+    ax.set_title("Proporción F14 vs F10–F19 (2015)")
 
 
 def pregunta_4(conn):
@@ -225,7 +258,7 @@ def pregunta_4(conn):
     guardar_csv(df, "pregunta04_F15_por_edad")
 
     if df.empty:
-        return
+        return []
 
     # Filtrar grupos irrelevantes
     grupos_excluir = {
@@ -237,18 +270,14 @@ def pregunta_4(conn):
 
     # Crear dataframe filtrado
     df_filtrado = df[~df["edad_quinquenal"].isin(grupos_excluir)]
+    return [("pregunta04.png", dibujar_4, (df_filtrado,))]
 
-    configurar_plt()
 
-    plt.barh(df_filtrado["edad_quinquenal"], df_filtrado["total"])
-    plt.gca().invert_yaxis()
-    plt.xlabel("Defunciones por F15")
-    plt.title("Defunciones F15 por grupo de edad")
-    ajustar_margenes()
-
-    fig_path = os.path.join(FIG_DIR, "pregunta04.png")
-    plt.savefig(fig_path)
-    print("[OK] pregunta04.png guardada:", fig_path)
+def dibujar_4(ax, df_filtrado):
+    ax.barh(df_filtrado["edad_quinquenal"], df_filtrado["total"])
+    ax.invert_yaxis()
+    ax.set_xlabel("Defunciones por F15")
+    ax.set_title("Defunciones F15 por grupo de edad")
 
 
 def pregunta_5(conn):
@@ -261,26 +290,24 @@ def pregunta_5(conn):
     """
     df = ejecutar_sql(conn, sql)
     if df.empty:
-        return
+        return []
 
     tabla = df.pivot_table(index="cie10_code", columns="anio", values="total", fill_value=0)
 
     if 2011 not in tabla.columns or 2016 not in tabla.columns:
-        return
+        return []
 
     tabla["incremento"] = tabla[2016] - tabla[2011]
     resultado = tabla.sort_values("incremento", ascending=False).head(10)
     guardar_csv(resultado.reset_index(), "pregunta05_incremento_2011_2016")
+    return [("pregunta05.png", dibujar_5, (resultado,))]
 
-    configurar_plt()
-    plt.barh(resultado.index, resultado["incremento"])
-    plt.gca().invert_yaxis()
-    plt.title("Top 10 incrementos en defunciones (2011–2016)")
-    plt.xlabel("Incremento")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta05.png"))
-    print("[OK] pregunta05.png guardada")
+def dibujar_5(ax, resultado):
+    ax.barh(resultado.index, resultado["incremento"])
+    ax.invert_yaxis()
+    ax.set_title("Top 10 incrementos en defunciones (2011–2016)")
+    ax.set_xlabel("Incremento")
 
 
 def pregunta_6(conn):
@@ -294,7 +321,7 @@ def pregunta_6(conn):
     guardar_csv(df, "pregunta06_frases_F10")
 
     if df.empty:
-        return
+        return []
 
     contador = Counter()
     for _, fila in df.iterrows():
@@ -305,33 +332,27 @@ def pregunta_6(conn):
 
     top = pd.DataFrame(contador.most_common(15), columns=["palabra", "frecuencia"])
     guardar_csv(top, "pregunta06_top_palabras_F10")
+    return [("pregunta06.png", dibujar_6, (top,))]
 
-    configurar_plt()
-    plt.barh(top["palabra"], top["frecuencia"])
-    plt.gca().invert_yaxis()
-    plt.title("Top palabras asociadas a F10")
-    plt.xlabel("Frecuencia ponderada")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta06.png"))
-    print("[OK] pregunta06.png guardada")
+def dibujar_6(ax, top):
+    ax.barh(top["palabra"], top["frecuencia"])
+    ax.invert_yaxis()
+    ax.set_title("Top palabras asociadas a F10")
+    ax.set_xlabel("Frecuencia ponderada")
 
 
 def pregunta_7(conn):
     print("\n[7] Frases que mencionan dependencia y opioides (F11)...")
 
-    sql = """
-        SELECT cie10_code, sentence_norm
-        FROM texto_frases
-        WHERE cie10_code LIKE 'F11%'
-          AND sentence_norm LIKE '%dependenc%';
-    """
-    df = ejecutar_sql(conn, sql)
+    # índice FTS5 (MATCH, por relevancia bm25) o LIKE si no hay FTS5 (consultas_texto.py)
+    sql, params = sql_frases(conn, ["cie10_code", "sentence_norm"], ["dependenc*"], cie10="F11")
+    df = ejecutar_sql(conn, sql, params)
     guardar_csv(df, "pregunta07_frases_F11")
 
     if df.empty:
         print("[WARN] No se encontraron frases relevantes para F11.")
-        return
+        return []
 
     print(f"[INFO] Frases encontradas: {len(df)}")
 
@@ -361,6 +382,7 @@ def pregunta_7(conn):
             f.write(f"- **{palabra}**: {freq}\n")
 
     print(f"[OK] Archivo de análisis creado: {md_path}")
+    return []
 
 
 
@@ -376,18 +398,15 @@ def pregunta_8(conn):
     guardar_csv(df, "pregunta08_codigos_texto")
 
     if df.empty:
-        return
+        return []
+    return [("pregunta08.png", dibujar_8, (df.head(10),))]
 
-    top = df.head(10)
-    configurar_plt()
-    plt.barh(top["cie10_code"], top["menciones"])
-    plt.gca().invert_yaxis()
-    plt.xlabel("Menciones")
-    plt.title("Códigos más mencionados en texto")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta08.png"))
-    print("[OK] pregunta08.png guardada")
+def dibujar_8(ax, top):
+    ax.barh(top["cie10_code"], top["menciones"])
+    ax.invert_yaxis()
+    ax.set_xlabel("Menciones")
+    ax.set_title("Códigos más mencionados en texto")
 
 
 def pregunta_9(conn):
@@ -407,7 +426,7 @@ def pregunta_9(conn):
     """
     df = ejecutar_sql(conn, sql)
     if df.empty:
-        return
+        return []
 
     multi = df.loc[0, "multi"]
     total = df.loc[0, "total"]
@@ -418,14 +437,12 @@ def pregunta_9(conn):
         "porcentaje": (multi/total*100 if total else 0)
     }])
     guardar_csv(df_res, "pregunta09_porcentaje_multi")
+    return [("pregunta09.png", dibujar_9, (multi, total))]
 
-    configurar_plt()
-    plt.pie([multi, total - multi], labels=["≥2 sustancias", "1 sustancia"], autopct="%1.1f%%")
-    plt.title("Porcentaje de frases multi-sustancia")
-    ajustar_margenes()
 
-    plt.savefig(os.path.join(FIG_DIR, "pregunta09.png"))
-    print("[OK] pregunta09.png guardada")
+def dibujar_9(ax, multi, total):
+    ax.pie([multi, total - multi], labels=["≥2 sustancias", "1 sustancia"], autopct="%1.1f%%")
+    ax.set_title("Porcentaje de frases multi-sustancia")
 
 
 def pregunta_10(conn):
@@ -440,53 +457,70 @@ def pregunta_10(conn):
     df = ejecutar_sql(conn, sql)
     guardar_csv(df, "pregunta10_F16_entidades")
 
+    graficas = []
     if not df.empty:
-        top = df.head(10)
-        configurar_plt()
-        plt.barh(top["entidad_norm"], top["total"])
-        plt.gca().invert_yaxis()
-        plt.title("Top entidades F16 (urgencias)")
-        plt.xlabel("Urgencias")
-        ajustar_margenes()
-        plt.savefig(os.path.join(FIG_DIR, "pregunta10_entidades.png"))
+        graficas.append(("pregunta10_entidades.png", dibujar_10, (df.head(10),)))
 
     # Texto de alarma
-    sql_txt = """
-        SELECT sentence_norm
-        FROM texto_frases
-        WHERE cie10_code LIKE 'F16%'
-        AND (
-            sentence_norm LIKE '%grave%' OR
-            sentence_norm LIKE '%urgente%' OR
-            sentence_norm LIKE '%intoxicac%' OR
-            sentence_norm LIKE '%riesgo%' OR
-            sentence_norm LIKE '%coma%'
-        );
-    """
-    df_txt = ejecutar_sql(conn, sql_txt)
+    sql_txt, params = sql_frases(conn, ["sentence_norm"], TERMINOS_ALARMA, cie10="F16")
+    df_txt = ejecutar_sql(conn, sql_txt, params)
     guardar_csv(df_txt, "pregunta10_F16_frases_alarma")
     print(f"[INFO] {len(df_txt)} frases de alarma encontradas.")
+    return graficas
+
+
+def dibujar_10(ax, top):
+    ax.barh(top["entidad_norm"], top["total"])
+    ax.invert_yaxis()
+    ax.set_title("Top entidades F16 (urgencias)")
+    ax.set_xlabel("Urgencias")
 
 
 # =====================================================
 # MAIN
 # =====================================================
 
+PREGUNTAS = [pregunta_1, pregunta_2, pregunta_3, pregunta_4, pregunta_5,
+             pregunta_6, pregunta_7, pregunta_8, pregunta_9, pregunta_10]
+
+
+def ejecutar_pregunta(pregunta):
+    """Corre una pregunta con su propia conexión del pool (un hilo = una conexión)."""
+    with conexion_lectura(DB_PATH) as conn:
+        return pregunta(conn)
+
+
 def main():
-    conn = conectar()
+    global DB_PATH
+    ap = argparse.ArgumentParser(description="Preguntas descriptivas: CSV + gráficas.")
+    ap.add_argument("--concurrente", action="store_true",
+                    help="SQL de todas las preguntas en paralelo (hilos) y gráficas en paralelo (procesos)")
+    ap.add_argument("--hilos", type=int, default=TAMANO_POOL, help="Hilos para el SQL (por defecto: tamaño del pool)")
+    ap.add_argument("--procesos", type=int, default=0, help="Procesos para las gráficas (0 = todos los núcleos)")
+    ap.add_argument("--db", type=str, default=DB_PATH,
+                    help="Base a consultar: SQLite o la copia DuckDB (salud_federada.duckdb)")
+    ap.add_argument("--umbral-lento", type=float, default=medicion_consultas.UMBRAL_LENTA_MS,
+                    help="ms desde los que una consulta va a docs/perf/consultas_lentas.jsonl con su plan")
+    args = ap.parse_args()
+    DB_PATH = args.db
+    medicion_consultas.UMBRAL_LENTA_MS = args.umbral_lento
+
     try:
-        pregunta_1(conn)
-        pregunta_2(conn)
-        pregunta_3(conn)
-        pregunta_4(conn)
-        pregunta_5(conn)
-        pregunta_6(conn)
-        pregunta_7(conn)
-        pregunta_8(conn)
-        pregunta_9(conn)
-        pregunta_10(conn)
+        if args.concurrente:
+            with ThreadPoolExecutor(max_workers=args.hilos) as hilos:
+                graficas = [g for lista in hilos.map(ejecutar_pregunta, PREGUNTAS) for g in lista]
+            # los hilos ya terminaron: los procesos se crean sin hilos vivos (fork seguro)
+            with ProcessPoolExecutor(max_workers=args.procesos or None) as procesos:
+                list(procesos.map(renderizar, graficas))
+        else:
+            with conexion_lectura(DB_PATH) as conn:
+                for pregunta in PREGUNTAS:
+                    for grafica in pregunta(conn):
+                        renderizar(grafica)
     finally:
-        conn.close()
+        imprimir_estadisticas()
+        imprimir_conexiones()
+        imprimir_mediciones()
         print("\n=== Consultas descriptivas completadas con éxito ===")
 
 
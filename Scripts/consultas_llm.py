@@ -15,14 +15,20 @@ import networkx as nx
 from sqlalchemy import create_engine
 import ollama
 
+from cubos import enrutar_sql
+from conexiones import abrir_lectura, conexion_lectura
+from medicion_consultas import medir_consulta, imprimir_mediciones
+
 # === Configuración ===
-DB_URL = "sqlite:///salud_federada.db"
+DB_PATH = "salud_federada.db"
+DB_URL = f"sqlite:///{DB_PATH}"
 GRAPH_PATH = "docs/grafo_comorbilidad.gpickle"
 OUTPUT_DIR = "docs/llm_resultados_ollama"
 MODELO_OLLAMA = "mistral"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
-engine = create_engine(DB_URL)
+# conexiones de solo lectura afinadas (conexiones.py); el pool lo lleva SQLAlchemy
+engine = create_engine(DB_URL, creator=lambda: abrir_lectura(DB_PATH))
 
 try:
     with open(GRAPH_PATH, "rb") as f:
@@ -122,7 +128,17 @@ ORDER BY incremento DESC
 LIMIT 10"""
     return None
 
+def sql_enrutada(sql):
+    """Reescribe la consulta hacia el cubo pre-agregado que la cubre (cubos.py)."""
+    with conexion_lectura(DB_PATH) as con:
+        return enrutar_sql(sql, con)
+
 # === Ejecución ===
+def leer_medido(sql, etiqueta):
+    """pd.read_sql con tiempo, filas y bytes; si es lenta, con su plan (medicion_consultas.py)."""
+    with conexion_lectura(DB_PATH) as con:   # solo para el plan de las consultas lentas
+        return medir_consulta(con, sql, lambda: pd.read_sql(sql, engine), etiqueta=etiqueta)
+
 def ejecutar_respuesta_llm(resultado: dict, idx: int):
     tipo = resultado.get("tipo", "error")
     codigo = resultado.get("codigo", "")
@@ -134,13 +150,13 @@ def ejecutar_respuesta_llm(resultado: dict, idx: int):
         codigo_limpio = re.sub(r"cie10_code\s*(?=\s*,|\s+FROM)", "t_2011.cie10_code", codigo_limpio)
 
         try:
-            return pd.read_sql(codigo_limpio, engine), codigo_limpio
+            return leer_medido(codigo_limpio, f"P{idx}"), codigo_limpio
         except Exception as e:
             fb = fallback_sql(idx)
             if fb:
                 print(f"  ⚙️  Usando fallback seguro para P{idx}")
                 try:
-                    return pd.read_sql(fb, engine), fb
+                    return leer_medido(sql_enrutada(fb), f"P{idx} fallback"), fb
                 except Exception as e2:
                     return pd.DataFrame({"error": [f"Error SQL fallback: {e2}"]}), fb
             return pd.DataFrame({"error": [f"Error SQL: {e}"]}), codigo_limpio
@@ -178,6 +194,7 @@ def main():
         summary.append({"idx": i, "pregunta": pregunta, "sql": desc, "rows": len(df)})
     with open(os.path.join(OUTPUT_DIR, "_summary.json"), "w", encoding="utf-8") as f:
         json.dump(summary, f, indent=2, ensure_ascii=False)
+    imprimir_mediciones()
     print("\n📦 ¡Proceso completado! Resumen guardado en docs/llm_resultados_ollama/_summary.json")
 
 if __name__ == "__main__":
@@ -16,13 +16,14 @@ Salida:
 """
 
 import os
-import sqlite3
 import pandas as pd
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import ollama
 
+from conexiones import tomar_conexion, devolver_conexion
+
 
 # =====================================================
 # CONFIGURACIÓN
@@ -202,7 +203,7 @@ PREGUNTAS_PREDICTIVAS_NUEVAS = [
 def main():
     print("\n=== Iniciando consultas predictivas ===\n")
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = tomar_conexion(DB_PATH)   # solo lectura (conexiones.py)
 
     # Cargar corpus textual
     vectorizer, X, corpus = cargar_corpus(conn)
@@ -223,7 +224,7 @@ def main():
 
         guardar_resultado(i, pregunta, respuesta, evidencias, contexto_sql)
 
-    conn.close()
+    devolver_conexion(conn)
     print("\n=== PREDICTIVAS COMPLETADAS ===")
 
 
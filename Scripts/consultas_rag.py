@@ -11,13 +11,14 @@ Versión batch híbrida para las 20 preguntas del proyecto:
 """
 
 import os
-import sqlite3
 import pandas as pd
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import ollama
 
+from conexiones import tomar_conexion, devolver_conexion
+
 # =====================================================
 # CONFIGURACIÓN
 # =====================================================
@@ -167,7 +168,7 @@ PREGUNTAS = PREGUNTAS_DESCRIPTIVAS + PREGUNTAS_PREDICTIVAS
 # =====================================================
 
 def main():
-    conn = sqlite3.connect(DB_PATH)
+    conn = tomar_conexion(DB_PATH)   # solo lectura (conexiones.py)
     vectorizer, X, corpus = cargar_corpus(conn)
     print(f"[OK] Corpus cargado y vectorizado con {len(corpus)} documentos.\n")
 
@@ -177,7 +178,7 @@ def main():
         result = ejecutar_consulta(pregunta, conn, vectorizer, X, corpus, estrategia, cie10, tabla, a_ini, a_fin)
         guardar_resultado(result)
 
-    conn.close()
+    devolver_conexion(conn)
     print("\n[FIN] Todas las consultas completadas.")
 
 
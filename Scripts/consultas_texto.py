@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+consultas_texto.py
+Filtros de texto sobre texto_frases vía el índice FTS5 texto_frases_fts.
+
+`sentence_norm LIKE '%palabra%'` recorre todas las frases; el índice
+invertido FTS5 solo visita las que contienen el término. Aquí:
+- crear_fts(con): crea texto_frases_fts (contenido externo = texto_frases),
+  lo llena con 'rebuild' y crea los triggers AFTER INSERT / DELETE / UPDATE
+  que lo mantienen sincronizado con inserciones posteriores
+- Términos: "palabra" = palabra completa, "prefijo*" = palabras que empiezan
+  así (dependenc* -> dependencia, dependencias...)
+- expresion_match(): términos -> expresión MATCH de FTS5 (cada término entre
+  comillas, unidos por OR / AND)
+- sql_frases(): SELECT de columnas de texto_frases con los términos (y un
+  prefijo CIE-10 opcional), ordenado por relevancia bm25; si la base no tiene
+  FTS5 (SQLite sin el módulo, copia DuckDB) cae a LIKE '%termino%'
+
+Uso:
+    from consultas_texto import sql_frases
+    sql, params = sql_frases(con, ["cie10_code", "sentence_norm"], ["dependenc*"], cie10="F11")
+    df = ejecutar_sql(con, sql, params)
+"""
+
+from conexiones import es_duckdb
+
+TABLA = "texto_frases"
+TABLA_FTS = "texto_frases_fts"
+COLUMNA = "sentence_norm"
+
+# ------------------ Índice y triggers ------------------
+def crear_fts(con) -> bool:
+    """(Re)crea el índice FTS5 y sus triggers; False si esta SQLite no tiene FTS5."""
+    try:
+        con.executescript(f"""
+        DROP TABLE IF EXISTS {TABLA_FTS};
+        CREATE VIRTUAL TABLE {TABLA_FTS}
+        USING fts5({COLUMNA}, content='{TABLA}', content_rowid='rowid');
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild');
+
+        DROP TRIGGER IF EXISTS {TABLA}_fts_ai;
+        DROP TRIGGER IF EXISTS {TABLA}_fts_ad;
+        DROP TRIGGER IF EXISTS {TABLA}_fts_au;
+        CREATE TRIGGER {TABLA}_fts_ai AFTER INSERT ON {TABLA} BEGIN
+          INSERT INTO {TABLA_FTS}(rowid, {COLUMNA}) VALUES (new.rowid, new.{COLUMNA});
+        END;
+        CREATE TRIGGER {TABLA}_fts_ad AFTER DELETE ON {TABLA} BEGIN
+          INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {COLUMNA}) VALUES ('delete', old.rowid, old.{COLUMNA});
+        END;
+        CREATE TRIGGER {TABLA}_fts_au AFTER UPDATE OF {COLUMNA} ON {TABLA} BEGIN
+          INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {COLUMNA}) VALUES ('delete', old.rowid, old.{COLUMNA});
+          INSERT INTO {TABLA_FTS}(rowid, {COLUMNA}) VALUES (new.rowid, new.{COLUMNA});
+        END;
+        """)
+        return True
+    except Exception as e:   # sqlite3.OperationalError: no such module: fts5
+        print("[WARN] FTS5 no disponible:", e)
+        return False
+
+def fts_disponible(con) -> bool:
+    """True si la base tiene texto_frases_fts y esta SQLite puede leerla."""
+    if es_duckdb(con):
+        return False
+    try:
+        # sin la tabla: lista vacía; tabla sin el módulo fts5: "no such module"
+        return bool(con.execute(f"PRAGMA table_info({TABLA_FTS})").fetchall())
+    except Exception:
+        return False
+
+# ------------------ Compilación de términos ------------------
+def _termino(t: str) -> tuple[str, bool]:
+    t = t.strip()
+    return (t[:-1], True) if t.endswith("*") else (t, False)
+
+def expresion_match(terminos, operador="OR") -> str:
+    """['grave', 'intoxicac*'] -> '"grave" OR "intoxicac"*'."""
+    partes = []
+    for t in terminos:
+        palabra, prefijo = _termino(t)
+        partes.append('"' + palabra.replace('"', '""') + '"' + ("*" if prefijo else ""))
+    return f" {operador} ".join(partes)
+
+def condicion_like(columna, terminos, operador="OR") -> tuple[str, list]:
+    """Mismo filtro con LIKE (subcadena) cuando no hay FTS5."""
+    partes = [f"{columna} LIKE ?" for _ in terminos]
+    return "(" + f" {operador} ".join(partes) + ")", [f"%{_termino(t)[0]}%" for t in terminos]
+
+# ------------------ Consultas ------------------
+def sql_frases(con, columnas, terminos, cie10=None, operador="OR") -> tuple[str, list]:
+    """
+    (sql, params) de las frases de texto_frases con `terminos` (y código que
+    empieza con `cie10`). Con FTS5: MATCH + ORDER BY bm25; sin FTS5: LIKE.
+    """
+    cols = ", ".join(f"f.{c}" for c in columnas)
+    filtro_cie10, params_cie10 = ("AND f.cie10_code LIKE ?", [f"{cie10}%"]) if cie10 else ("", [])
+    if fts_disponible(con):
+        sql = f"""
+        SELECT {cols}
+        FROM {TABLA_FTS}
+        JOIN {TABLA} f ON f.rowid = {TABLA_FTS}.rowid
+        WHERE {TABLA_FTS} MATCH ? {filtro_cie10}
+        ORDER BY bm25({TABLA_FTS}), f.rowid;
+        """
+        return sql, [expresion_match(terminos, operador)] + params_cie10
+    condicion, params = condicion_like(f"f.{COLUMNA}", terminos, operador)
+    sql = f"""
+        SELECT {cols}
+        FROM {TABLA} f
+        WHERE {condicion} {filtro_cie10};
+        """
+    return sql, params + params_cie10
@@ -6,12 +6,36 @@ Crea/actualiza las vistas para la base 'salud_federada.db' con el esquema final:
 - sin cve_entidad en hechos
 - sin weight en edges
 - texto desde texto_frases (+texto_frases_x_docs) o, si no existe, desde texto_matches (fallback)
+
+Con --materializar, v_unificado deja de calcularse en cada lectura:
+- La vista de siempre queda como v_unificado_calculo y su resultado se
+  guarda UNA vez en la tabla indexada mv_unificado (id_fila INTEGER PRIMARY
+  KEY AUTOINCREMENT + las mismas columnas, id_origen ya calculado)
+- v_unificado pasa a ser SELECT ... FROM mv_unificado (mismas columnas y
+  mismo orden de filas), así que consultas_rag, consultas_predictivas y
+  perfilado_resumen no cambian
+- --refrescar [--origenes texto ...] compara cada origen con
+  v_unificado_calculo y solo borra las filas que ya no están e inserta las
+  nuevas: las filas que no cambian conservan su id_fila. Las filas repetidas
+  se comparan por copia (multiconjunto): si una fila pasa de 3 copias a 2 se
+  borra una. build_base_final.py
+  --incremental refresca así los años de hechos que reemplaza
+- Tras materializar o refrescar se registra un build nuevo (cache_sql.py)
 """
 
-import sqlite3
+import argparse, sqlite3
+
+from cache_sql import registrar_build
 
 DB_PATH = "salud_federada.db"
 
+# v_unificado materializada
+TABLA_MAT = "mv_unificado"
+VISTA_CALCULO = "v_unificado_calculo"   # la v_unificado de siempre, con otro nombre
+ORIGENES = ["grafo", "texto", "sql_defunciones", "sql_urgencias"]
+COLS_UNIFICADO = ["origen", "id_origen", "cie10_code", "anio", "entidad_norm", "edad_quinquenal",
+                  "sexo", "valor", "fuente", "texto", "campo"]
+
 SQL_COMMON = """
 -- =================== v_eventos ===================
 DROP VIEW IF EXISTS v_eventos;
@@ -217,94 +241,190 @@ SELECT
 FROM fact_urgencias u;
 """
 
+# Sin texto: v_unificado sólo con grafo + hechos
+SQL_SIN_TEXTO = """
+DROP VIEW IF EXISTS v_unificado;
+CREATE VIEW v_unificado AS
+
+-- GRAFO
+SELECT
+  'grafo' AS origen,
+  printf('G:%s', n.code) AS id_origen,
+  n.code       AS cie10_code,
+  NULL         AS anio,
+  NULL         AS entidad_norm,
+  NULL         AS edad_quinquenal,
+  NULL         AS sexo,
+  NULL         AS valor,
+  NULL         AS fuente,
+  n.descripcion AS texto,
+  'cie10_nodes.descripcion' AS campo
+FROM cie10_nodes n
+
+UNION ALL
+-- SQL DEFUNCIONES
+SELECT
+  'sql_defunciones' AS origen,
+  printf('D:%d:%s:%s:%s',
+         COALESCE(d.anio,-1),
+         COALESCE(d.entidad_norm,'?'),
+         COALESCE(d.edad_quinquenal,'?'),
+         COALESCE(d.sexo,'?')
+  ) AS id_origen,
+  d.cie10_code,
+  d.anio,
+  d.entidad_norm,
+  d.edad_quinquenal,
+  d.sexo,
+  d.valor,
+  d.fuente,
+  NULL AS texto,
+  NULL AS campo
+FROM fact_defunciones d
+
+UNION ALL
+-- SQL URGENCIAS
+SELECT
+  'sql_urgencias' AS origen,
+  printf('U:%d:%s:%s:%s',
+         COALESCE(u.anio,-1),
+         COALESCE(u.entidad_norm,'?'),
+         COALESCE(u.edad_quinquenal,'?'),
+         COALESCE(u.sexo,'?')
+  ) AS id_origen,
+  u.cie10_code,
+  u.anio,
+  u.entidad_norm,
+  u.edad_quinquenal,
+  u.sexo,
+  u.valor,
+  u.fuente,
+  NULL AS texto,
+  NULL AS campo
+FROM fact_urgencias u;
+"""
+
 def table_exists(cur, name: str) -> bool:
     row = cur.execute(
         "SELECT 1 FROM sqlite_master WHERE type IN ('table','view') AND name=?;", (name,)
     ).fetchone()
     return row is not None
 
-def main():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-
-    # Siempre crear las vistas comunes
+def crear_vistas(cur, vista_unificada="v_unificado"):
+    """Vistas comunes + v_unificado (con el nombre `vista_unificada`) según el texto disponible."""
     cur.executescript(SQL_COMMON)
 
     # Elegir bloque de texto según lo disponible
     has_frases = table_exists(cur, "texto_frases")
-    has_map    = table_exists(cur, "texto_frases_x_docs")
     has_match  = table_exists(cur, "texto_matches")
 
     if has_frases:
-        cur.executescript(SQL_TEXTO_FRASES)
-        print("[OK] Vistas creadas usando catálogo de texto (texto_frases).")
+        sql, msg = SQL_TEXTO_FRASES, "[OK] Vistas creadas usando catálogo de texto (texto_frases)."
     elif has_match:
-        cur.executescript(SQL_TEXTO_MATCHES)
-        print("[OK] Vistas creadas usando texto_matches (fallback).")
+        sql, msg = SQL_TEXTO_MATCHES, "[OK] Vistas creadas usando texto_matches (fallback)."
+    else:
+        sql, msg = SQL_SIN_TEXTO, "[OK] Vistas creadas sin componente de texto (no se encontraron tablas de texto)."
+    cur.executescript(sql.replace("v_unificado", vista_unificada))
+    print(msg)
+
+# ------------------ v_unificado materializada ------------------
+def materializar_unificado(con):
+    """(Re)crea mv_unificado desde VISTA_CALCULO y deja v_unificado leyendo de la tabla."""
+    cols = ", ".join(COLS_UNIFICADO)
+    with con:
+        con.execute("DROP VIEW IF EXISTS v_unificado")
+        con.execute(f"DROP TABLE IF EXISTS {TABLA_MAT}")
+        con.execute(f"""CREATE TABLE {TABLA_MAT} (
+          id_fila INTEGER PRIMARY KEY AUTOINCREMENT,
+          origen TEXT, id_origen TEXT, cie10_code TEXT, anio INTEGER, entidad_norm TEXT,
+          edad_quinquenal TEXT, sexo TEXT, valor INTEGER, fuente TEXT, texto TEXT, campo TEXT
+        )""")
+        n = con.execute(f"INSERT INTO {TABLA_MAT}({cols}) SELECT {cols} FROM {VISTA_CALCULO}").rowcount
+        con.execute(f"CREATE INDEX idx_{TABLA_MAT}_origen ON {TABLA_MAT}(origen, anio)")
+        con.execute(f"CREATE INDEX idx_{TABLA_MAT}_code ON {TABLA_MAT}(cie10_code)")
+        con.execute(f"CREATE VIEW v_unificado AS SELECT {cols} FROM {TABLA_MAT}")
+    print(f"[OK] {TABLA_MAT}: {n:,} filas materializadas")
+
+def refrescar_unificado(con, origenes=None, anios=None) -> dict:
+    """
+    Actualiza mv_unificado solo en `origenes` (todos si None) comparando con
+    VISTA_CALCULO: borra las filas que ya no están e inserta las nuevas (las
+    demás conservan id_fila). Cada copia de una fila repetida se numera (copia
+    = 1, 2, ...) y se compara con su número, así que cuenta la multiplicidad y
+    no solo si la fila existe. Con `anios`, los orígenes de hechos se comparan
+    solo en esos años. Devuelve {origen: (borradas, insertadas)}; {} si la
+    base no tiene v_unificado materializada.
+    """
+    if not table_exists(con.cursor(), TABLA_MAT) or not table_exists(con.cursor(), VISTA_CALCULO):
+        return {}
+    cols = ", ".join(COLS_UNIFICADO)
+    iguales = " AND ".join(f"v.{c} IS n.{c}" for c in COLS_UNIFICADO + ["copia"])
+    out = {}
+    with con:
+        for origen in origenes or ORIGENES:
+            filtro = f"origen = '{origen}'"
+            if anios and origen.startswith("sql_"):
+                filtro += f" AND anio IN ({', '.join(str(int(a)) for a in anios)})"
+            # filas actuales (con su id_fila) y filas esperadas, numerando las copias de cada
+            # fila repetida; indexadas solo mientras se comparan
+            con.executescript(f"""
+                DROP TABLE IF EXISTS temp._viejo;
+                DROP TABLE IF EXISTS temp._nuevo;
+                CREATE TEMP TABLE _viejo AS
+                  SELECT id_fila, {cols}, ROW_NUMBER() OVER (PARTITION BY {cols} ORDER BY id_fila) AS copia
+                  FROM {TABLA_MAT} WHERE {filtro};
+                CREATE TEMP TABLE _nuevo AS
+                  SELECT {cols}, ROW_NUMBER() OVER (PARTITION BY {cols}) AS copia
+                  FROM {VISTA_CALCULO} WHERE {filtro};
+                CREATE INDEX temp.idx_viejo ON _viejo(id_origen, cie10_code);
+                CREATE INDEX temp.idx_nuevo ON _nuevo(id_origen, cie10_code);
+            """)
+            borradas = con.execute(f"""
+                DELETE FROM {TABLA_MAT} WHERE id_fila IN (
+                  SELECT v.id_fila FROM _viejo v
+                  WHERE NOT EXISTS (SELECT 1 FROM _nuevo n WHERE {iguales}))""").rowcount
+            insertadas = con.execute(f"""
+                INSERT INTO {TABLA_MAT}({cols})
+                SELECT {cols} FROM _nuevo n
+                WHERE NOT EXISTS (SELECT 1 FROM _viejo v WHERE {iguales})""").rowcount
+            con.execute("DROP TABLE temp._viejo")
+            con.execute("DROP TABLE temp._nuevo")
+            out[origen] = (borradas, insertadas)
+            print(f"[OK] {TABLA_MAT} {origen}: -{borradas:,} / +{insertadas:,} filas")
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="Crea/actualiza v_unificado y las vistas auxiliares.")
+    ap.add_argument("--materializar", action="store_true",
+                    help=f"Guardar v_unificado en la tabla indexada {TABLA_MAT}")
+    ap.add_argument("--refrescar", action="store_true",
+                    help=f"Solo actualizar {TABLA_MAT} (filas nuevas/borradas) sin recrear las vistas")
+    ap.add_argument("--origenes", nargs="+", choices=ORIGENES, default=None,
+                    help="Con --refrescar: limitar a estos orígenes (p. ej. texto tras un lote nuevo)")
+    args = ap.parse_args()
+
+    con = sqlite3.connect(DB_PATH)
+    cur = con.cursor()
+
+    if args.refrescar:
+        if table_exists(cur, TABLA_MAT):
+            cambios = refrescar_unificado(con, args.origenes)
+            if any(b or i for b, i in cambios.values()):
+                registrar_build(con, "unificado")
+            con.close()
+            print(f"\n[OK] {TABLA_MAT} actualizada.")
+            return
+        print(f"[WARN] La base no tiene {TABLA_MAT}; se materializa completa.")
+        args.materializar = True
+
+    if args.materializar:
+        crear_vistas(cur, VISTA_CALCULO)
+        con.commit()
+        materializar_unificado(con)
+        registrar_build(con, "unificado")
     else:
-        # Sin texto: crea v_unificado sólo con grafo + hechos
-        cur.executescript("""
-        DROP VIEW IF EXISTS v_unificado;
-        CREATE VIEW v_unificado AS
-
-        -- GRAFO
-        SELECT
-          'grafo' AS origen,
-          printf('G:%s', n.code) AS id_origen,
-          n.code       AS cie10_code,
-          NULL         AS anio,
-          NULL         AS entidad_norm,
-          NULL         AS edad_quinquenal,
-          NULL         AS sexo,
-          NULL         AS valor,
-          NULL         AS fuente,
-          n.descripcion AS texto,
-          'cie10_nodes.descripcion' AS campo
-        FROM cie10_nodes n
-
-        UNION ALL
-        -- SQL DEFUNCIONES
-        SELECT
-          'sql_defunciones' AS origen,
-          printf('D:%d:%s:%s:%s',
-                 COALESCE(d.anio,-1),
-                 COALESCE(d.entidad_norm,'?'),
-                 COALESCE(d.edad_quinquenal,'?'),
-                 COALESCE(d.sexo,'?')
-          ) AS id_origen,
-          d.cie10_code,
-          d.anio,
-          d.entidad_norm,
-          d.edad_quinquenal,
-          d.sexo,
-          d.valor,
-          d.fuente,
-          NULL AS texto,
-          NULL AS campo
-        FROM fact_defunciones d
-
-        UNION ALL
-        -- SQL URGENCIAS
-        SELECT
-          'sql_urgencias' AS origen,
-          printf('U:%d:%s:%s:%s',
-                 COALESCE(u.anio,-1),
-                 COALESCE(u.entidad_norm,'?'),
-                 COALESCE(u.edad_quinquenal,'?'),
-                 COALESCE(u.sexo,'?')
-          ) AS id_origen,
-          u.cie10_code,
-          u.anio,
-          u.entidad_norm,
-          u.edad_quinquenal,
-          u.sexo,
-          u.valor,
-          u.fuente,
-          NULL AS texto,
-          NULL AS campo
-        FROM fact_urgencias u;
-        """)
-        print("[OK] Vistas creadas sin componente de texto (no se encontraron tablas de texto).")
+        cur.executescript(f"DROP VIEW IF EXISTS {VISTA_CALCULO}; DROP TABLE IF EXISTS {TABLA_MAT};")
+        crear_vistas(cur)
 
     con.commit()
 
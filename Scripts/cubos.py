@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+cubos.py
+Cubos pre-agregados de los hechos (v_eventos) y enrutamiento de consultas.
+
+Casi todas las consultas sobre hechos son SUM(valor) ... GROUP BY sobre
+pocas dimensiones (anio, cie10_code, sexo, entidad_norm, edad_quinquenal).
+En lugar de recorrer fact_defunciones/fact_urgencias en cada consulta:
+- build_base_final.py materializa al construir (y en --incremental refresca
+  por año) unas tablas cubo_* con (fuente, dimensiones, SUM(valor), COUNT(*))
+- enrutar_sql() reescribe una consulta de agregación simple sobre
+  fact_defunciones / fact_urgencias / v_eventos hacia el cubo MÁS PEQUEÑO que
+  contiene todas las columnas que usa (SELECT, WHERE, GROUP BY, HAVING,
+  ORDER BY). Solo si agrega de verdad: SUM(valor) / COUNT(*) en el SELECT y
+  las demás columnas en GROUP BY. Si la consulta no encaja (filas sueltas,
+  SELECT *, JOIN, subconsultas, AVG/MIN/MAX, filtros sobre valor, columnas
+  fuera del cubo...) se devuelve sin cambios
+
+SUM(valor) de un cubo = SUM de las sumas parciales y COUNT(*) = SUM(n_filas),
+así que el resultado es el mismo que sobre la tabla de hechos.
+
+Uso:
+    from cubos import crear_cubos, enrutar_sql
+    crear_cubos(con)                                  # al construir la base
+    df = pd.read_sql_query(enrutar_sql(sql, con), con)
+"""
+
+import re
+
+USAR_CUBOS = True            # False: las consultas van siempre a los hechos
+
+# Tablas de hechos por fuente (mismo orden que v_eventos)
+HECHOS = {"defunciones": "fact_defunciones", "urgencias": "fact_urgencias"}
+DIMENSIONES = ["anio", "entidad_norm", "edad_quinquenal", "sexo", "cie10_code"]
+
+# Cubo -> dimensiones (además de fuente). El índice de cada cubo es
+# (fuente, dimensiones) en este orden; el de entidad sigue a idx_*_keys
+# (anio, entidad_norm, cie10_code) para que el plan, y con él el orden de los
+# empates en ORDER BY, sea el mismo que sobre los hechos
+CUBOS = {
+    "cubo_anio_codigo":         ["anio", "cie10_code"],
+    "cubo_anio_codigo_sexo":    ["anio", "cie10_code", "sexo"],
+    "cubo_anio_codigo_entidad": ["anio", "entidad_norm", "cie10_code"],
+    "cubo_anio_codigo_edad":    ["anio", "cie10_code", "edad_quinquenal"],
+}
+META_CUBOS = "cubos_meta"
+
+# ------------------ Construcción ------------------
+def _select_cubo(dims):
+    cols = ", ".join(dims)
+    partes = [
+        f"SELECT '{fuente}' AS fuente, {cols}, SUM(valor) AS valor, COUNT(*) AS n_filas "
+        f"FROM {tabla} GROUP BY {cols}"
+        for fuente, tabla in HECHOS.items()
+    ]
+    return "\nUNION ALL\n".join(partes)
+
+def _actualizar_meta(con):
+    con.execute(f"CREATE TABLE IF NOT EXISTS {META_CUBOS} (cubo TEXT PRIMARY KEY, dimensiones TEXT, filas INTEGER)")
+    for cubo, dims in CUBOS.items():
+        n = con.execute(f"SELECT COUNT(*) FROM {cubo}").fetchone()[0]
+        con.execute(f"INSERT OR REPLACE INTO {META_CUBOS}(cubo, dimensiones, filas) VALUES (?,?,?)",
+                    (cubo, ",".join(dims), n))
+
+def crear_cubos(con):
+    """(Re)crea todos los cubos desde las tablas de hechos y registra su tamaño."""
+    with con:
+        for cubo, dims in CUBOS.items():
+            con.execute(f"DROP TABLE IF EXISTS {cubo}")
+            con.execute(f"CREATE TABLE {cubo} AS {_select_cubo(dims)}")
+            con.execute(f"CREATE INDEX IF NOT EXISTS idx_{cubo} ON {cubo}(fuente, {', '.join(dims)})")
+        _actualizar_meta(con)
+    for cubo in CUBOS:
+        n = con.execute(f"SELECT filas FROM {META_CUBOS} WHERE cubo=?", (cubo,)).fetchone()[0]
+        print(f"[OK] {cubo}: {n:,} filas")
+
+def refrescar_cubos(con, fuente, anios):
+    """Recalcula en los cubos solo las filas (fuente, anio) de los años dados."""
+    if not anios:
+        return
+    if not cubos_disponibles(con):
+        crear_cubos(con)
+        return
+    lista = ", ".join(str(int(a)) for a in anios)
+    tabla = HECHOS[fuente]
+    with con:
+        for cubo, dims in CUBOS.items():
+            cols = ", ".join(dims)
+            con.execute(f"DELETE FROM {cubo} WHERE fuente = ? AND anio IN ({lista})", (fuente,))
+            con.execute(f"""INSERT INTO {cubo}(fuente, {cols}, valor, n_filas)
+                SELECT '{fuente}', {cols}, SUM(valor), COUNT(*)
+                FROM {tabla} WHERE anio IN ({lista}) GROUP BY {cols}""")
+        _actualizar_meta(con)
+    print(f"[OK] Cubos refrescados ({fuente}, anio: {lista})")
+
+def cubos_disponibles(con) -> dict:
+    """{cubo: (dimensiones, filas)} de los cubos registrados en la base."""
+    try:
+        rows = con.execute(f"SELECT cubo, dimensiones, filas FROM {META_CUBOS}").fetchall()
+    except Exception:   # sqlite3.Error (o el de DuckDB): base sin cubos
+        return {}
+    return {c: (set(d.split(",")), n) for c, d, n in rows if c in CUBOS}
+
+# ------------------ Enrutamiento ------------------
+PALABRAS_SQL = {
+    "select", "from", "where", "group", "by", "having", "order", "limit", "offset",
+    "and", "or", "not", "in", "between", "like", "glob", "escape", "is", "null",
+    "as", "asc", "desc", "case", "when", "then", "else", "end", "collate", "nocase",
+    "integer", "real", "text", "numeric",
+}
+FUNCIONES_OK = {"sum", "count", "substr", "substring", "coalesce", "ifnull", "upper",
+                "lower", "trim", "cast", "round", "abs", "length"}
+RECHAZAR = re.compile(r"\b(join|union|intersect|except|with|distinct|over|window)\b|--|/\*|[\"`\[]", re.I)
+RE_LITERAL = re.compile(r"'(?:[^']|'')*'")
+RE_CONSULTA = re.compile(
+    r"\s*SELECT\s+(?P<sel>.+?)\s+FROM\s+(?P<tabla>\w+)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+GROUP\s+BY\s+(?P<group>.+?))?"
+    r"(?:\s+HAVING\s+(?P<having>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+LIMIT\s+(?P<limit>.+?))?\s*",
+    re.I | re.S)
+RE_SUM_VALOR = re.compile(r"\bsum\s*\(\s*valor\s*\)", re.I)
+RE_COUNT = re.compile(r"\bcount\s*\(\s*\*\s*\)", re.I)
+
+def _items(texto):
+    """Expresiones separadas por comas de primer nivel (fuera de paréntesis)."""
+    items, nivel, actual = [], 0, ""
+    for ch in texto or "":
+        nivel += (ch == "(") - (ch == ")")
+        if ch == "," and nivel == 0:
+            items.append(actual)
+            actual = ""
+        else:
+            actual += ch
+    return items + [actual] if actual.strip() else items
+
+def _dimensiones_de(texto):
+    """Dimensiones que aparecen en `texto` fuera de SUM(valor) / COUNT(*)."""
+    resto = RE_COUNT.sub(" ", RE_SUM_VALOR.sub(" ", texto or ""))
+    return {t.lower() for t in re.findall(r"\b([A-Za-z_]\w*)\b", resto)} & (set(DIMENSIONES) | {"fuente"})
+
+def _es_agregacion(m):
+    """
+    True si el SELECT agrega: tiene SUM(valor) o COUNT(*) y toda dimensión
+    fuera de ellos (en SELECT, HAVING u ORDER BY) está en GROUP BY; sin
+    GROUP BY, solo agregados. Con filas sueltas el cubo daría otro resultado.
+    """
+    sel = m.group("sel")
+    if not (RE_SUM_VALOR.search(sel) or RE_COUNT.search(sel)):
+        return False
+    agrupadas = _dimensiones_de(m.group("group"))
+    for texto in _items(sel) + [m.group("having") or "", m.group("order") or ""]:
+        texto = re.sub(r"\bAS\s+[A-Za-z_]\w*\s*$", "", texto.strip(), flags=re.I)
+        if not _dimensiones_de(texto) <= agrupadas:
+            return False
+    return True
+
+def _analizar(masked):
+    """(partes, tabla, columnas usadas) si la consulta es enrutable; si no, None."""
+    if masked.upper().count("SELECT") != 1 or RECHAZAR.search(masked):
+        return None
+    m = RE_CONSULTA.fullmatch(masked)
+    if not m:
+        return None
+    tabla = m.group("tabla").lower()
+    if tabla not in HECHOS.values() and tabla != "v_eventos":
+        return None
+    if not _es_agregacion(m):
+        return None   # filas sueltas (SELECT anio ..., SELECT * ...): el cubo no las tiene
+
+    resto = RE_COUNT.sub(" ", RE_SUM_VALOR.sub(" ", masked))
+    if "*" in resto:
+        return None   # SELECT *, o * fuera de COUNT(*)
+    funciones = {f.lower() for f in re.findall(r"\b([A-Za-z_]\w*)\s*\(", resto)}
+    if funciones - FUNCIONES_OK or re.search(r"\b(sum|count)\s*\(", resto, re.I):
+        return None   # otros agregados (AVG, MIN, COUNT(col), SUM(expr)...)
+
+    alias = {a.lower() for a in re.findall(r"\bAS\s+([A-Za-z_]\w*)", resto, re.I)}
+    columnas_cubo = set(DIMENSIONES) | {"fuente", "valor", "n_filas"}
+    if alias & columnas_cubo:
+        return None
+    permitidas = set(DIMENSIONES) | ({"fuente"} if tabla == "v_eventos" else set())
+    usadas = set()
+    for tok in re.findall(r"\b([A-Za-z_]\w*)\b", resto):
+        t = tok.lower()
+        if re.fullmatch(r"__lit\d+__", t):
+            continue
+        if t in permitidas:
+            usadas.add(t)
+        elif t not in PALABRAS_SQL and t not in FUNCIONES_OK and t not in alias and t != tabla:
+            return None   # valor fuera de SUM, columnas desconocidas, etc.
+    return m, tabla, usadas - {"fuente"}
+
+def elegir_cubo(columnas, disponibles):
+    """Cubo más pequeño (en filas) cuyas dimensiones contienen `columnas`."""
+    candidatos = [(n, c) for c, (dims, n) in disponibles.items() if columnas <= dims]
+    return min(candidatos)[1] if candidatos else None
+
+def enrutar_sql(sql, con, usar=None):
+    """
+    Devuelve `sql` reescrita hacia el cubo más pequeño que la cubre, o `sql`
+    sin cambios si no es una agregación simple sobre hechos o la base no
+    tiene cubos.
+    """
+    if not (USAR_CUBOS if usar is None else usar) or not isinstance(sql, str):
+        return sql
+    literales = []
+    def _guardar(m):
+        literales.append(m.group(0))
+        return f"__lit{len(literales) - 1}__"
+    masked = RE_LITERAL.sub(_guardar, sql.strip().rstrip(";"))
+
+    analisis = _analizar(masked)
+    if analisis is None:
+        return sql
+    disponibles = cubos_disponibles(con)
+    m, tabla, usadas = analisis
+    cubo = elegir_cubo(usadas, disponibles)
+    if cubo is None:
+        return sql
+
+    conteo = "SUM(n_filas)" if m.group("group") else "COALESCE(SUM(n_filas), 0)"
+    partes = {k: RE_COUNT.sub(conteo, v) if v else v for k, v in m.groupdict().items()}
+    where = partes["where"]
+    if tabla != "v_eventos":
+        fuente = next(f for f, t in HECHOS.items() if t == tabla)
+        where = f"fuente = '{fuente}'" + (f" AND ({where})" if where else "")
+
+    out = f"SELECT {partes['sel']}\nFROM {cubo}"
+    for clave, texto in [("WHERE", where), ("GROUP BY", partes["group"]), ("HAVING", partes["having"]),
+                         ("ORDER BY", partes["order"]), ("LIMIT", partes["limit"])]:
+        if texto:
+            out += f"\n{clave} {texto}"
+    return re.sub(r"__lit(\d+)__", lambda x: literales[int(x.group(1))], out)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+duplicados.py
+Detección de duplicados por hash, compartida por perfilado y limpieza
+(hechos, grafo y texto).
+
+En lugar de df[key].astype(str).duplicated(...) (copia en texto de cada
+columna clave antes de comparar):
+- Dentro de un DataFrame, cada columna clave se codifica a enteros (códigos
+  de category tal cual; factorize para el resto) y los códigos se combinan
+  en UNA clave int64 por fila, exacta (sin colisiones)
+- duplicated/unique se hacen sobre ese único arreglo de enteros
+- Entre bloques (archivos que no caben en memoria) los códigos no son
+  comparables: hash_filas da un hash uint64 por fila a partir de los VALORES
+  (pd.util.hash_pandas_object); contar_hashes() por bloque +
+  combinar_conteos() (la memoria depende de las claves distintas, no de las
+  filas). Con 64 bits la probabilidad de colisión es ~n²/2^65
+
+Uso:
+    from duplicados import resumen_duplicados, mascara_duplicados
+    r = resumen_duplicados(df, ["anio","entidad_norm","sexo","cie10_code"])
+    r["filas_en_grupos_duplicados"], r["muestras"]
+    df = df[~mascara_duplicados(df, ["source","target"])]   # drop_duplicates
+"""
+
+import numpy as np
+import pandas as pd
+
+MUESTRAS = 5   # claves de ejemplo en los resúmenes
+
+# ------------------ Hash por fila (entre bloques) ------------------
+def hash_filas(df: pd.DataFrame, cols: list[str]) -> np.ndarray:
+    """
+    Hash uint64 por fila de df[cols]. Las columnas numéricas se pasan a
+    float64 para que 2015 (int) y 2015.0 (float) den el mismo hash; texto y
+    category con los mismos valores también coinciden (y NaN con NaN).
+    """
+    k = df[cols]
+    num = [c for c in cols if pd.api.types.is_numeric_dtype(k[c].dtype)]
+    if num:
+        k = k.astype({c: "float64" for c in num})
+    return pd.util.hash_pandas_object(k, index=False).to_numpy()
+
+# ------------------ Clave exacta por fila (un DataFrame) ------------------
+def _codigos(ser: pd.Series) -> tuple[np.ndarray, int]:
+    """Códigos 0..n-1 de la columna (0 = nulo) y n."""
+    if isinstance(ser.dtype, pd.CategoricalDtype):
+        return ser.cat.codes.to_numpy().astype(np.int64) + 1, len(ser.cat.categories) + 1
+    cod, uniq = pd.factorize(ser)
+    return cod.astype(np.int64) + 1, len(uniq) + 1
+
+def clave_filas(df: pd.DataFrame, cols: list[str]) -> np.ndarray:
+    """
+    Clave int64 por fila: igual para dos filas si y solo si df[cols] coincide
+    (NaN igual a NaN, como duplicated). Si el producto de cardinalidades no
+    cabe en 63 bits se recomprime con factorize y se sigue combinando.
+    """
+    clave = np.zeros(len(df), dtype=np.int64)
+    total = 1
+    for c in cols:
+        cod, n = _codigos(df[c])
+        if total * n >= 2**63:
+            clave, uniq = pd.factorize(clave)
+            clave, total = clave.astype(np.int64), len(uniq)
+        clave = clave * n + cod
+        total *= n
+    return clave
+
+# ------------------ Conteo / resumen ------------------
+def filas_duplicadas(df: pd.DataFrame, cols: list[str]) -> int:
+    """Filas en grupos duplicados (= df[cols].duplicated(keep=False).sum())."""
+    return int(pd.Series(clave_filas(df, cols)).duplicated(keep=False).sum())
+
+def resumen_duplicados(df: pd.DataFrame, cols: list[str], muestras: int = MUESTRAS) -> dict:
+    """
+    {'filas_en_grupos_duplicados', 'grupos', 'muestras'}; 'muestras' es un
+    DataFrame con hasta `muestras` claves repetidas y cuántas veces aparecen.
+    """
+    uniq, inv, cnt = np.unique(clave_filas(df, cols), return_inverse=True, return_counts=True)
+    rep = cnt > 1
+    filas = int(cnt[rep].sum())
+
+    # primeras claves repetidas en orden de aparición
+    dup_fila = rep[inv]
+    pos = np.flatnonzero(dup_fila)
+    _, primeras = np.unique(inv[pos], return_index=True)
+    sel = np.sort(pos[primeras])[:muestras]
+    ej = df.iloc[sel][cols].reset_index(drop=True)
+    ej["repeticiones"] = cnt[inv[sel]]
+    return {"filas_en_grupos_duplicados": filas, "grupos": int(rep.sum()), "muestras": ej}
+
+# ------------------ Máscara (equivalente a duplicated) ------------------
+def mascara_duplicados(df: pd.DataFrame, cols: list[str], keep="first") -> pd.Series:
+    """Equivalente a df.duplicated(subset=cols, keep=keep), sobre la clave entera."""
+    return pd.Series(clave_filas(df, cols), index=df.index).duplicated(keep=keep)
+
+# ------------------ Por bloques (combinable) ------------------
+def contar_hashes(h: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(hashes únicos ordenados, conteo de cada uno)."""
+    return np.unique(h, return_counts=True)
+
+def combinar_conteos(a, b):
+    uniq = np.concatenate([a[0], b[0]])
+    cnt = np.concatenate([a[1], b[1]])
+    orden = np.argsort(uniq, kind="stable")
+    uniq, cnt = uniq[orden], cnt[orden]
+    nuevos, ini = np.unique(uniq, return_index=True)
+    return nuevos, np.add.reduceat(cnt, ini) if len(cnt) else cnt
+
+def filas_en_duplicados(conteo) -> int:
+    """Filas cuya clave aparece más de una vez, a partir de un conteo combinado."""
+    cnt = conteo[1]
+    return int(cnt[cnt > 1].sum())
+
+def formatear_muestras(ej: pd.DataFrame) -> str:
+    """Tabla markdown de claves de ejemplo (para los logs .md)."""
+    try:
+        return ej.to_markdown(index=False)
+    except Exception:
+        return ej.to_string(index=False)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ejecutar_pipeline.py
+Orquestador incremental de los scripts del proyecto (DAG).
+
+- Cada paso declara sus ENTRADAS y SALIDAS (archivos o carpetas)
+- Las dependencias se deducen: un paso depende de quien produce sus entradas
+- Se calcula un hash del CONTENIDO de las entradas (+ el script y los módulos
+  locales que importa, + argumentos); si no cambió y las salidas existen, el
+  paso se omite
+- Las ramas independientes (hechos, grafo, texto) corren en paralelo, cada
+  paso en su propio proceso
+- A un paso sin sus insumos (p.ej. sin el corpus CoWeSe) no se le corre; si
+  sus salidas ya existen cuenta como "sin cambios", y en ningún caso frena a
+  los pasos siguientes, que revisan sus propias entradas
+- Si la base ya tenía v_unificado materializada (mv_unificado), se vuelve a
+  materializar con crear_vista_unificada.py --materializar
+- Al final imprime una tabla de tiempos por paso
+
+Estado en .cache/pipeline_estado.json, logs por paso en docs/pipeline/logs/.
+
+Uso:
+    python Scripts/ejecutar_pipeline.py
+    python Scripts/ejecutar_pipeline.py --jobs 4 --cowese CoWeSe.txt
+    python Scripts/ejecutar_pipeline.py --plan          # solo muestra el DAG
+    python Scripts/ejecutar_pipeline.py --forzar        # ignora la caché
+    python Scripts/ejecutar_pipeline.py --llm           # incluye pasos con Ollama
+"""
+
+import argparse, hashlib, json, os, re, sqlite3, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPTS = ROOT / "Scripts"
+ESTADO_PATH = ROOT / ".cache" / "pipeline_estado.json"
+HASHES_PATH = ROOT / ".cache" / "pipeline_hashes.json"
+LOG_DIR = ROOT / "docs" / "pipeline" / "logs"
+
+DB = "salud_federada.db"
+TABLA_MAT = "mv_unificado"   # crear_vista_unificada.TABLA_MAT
+
+# ------------------ Definición del DAG ------------------
+def definir_pasos(cowese: str) -> list[dict]:
+    """Pasos en orden del README. Rutas relativas a la raíz del repo."""
+    return [
+        # --- Rama hechos ---
+        {"nombre": "limpiar_psa", "script": "limpiar_psa.py",
+         "entradas": ["Data/defunciones_uso_sustancias.csv", "Data/urgencias_uso_sustancias.csv"],
+         "salidas":  ["Data/defunciones_uso_sustancias_clean.csv", "Data/urgencias_uso_sustancias_clean.csv"]},
+        {"nombre": "limpiar_csv_sql", "script": "limpiar_csv_sql.py",
+         "entradas": ["Data/defunciones_uso_sustancias_clean.csv", "Data/urgencias_uso_sustancias_clean.csv"],
+         "salidas":  ["Data/Limpieza/defunciones_uso_sustancias_dedup.csv",
+                      "Data/Limpieza/urgencias_uso_sustancias_dedup.csv",
+                      "docs/Limpieza/limpieza_csv_sql_log.md"]},
+        # --- Rama grafo ---
+        {"nombre": "limpiar_grafos", "script": "limpiar_grafos.py",
+         "entradas": ["Data/cie10_f10_f19_nodes.csv", "Data/cie10_f10_f19_edges_enriched.csv"],
+         "salidas":  ["Data/Limpieza/cie10_nodes_dedup.csv", "Data/Limpieza/cie10_edges_dedup.csv"]},
+        {"nombre": "generar_grafo", "script": "generar_grafo.py",
+         "entradas": ["Data/cie10_f10_f19_nodes.csv", "Data/cie10_f10_f19_edges_enriched.csv"],
+         "salidas":  ["docs/grafo_comorbilidad.gpickle"]},
+        # --- Rama texto ---
+        {"nombre": "procesar_cowese_textos", "script": "procesar_cowese_textos.py",
+         "args": ["--cowese", cowese, "--outdir", "Data/Textos"],
+         "entradas": [cowese],
+         "salidas":  ["Data/Textos/cowese_sentences.csv", "Data/Textos/cowese_matches.csv",
+                      "Data/Textos/cowese_tfidf/encabezado.json"]},
+        {"nombre": "limpiar_textos", "script": "limpiar_textos.py",
+         "entradas": ["Data/Textos/cowese_matches.csv"],
+         "salidas":  ["Data/Textos/textos_cie10_frases.csv", "Data/Textos/textos_cie10_frases_x_docs.csv"]},
+        # --- Integración ---
+        {"nombre": "build_base_final", "script": "build_base_final.py",
+         "entradas": ["Data/Limpieza/defunciones_uso_sustancias_dedup.csv",
+                      "Data/Limpieza/urgencias_uso_sustancias_dedup.csv",
+                      "Data/Limpieza/cie10_nodes_dedup.csv", "Data/Limpieza/cie10_edges_dedup.csv",
+                      "Data/Textos/textos_cie10_frases.csv", "Data/Textos/textos_cie10_frases_x_docs.csv"],
+         "salidas":  [DB]},
+        # Modifica la base en sitio: la base es entrada y salida
+        {"nombre": "crear_vista_unificada", "script": "crear_vista_unificada.py",
+         "entradas": [DB], "salidas": [DB]},
+        # --- Consultas ---
+        {"nombre": "consultas_descriptivas", "script": "consultas_descriptivas.py",
+         "entradas": [DB],
+         "salidas":  ["docs/consultas_descriptivas", "docs/figuras_descriptivas"]},
+        {"nombre": "analisis_mineria", "script": "analisis_mineria.py",
+         "entradas": [DB],
+         "salidas":  ["docs/analisis/01_correlaciones_def_urg.csv", "docs/analisis/reporte_20_preguntas.md"]},
+        {"nombre": "consultas_llm", "script": "consultas_llm.py", "llm": True,
+         "entradas": [DB, "docs/grafo_comorbilidad.gpickle"],
+         "salidas":  ["docs/llm_resultados_ollama"]},
+        {"nombre": "consultas_rag", "script": "consultas_rag.py", "llm": True,
+         "entradas": [DB],
+         "salidas":  ["docs/llm_resultados"]},
+        {"nombre": "consultas_predictivas", "script": "consultas_predictivas.py", "llm": True,
+         "entradas": [DB, "docs/consultas_descriptivas"],
+         "salidas":  ["docs/llm_resultados_predictivas"]},
+        {"nombre": "postproceso_respuestas", "script": "postproceso_respuestas.py", "llm": True,
+         "entradas": ["docs/llm_resultados"],
+         "salidas":  ["docs/analisis/master_respuestas.csv", "docs/analisis/index_archivos.csv"]},
+    ]
+
+def resolver_dependencias(pasos: list[dict]) -> dict[str, set]:
+    """
+    deps[p] = pasos anteriores que producen alguna entrada de p (misma ruta o
+    ruta dentro de una carpeta de salida). Si varios pasos escriben la misma
+    ruta (p.ej. la base), cuenta el último que la modificó antes de p.
+    """
+    deps = {p["nombre"]: set() for p in pasos}
+    productor = {}
+    for p in pasos:
+        for e in p["entradas"]:
+            for o, quien in productor.items():
+                if e == o or e.startswith(o + "/") or o.startswith(e + "/"):
+                    deps[p["nombre"]].add(quien)
+        for o in p["salidas"]:
+            productor[o] = p["nombre"]
+    return deps
+
+# ------------------ Hash de contenido ------------------
+_hashes = None
+
+def _cargar_json(path: Path) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _guardar_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def hash_archivo(path: Path) -> str:
+    """sha256 del contenido; se reutiliza mientras (tamaño, mtime) no cambie."""
+    global _hashes
+    if _hashes is None:
+        _hashes = _cargar_json(HASHES_PATH)
+    st = path.stat()
+    firma = f"{st.st_size}:{st.st_mtime_ns}"
+    hit = _hashes.get(str(path))
+    if hit and hit[0] == firma:
+        return hit[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    _hashes[str(path)] = [firma, h.hexdigest()]
+    return _hashes[str(path)][1]
+
+def hash_ruta(rel: str) -> str:
+    """Hash de un archivo o de una carpeta completa (rutas + contenidos)."""
+    p = ROOT / rel
+    if p.is_file():
+        return hash_archivo(p)
+    if p.is_dir():
+        h = hashlib.sha256()
+        for f in sorted(x for x in p.rglob("*") if x.is_file()):
+            h.update(str(f.relative_to(p)).encode("utf-8"))
+            h.update(hash_archivo(f).encode("ascii"))
+        return h.hexdigest()
+    return "<no existe>"
+
+def modulos_locales(script: Path, vistos=None) -> set[Path]:
+    """El script y los módulos de Scripts/ que importa (recursivo)."""
+    vistos = set() if vistos is None else vistos
+    if script in vistos or not script.exists():
+        return vistos
+    vistos.add(script)
+    texto = script.read_text(encoding="utf-8", errors="ignore")
+    for m in re.findall(r"^\s*(?:from|import)\s+(\w+)", texto, flags=re.M):
+        modulos_locales(SCRIPTS / f"{m}.py", vistos)
+    return vistos
+
+def firma_paso(paso: dict, args_extra: list[str]) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([paso["script"], paso.get("args", []) + args_extra]).encode("utf-8"))
+    for m in sorted(modulos_locales(SCRIPTS / paso["script"])):
+        h.update(hash_archivo(m).encode("ascii"))
+    for e in sorted(paso["entradas"]):
+        h.update(e.encode("utf-8"))
+        h.update(hash_ruta(e).encode("ascii"))
+    return h.hexdigest()
+
+# ------------------ Ejecución ------------------
+def base_materializada(db: Path) -> bool:
+    """¿La base ya tiene v_unificado materializada? (build_base_final la borra al reconstruir)."""
+    if not db.is_file():
+        return False
+    con = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+    try:
+        return con.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                           (TABLA_MAT,)).fetchone() is not None
+    except sqlite3.Error:
+        return False
+    finally:
+        con.close()
+
+def ejecutar_paso(paso: dict, args_extra: list[str]) -> tuple[int, float, Path]:
+    """Lanza el script en un proceso aparte (cwd = raíz del repo)."""
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    log = LOG_DIR / f"{paso['nombre']}.log"
+    cmd = [sys.executable, str(SCRIPTS / paso["script"])] + paso.get("args", []) + args_extra
+    t0 = time.perf_counter()
+    with open(log, "w", encoding="utf-8") as f:
+        rc = subprocess.run(cmd, cwd=ROOT, stdout=f, stderr=subprocess.STDOUT).returncode
+    return rc, time.perf_counter() - t0, log
+
+def imprimir_tabla(resultados: list[dict], total: float):
+    print("\n[RESUMEN PIPELINE]")
+    print(f"  {'paso':26s} {'estado':14s} {'segundos':>9s}")
+    print(f"  {'-'*26} {'-'*14} {'-'*9}")
+    for r in resultados:
+        seg = f"{r['segundos']:9.2f}" if r["segundos"] is not None else f"{'-':>9s}"
+        print(f"  {r['nombre']:26s} {r['estado']:14s} {seg}")
+    print(f"  {'TOTAL (pared)':26s} {'':14s} {total:9.2f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Ejecuta el pipeline completo de forma incremental y en paralelo.")
+    ap.add_argument("--cowese", type=str, default="CoWeSe_sample.txt", help="Corpus de texto a procesar")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Pasos simultáneos (procesos)")
+    ap.add_argument("--forzar", action="store_true", help="Ejecutar todos los pasos aunque no haya cambios")
+    ap.add_argument("--llm", action="store_true", help="Incluir los pasos que usan Ollama")
+    ap.add_argument("--pasos", nargs="+", default=None, help="Ejecutar solo estos pasos (por nombre)")
+    ap.add_argument("--plan", action="store_true", help="Solo mostrar pasos y dependencias")
+    ap.add_argument("--parquet", action="store_true",
+                    help="Pasar --parquet a limpiar_psa/limpiar_csv_sql (capa Parquet intermedia)")
+    args = ap.parse_args()
+
+    pasos = [p for p in definir_pasos(args.cowese) if args.llm or not p.get("llm")]
+    if args.pasos:
+        desconocidos = set(args.pasos) - {p["nombre"] for p in pasos}
+        if desconocidos:
+            raise SystemExit(f"Pasos desconocidos: {sorted(desconocidos)}")
+        pasos = [p for p in pasos if p["nombre"] in args.pasos]
+    nombres = {p["nombre"] for p in pasos}
+    deps = {k: v & nombres for k, v in resolver_dependencias(pasos).items()}
+    extra = {p["nombre"]: (["--parquet"] if args.parquet and p["nombre"] in ("limpiar_psa", "limpiar_csv_sql") else [])
+             for p in pasos}
+    if "crear_vista_unificada" in extra and base_materializada(ROOT / DB):
+        extra["crear_vista_unificada"] = ["--materializar"]
+
+    if args.plan:
+        for p in pasos:
+            print(f"- {p['nombre']:26s} <- {', '.join(sorted(deps[p['nombre']])) or '(insumos)'}")
+        return
+
+    estado = _cargar_json(ESTADO_PATH)
+    por_nombre = {p["nombre"]: p for p in pasos}
+    pendientes = [p["nombre"] for p in pasos]
+    resultados = {}
+    fallidos = set()
+    t_total = time.perf_counter()
+
+    def registrar(nombre, est, seg=None):
+        resultados[nombre] = {"nombre": nombre, "estado": est, "segundos": seg}
+        print(f"[{est.upper()}] {nombre}" + (f" ({seg:.2f}s)" if seg is not None else ""))
+
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        en_curso = {}
+        while pendientes or en_curso:
+            # Lanzar todo lo que ya tiene sus dependencias resueltas
+            for nombre in list(pendientes):
+                if not deps[nombre] <= set(resultados):
+                    continue
+                pendientes.remove(nombre)
+                paso = por_nombre[nombre]
+                if deps[nombre] & fallidos:
+                    fallidos.add(nombre); registrar(nombre, "omitido")
+                    continue
+                faltan = [e for e in paso["entradas"] if not (ROOT / e).exists()]
+                if faltan:
+                    # no se corre, pero no frena a los siguientes: cada uno revisa sus entradas
+                    if all((ROOT / s).exists() for s in paso["salidas"]):
+                        registrar(nombre, "sin cambios", 0.0)
+                        print(f"    faltan {faltan}; se usan sus salidas existentes")
+                    else:
+                        registrar(nombre, "sin insumos")
+                        print(f"    faltan: {faltan}")
+                    continue
+                firma = firma_paso(paso, extra[nombre])
+                salidas_ok = all((ROOT / s).exists() for s in paso["salidas"])
+                if not args.forzar and salidas_ok and estado.get(nombre) == firma:
+                    registrar(nombre, "sin cambios", 0.0)
+                    continue
+                print(f"[RUN] {nombre}")
+                en_curso[pool.submit(ejecutar_paso, paso, extra[nombre])] = nombre
+
+            if not en_curso:
+                continue
+            hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+            for fut in hechos:
+                nombre = en_curso.pop(fut)
+                rc, seg, log = fut.result()
+                if rc != 0:
+                    fallidos.add(nombre); estado.pop(nombre, None)
+                    registrar(nombre, "falló", seg)
+                    print(f"    ver log: {log.relative_to(ROOT)}")
+                    continue
+                # Firma DESPUÉS de correr: si el paso modifica sus propias
+                # entradas (p.ej. la base), la próxima vez no se repite
+                estado[nombre] = firma_paso(por_nombre[nombre], extra[nombre])
+                registrar(nombre, "ejecutado", seg)
+            _guardar_json(ESTADO_PATH, estado)
+
+    _guardar_json(ESTADO_PATH, estado)
+    if _hashes is not None:
+        _guardar_json(HASHES_PATH, _hashes)
+    imprimir_tabla([resultados[p["nombre"]] for p in pasos], time.perf_counter() - t_total)
+    if fallidos:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
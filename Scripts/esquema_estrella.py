@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+esquema_estrella.py
+Esquema estrella con claves sustitutas enteras para los hechos de
+build_base_final.py.
+
+En lugar de repetir entidad_norm, edad_quinquenal, sexo, cie10_code y fuente
+como TEXT en cada fila de hechos:
+- Dimensiones dim_entidad, dim_edad, dim_sexo, dim_cie10, dim_fuente
+  (id INTEGER PRIMARY KEY + valor TEXT UNIQUE)
+- Hechos angostos hechos_defunciones / hechos_urgencias:
+  (anio, id_entidad, id_edad, id_sexo, id_cie10, valor, id_fuente), todo entero
+- fact_defunciones / fact_urgencias pasan a ser VISTAS con las mismas columnas
+  de texto de antes (LEFT JOIN a las dimensiones), así que v_eventos,
+  v_unificado, cubos y el SQL de los scripts de consulta no cambian
+- Los índices de hechos comparan enteros (anio, id_entidad, id_cie10)
+
+Uso:
+    from esquema_estrella import crear_esquema_estrella, a_claves, HECHOS_TABLAS
+    crear_esquema_estrella(con)
+    cargar_tabla(con, HECHOS_TABLAS["urgencias"], a_claves(con, df, "urgencias"))
+"""
+
+import numpy as np
+import pandas as pd
+
+# Dimensión -> (columna id, columna de texto en los hechos)
+DIMENSIONES = {
+    "dim_entidad": ("id_entidad", "entidad_norm"),
+    "dim_edad":    ("id_edad",    "edad_quinquenal"),
+    "dim_sexo":    ("id_sexo",    "sexo"),
+    "dim_cie10":   ("id_cie10",   "cie10_code"),
+    "dim_fuente":  ("id_fuente",  "fuente"),
+}
+
+# fuente -> (tabla angosta, vista con el nombre de siempre)
+HECHOS_TABLAS = {"defunciones": "hechos_defunciones", "urgencias": "hechos_urgencias"}
+HECHOS_VISTAS = {"defunciones": "fact_defunciones", "urgencias": "fact_urgencias"}
+
+COLS_HECHOS = ["anio", "id_entidad", "id_edad", "id_sexo", "id_cie10", "valor", "id_fuente"]
+
+# ------------------ Esquema ------------------
+def borrar_objeto(con, nombre):
+    """DROP TABLE o DROP VIEW según lo que sea `nombre` (bases de antes eran tablas)."""
+    fila = con.execute("SELECT type FROM sqlite_master WHERE name=? AND type IN ('table','view')", (nombre,)).fetchone()
+    if fila:
+        con.execute(f"DROP {fila[0].upper()} {nombre}")
+
+def borrar_esquema_estrella(con):
+    for fuente in HECHOS_TABLAS:
+        borrar_objeto(con, HECHOS_VISTAS[fuente])
+        borrar_objeto(con, HECHOS_TABLAS[fuente])
+    for dim in DIMENSIONES:
+        borrar_objeto(con, dim)
+
+def _sql_vista(fuente) -> str:
+    return f"""
+    CREATE VIEW {HECHOS_VISTAS[fuente]} AS
+    SELECT h.anio, e.entidad_norm, d.edad_quinquenal, s.sexo, c.cie10_code, h.valor, f.fuente
+    FROM {HECHOS_TABLAS[fuente]} h
+    LEFT JOIN dim_entidad e ON e.id_entidad = h.id_entidad
+    LEFT JOIN dim_edad    d ON d.id_edad    = h.id_edad
+    LEFT JOIN dim_sexo    s ON s.id_sexo    = h.id_sexo
+    LEFT JOIN dim_cie10   c ON c.id_cie10   = h.id_cie10
+    LEFT JOIN dim_fuente  f ON f.id_fuente  = h.id_fuente;
+    """
+
+def crear_esquema_estrella(con):
+    """Dimensiones, hechos angostos y vistas fact_* (sin datos)."""
+    cur = con.cursor()
+    borrar_esquema_estrella(con)
+    for dim, (col_id, col) in DIMENSIONES.items():
+        cur.execute(f"CREATE TABLE {dim} ({col_id} INTEGER PRIMARY KEY, {col} TEXT UNIQUE NOT NULL)")
+    for fuente, tabla in HECHOS_TABLAS.items():
+        cur.executescript(f"""
+        CREATE TABLE {tabla} (
+          anio INTEGER,
+          id_entidad INTEGER REFERENCES dim_entidad(id_entidad),
+          id_edad    INTEGER REFERENCES dim_edad(id_edad),
+          id_sexo    INTEGER REFERENCES dim_sexo(id_sexo),
+          id_cie10   INTEGER REFERENCES dim_cie10(id_cie10),
+          valor INTEGER,
+          id_fuente  INTEGER REFERENCES dim_fuente(id_fuente)
+        );
+        {_sql_vista(fuente)}
+        """)
+    cur.executemany("INSERT INTO dim_fuente(fuente) VALUES (?)", [(f,) for f in HECHOS_TABLAS])
+
+def crear_indices_hechos(con):
+    con.executescript("""
+    CREATE INDEX IF NOT EXISTS idx_def_keys ON hechos_defunciones(anio, id_entidad, id_cie10);
+    CREATE INDEX IF NOT EXISTS idx_urg_keys ON hechos_urgencias(anio, id_entidad, id_cie10);
+    """)
+
+# ------------------ Texto -> claves ------------------
+def _ids(con, dim, serie: pd.Series) -> pd.Series:
+    """
+    Id entero de cada valor de `serie` en `dim` (Int64, nulo -> NA). Los valores
+    nuevos se agregan a la dimensión en orden lexicográfico.
+    """
+    col_id, col = DIMENSIONES[dim]
+    cod, uniq = pd.factorize(serie)
+    textos = [str(v) for v in uniq]
+    con.executemany(f"INSERT OR IGNORE INTO {dim}({col}) VALUES (?)", [(t,) for t in sorted(set(textos))])
+    mapa = dict(con.execute(f"SELECT {col}, {col_id} FROM {dim}"))
+    ids = np.array([mapa[t] for t in textos] + [0], dtype=np.int64)  # posición -1 → nulo
+    out = pd.array(ids[cod], dtype="Int64")
+    out[cod < 0] = pd.NA
+    return pd.Series(out, index=serie.index)
+
+def a_claves(con, df: pd.DataFrame, fuente: str) -> pd.DataFrame:
+    """Hechos tidy (columnas de texto) -> filas angostas COLS_HECHOS."""
+    out = pd.DataFrame({"anio": df["anio"]}, index=df.index)
+    for dim, (col_id, col) in DIMENSIONES.items():
+        if col == "fuente":
+            continue
+        out[col_id] = _ids(con, dim, df[col])
+    out["valor"] = df["valor"]
+    id_fuente = con.execute("SELECT id_fuente FROM dim_fuente WHERE fuente=?", (fuente,)).fetchone()[0]
+    out["id_fuente"] = id_fuente
+    return out[COLS_HECHOS].reset_index(drop=True)
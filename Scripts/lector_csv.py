@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+lector_csv.py
+Lector de CSV compartido por los scripts de perfilado, limpieza y construcción.
+
+- Detecta separador y encoding sobre una MUESTRA pequeña del archivo
+  (no sobre el archivo completo como hacía sep=None, engine="python")
+- El encabezado es siempre la primera fila (header=0, como antes); con
+  detectar_encabezado=True se adivina con la muestra (sin encabezado si la
+  primera fila tiene celdas vacías o numéricas)
+- Con chunksize/iterator el archivo se decodifica completo antes de leerlo:
+  si la muestra parecía UTF-8 pero el resto no lo es, se lee en latin-1
+- Parsea el archivo completo con el motor rápido de pandas (C por defecto)
+- Guarda la detección en caché (.cache/lector_csv.json) con clave
+  (ruta, tamaño, mtime): si el archivo no cambió no se vuelve a detectar
+
+Uso:
+    from lector_csv import leer_csv
+    df = leer_csv("Data/urgencias_uso_sustancias.csv")
+"""
+
+import csv, json, os, re, codecs
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+CACHE_PATH = ROOT / ".cache" / "lector_csv.json"
+
+MUESTRA_BYTES = 64 * 1024        # bytes leídos para detectar el formato
+MUESTRA_LINEAS = 50              # líneas de la muestra usadas por el Sniffer
+ENCODINGS = ("utf-8", "latin-1")
+SEPARADORES = ",;\t|"
+
+NUM_RE = re.compile(r"^[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?$")
+
+_cache = None
+
+# ------------------ Caché de detección ------------------
+def _cargar_cache() -> dict:
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+def _guardar_cache():
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_cache, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, CACHE_PATH)
+    except OSError:
+        pass  # la caché es opcional: si no se puede escribir, solo se pierde el atajo
+
+def _clave(path: Path) -> tuple[str, str]:
+    st = path.stat()
+    return str(path.resolve()), f"{st.st_size}:{st.st_mtime_ns}"
+
+# ------------------ Detección sobre muestra ------------------
+def _decodificar_muestra(raw: bytes) -> tuple[str, str]:
+    """Devuelve (encoding, texto). Tolera un carácter multibyte cortado al final."""
+    for enc in ENCODINGS:
+        try:
+            return enc, codecs.getincrementaldecoder(enc)().decode(raw, final=False)
+        except UnicodeDecodeError:
+            continue
+    return "latin-1", raw.decode("latin-1")
+
+def _tiene_encabezado(primera: list[str]) -> bool:
+    """Encabezado = primera fila sin celdas vacías ni valores numéricos."""
+    if not primera:
+        return False
+    return all(c.strip() and not NUM_RE.match(c.strip()) for c in primera)
+
+def detectar_formato(path) -> dict:
+    """
+    Detecta {'encoding', 'sep', 'header'} leyendo solo los primeros MUESTRA_BYTES.
+    El resultado se cachea por (ruta, tamaño, mtime).
+    """
+    path = Path(path)
+    ruta, firma = _clave(path)
+    cache = _cargar_cache()
+    hit = cache.get(ruta)
+    if hit and hit.get("firma") == firma:
+        return hit["formato"]
+
+    with open(path, "rb") as f:
+        raw = f.read(MUESTRA_BYTES)
+    if raw.startswith(codecs.BOM_UTF8):
+        raw = raw[len(codecs.BOM_UTF8):]
+    enc, texto = _decodificar_muestra(raw)
+
+    lineas = texto.splitlines()
+    if len(raw) == MUESTRA_BYTES and len(lineas) > 1:
+        lineas = lineas[:-1]  # la última línea puede venir cortada
+    muestra = "\n".join(lineas[:MUESTRA_LINEAS])
+
+    try:
+        sep = csv.Sniffer().sniff(muestra, delimiters=SEPARADORES).delimiter
+    except csv.Error:
+        sep = ","
+    primera = next(csv.reader([lineas[0]], delimiter=sep), []) if lineas else []
+
+    formato = {"encoding": enc, "sep": sep, "header": 0 if _tiene_encabezado(primera) else None}
+    cache[ruta] = {"firma": firma, "formato": formato}
+    _guardar_cache()
+    return formato
+
+def _actualizar_encoding(path: Path, enc: str, verificado: bool = False):
+    ruta, firma = _clave(path)
+    cache = _cargar_cache()
+    if ruta in cache:
+        cache[ruta]["formato"]["encoding"] = enc
+        if verificado:
+            cache[ruta]["encoding_verificado"] = True
+        _guardar_cache()
+
+def _encoding_verificado(path: Path) -> bool:
+    ruta, firma = _clave(path)
+    hit = _cargar_cache().get(ruta)
+    return bool(hit and hit.get("firma") == firma and hit.get("encoding_verificado"))
+
+def _es_utf8(path: Path, bloque: int = 1 << 20) -> bool:
+    """Decodifica el archivo completo por bloques (sin cargarlo en memoria)."""
+    dec = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(path, "rb") as f:
+            while True:
+                raw = f.read(bloque)
+                dec.decode(raw, final=not raw)
+                if not raw:
+                    return True
+    except UnicodeDecodeError:
+        return False
+
+# ------------------ Lectura ------------------
+def leer_csv(path, engine: str = "c", detectar_encabezado: bool = False, **kwargs) -> pd.DataFrame:
+    """
+    Lee un CSV con formato autodetectado y motor rápido ('c' o 'pyarrow').
+    Los kwargs se pasan a pd.read_csv y tienen prioridad sobre lo detectado.
+    header=0 salvo detectar_encabezado=True (o header en los kwargs).
+    Si la muestra parecía UTF-8 pero el archivo completo no lo es, se
+    reintenta con latin-1 y se corrige la caché; con chunksize/iterator la
+    decodificación ocurre al iterar, así que se verifica el archivo antes.
+    """
+    path = Path(path)
+    fmt = detectar_formato(path)
+    opts = {"sep": fmt["sep"], "encoding": fmt["encoding"],
+            "header": fmt["header"] if detectar_encabezado else 0}
+    opts.update(kwargs)
+    por_bloques = opts.get("chunksize") is not None or opts.get("iterator")
+    if por_bloques and opts["encoding"] == "utf-8" and "encoding" not in kwargs and not _encoding_verificado(path):
+        opts["encoding"] = "utf-8" if _es_utf8(path) else "latin-1"
+        _actualizar_encoding(path, opts["encoding"], verificado=True)
+    try:
+        return pd.read_csv(path, engine=engine, **opts)
+    except UnicodeDecodeError:
+        if opts["encoding"] == "latin-1" or "encoding" in kwargs:
+            raise
+        opts["encoding"] = "latin-1"
+        df = pd.read_csv(path, engine=engine, **opts)
+        _actualizar_encoding(path, "latin-1")
+        return df
@@ -8,6 +8,12 @@ Limpieza de duplicados para CSV de hechos (defunciones / urgencias) CONSERVANDO
 - Mapea sinónimos -> anio, entidad_norm, sexo, edad_quinquenal, cie10_code, valor
 - Convierte a largo si es necesario y AGREGA por (anio, entidad_norm, sexo, edad_quinquenal, cie10_code)
 - Guarda *_dedup.csv y genera log con métricas antes/después
+- Con --jobs N reparte la agregación por (fuente, anio) en N procesos
+  (misma salida y métricas que el modo serial)
+- Con --parquet lee Data/Parquet/psa_clean (si existe) y escribe además
+  Data/Parquet/hechos_dedup particionado por fuente/anio; sin --parquet se
+  borra hechos_dedup de la fuente reescrita (build_base_final.py lo
+  preferiría al CSV nuevo)
 
 Entradas (por defecto):
   Data/defunciones_uso_sustancias_clean.csv
@@ -19,8 +25,15 @@ Salidas:
   docs/Entrega4_limpieza_csv_sql_log.md
 """
 
-import os, re, datetime, unicodedata
+import os, re, datetime, unicodedata, argparse
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from lector_csv import leer_csv
+from ancho_largo import ancho_a_largo, como_categoria, numerico
+from duplicados import filas_duplicadas
+from capa_parquet import (DS_PSA_CLEAN, DS_HECHOS_DEDUP, requerir_pyarrow, existe_dataset,
+                          leer_particiones, borrar_fuente, escribir_particiones)
 
 # ================== Config por defecto (puedes cambiarlas) ===================
 IN_DEF = "Data/defunciones_uso_sustancias_clean.csv"
@@ -52,14 +65,7 @@ def norm_header(h: str) -> str:
     return s
 
 def read_csv_smart(path: str) -> pd.DataFrame:
-    for enc in ("utf-8", "latin-1"):
-        try:
-            df = pd.read_csv(path, sep=None, engine="python", encoding=enc)
-            break
-        except Exception:
-            continue
-    else:
-        df = pd.read_csv(path, encoding="latin-1")
+    df = leer_csv(path)
     df.columns = [norm_header(c) for c in df.columns]
     return df
 
@@ -76,11 +82,10 @@ def is_wide(df: pd.DataFrame) -> bool:
 def melt_to_long(df: pd.DataFrame) -> pd.DataFrame:
     id_cols = [c for c in df.columns if not F_WIDE_PATTERN.match(c)]
     fcols   = [c for c in df.columns if F_WIDE_PATTERN.match(c)]
-    long_df = df.melt(id_vars=id_cols, value_vars=fcols, var_name="cie10_code", value_name="valor")
-    long_df["cie10_code"] = long_df["cie10_code"].astype(str).str.upper().str.strip()
-    # convertir valor a numérico (coerce NaN → 0)
-    long_df["valor"] = pd.to_numeric(long_df["valor"], errors="coerce").fillna(0)
-    return long_df
+    # motor vectorizado: dimensiones y cie10_code como category,
+    # valor a numérico (coerce NaN → 0)
+    return ancho_a_largo(df, id_cols, fcols, var_name="cie10_code", value_name="valor",
+                         codigos=[c.upper().strip() for c in fcols], fill_value=0)
 
 # ====================== Estandarización a formato largo ======================
 def to_long_and_standardize(df: pd.DataFrame, is_def: bool) -> pd.DataFrame:
@@ -149,13 +154,13 @@ def to_long_and_standardize(df: pd.DataFrame, is_def: bool) -> pd.DataFrame:
         elif src != col:
             df[col] = df[src]
 
-    # Normalizaciones de tipo y texto
-    df["anio"] = pd.to_numeric(df["anio"], errors="coerce")
-    df["entidad_norm"] = df["entidad_norm"].astype(str).str.strip()
-    df["sexo"] = df["sexo"].astype(str).str.strip()
-    df["edad_quinquenal"] = df["edad_quinquenal"].astype(str).str.strip()
-    df["cie10_code"] = df["cie10_code"].astype(str).str.upper().str.strip()
-    df["valor"] = pd.to_numeric(df["valor"], errors="coerce").fillna(0)
+    # Normalizaciones de tipo y texto (sobre los valores distintos: category)
+    df["anio"] = numerico(df["anio"])
+    df["entidad_norm"] = como_categoria(df["entidad_norm"], lambda s: s.astype(str).str.strip())
+    df["sexo"] = como_categoria(df["sexo"], lambda s: s.astype(str).str.strip())
+    df["edad_quinquenal"] = como_categoria(df["edad_quinquenal"], lambda s: s.astype(str).str.strip())
+    df["cie10_code"] = como_categoria(df["cie10_code"], lambda s: s.astype(str).str.upper().str.strip())
+    df["valor"] = numerico(df["valor"]).fillna(0)
 
     # Filtros opcionales
     if FILTER_TO_F10_F19:
@@ -168,20 +173,32 @@ def to_long_and_standardize(df: pd.DataFrame, is_def: bool) -> pd.DataFrame:
 # ============================= Métricas de dups ==============================
 def summarize_dups(df: pd.DataFrame) -> int:
     key = ["anio","entidad_norm","sexo","edad_quinquenal","cie10_code"]
-    return int(df[key].astype(str).duplicated(keep=False).sum())
+    return filas_duplicadas(df, key)
 
 # ============================ Agregación por clave ===========================
 def aggregate_by_key(df: pd.DataFrame) -> pd.DataFrame:
     key = ["anio","entidad_norm","sexo","edad_quinquenal","cie10_code"]
-    g = df.groupby(key, as_index=False)["valor"].sum()
+    g = df.groupby(key, as_index=False, observed=True)["valor"].sum()
     g = g[g["valor"].notna()]
     return g
 
 # ================================= Pipeline =================================
-def process_one(in_path: str, out_path: str, is_def: bool):
+def read_input(in_path: str, fuente: str, parquet: bool) -> tuple[pd.DataFrame, str]:
+    """Con --parquet usa el dataset psa_clean (sin re-parsear texto) si existe."""
+    if parquet and existe_dataset(DS_PSA_CLEAN, fuente):
+        df = leer_particiones(DS_PSA_CLEAN, fuente)
+        df.columns = [norm_header(c) for c in df.columns]
+        return df, f"{DS_PSA_CLEAN}/fuente={fuente}"
+    return read_csv_smart(in_path), in_path
+
+def load_long(in_path: str, is_def: bool, parquet: bool) -> tuple[pd.DataFrame, str, str]:
+    fuente = "defunciones" if is_def else "urgencias"
+    raw, in_path = read_input(in_path, fuente, parquet)
+    return to_long_and_standardize(raw, is_def=is_def), in_path, fuente
+
+def process_one(in_path: str, out_path: str, is_def: bool, parquet: bool = False):
     ensure_dir(out_path)
-    raw = read_csv_smart(in_path)
-    long = to_long_and_standardize(raw, is_def=is_def)
+    long, in_path, fuente = load_long(in_path, is_def, parquet)
 
     before_rows = len(long)
     before_dups = summarize_dups(long)
@@ -192,6 +209,9 @@ def process_one(in_path: str, out_path: str, is_def: bool):
     after_dups = summarize_dups(cleaned)
 
     cleaned.to_csv(out_path, index=False, encoding="utf-8")
+    borrar_fuente(DS_HECHOS_DEDUP, fuente)
+    if parquet:
+        escribir_particiones(cleaned, DS_HECHOS_DEDUP, fuente)
 
     return {
         "in": in_path,
@@ -203,11 +223,82 @@ def process_one(in_path: str, out_path: str, is_def: bool):
         "cols": list(long.columns)
     }
 
+# ======================= Modo paralelo (fuente × año) =======================
+def split_by_year(long: pd.DataFrame) -> list[pd.DataFrame]:
+    """
+    Particiones por anio (orden ascendente; NaN al final). 'anio' es parte de
+    la clave, así que ningún grupo duplicado cruza particiones.
+    """
+    return [g for _, g in long.groupby("anio", sort=True, dropna=False)]
+
+def dedup_partition(part: pd.DataFrame, keep_frame: bool) -> tuple[pd.DataFrame | None, str, dict]:
+    """
+    Trabajo de un proceso: agrega un año, devuelve sus filas ya formateadas
+    como CSV (sin encabezado) y sus métricas. El DataFrame solo vuelve al
+    proceso principal si hace falta (escritura Parquet).
+    """
+    cleaned = aggregate_by_key(part)
+    metrics = {"before_rows": len(part), "before_dups": summarize_dups(part),
+               "after_rows": len(cleaned), "after_dups": summarize_dups(cleaned)}
+    text = cleaned.to_csv(index=False, header=False) if len(cleaned) else ""
+    return (cleaned if keep_frame else None), text, metrics
+
+def process_parallel(jobs_spec: list[tuple[str, str, bool]], jobs: int, parquet: bool = False) -> list[dict]:
+    """
+    Igual que process_one para cada (in_path, out_path, is_def), pero la
+    agregación y el formateo CSV se reparten por (fuente, anio) en un pool de
+    procesos. Las particiones se escriben en orden de año: la salida es
+    idéntica a la del modo serial (groupby ordena por la clave, que empieza por anio).
+    """
+    pendientes = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # se lee/estandariza la siguiente fuente mientras el pool agrega la anterior
+        for in_path, out_path, is_def in jobs_spec:
+            ensure_dir(out_path)
+            long, in_path, fuente = load_long(in_path, is_def, parquet)
+            futs = [pool.submit(dedup_partition, part, parquet) for part in split_by_year(long)]
+            header = aggregate_by_key(long.iloc[:0])
+            pendientes.append((in_path, out_path, fuente, list(long.columns), header, futs))
+            del long
+
+        results = []
+        for in_path, out_path, fuente, long_cols, header, futs in pendientes:
+            metrics = dict.fromkeys(("before_rows", "before_dups", "after_rows", "after_dups"), 0)
+            frames = []
+            with open(out_path, "w", encoding="utf-8", newline="") as f:
+                header.to_csv(f, index=False)
+                for fut in futs:
+                    cleaned, text, m = fut.result()
+                    f.write(text)
+                    for k in metrics:
+                        metrics[k] += m[k]
+                    if cleaned is not None:
+                        frames.append(cleaned)
+            borrar_fuente(DS_HECHOS_DEDUP, fuente)
+            if parquet and frames:
+                escribir_particiones(pd.concat(frames, ignore_index=True), DS_HECHOS_DEDUP, fuente)
+            results.append({"in": in_path, "out": out_path, **metrics, "cols": long_cols})
+    return results
+
 def main():
+    ap = argparse.ArgumentParser(description="Deduplicación de hechos (defunciones/urgencias).")
+    ap.add_argument("--parquet", action="store_true",
+                    help="Leer/escribir la capa Parquet particionada (Data/Parquet)")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Procesos para agregar en paralelo por (fuente, anio); 0 = todos los núcleos")
+    args = ap.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.parquet:
+        requerir_pyarrow()
+
     ensure_dir(LOG_MD)
 
-    res_def = process_one(IN_DEF, OUT_DEF, is_def=True)
-    res_urg = process_one(IN_URG, OUT_URG, is_def=False)
+    if jobs > 1:
+        res_def, res_urg = process_parallel([(IN_DEF, OUT_DEF, True), (IN_URG, OUT_URG, False)],
+                                            jobs, parquet=args.parquet)
+    else:
+        res_def = process_one(IN_DEF, OUT_DEF, is_def=True, parquet=args.parquet)
+        res_urg = process_one(IN_URG, OUT_URG, is_def=False, parquet=args.parquet)
 
     with open(LOG_MD, "w", encoding="utf-8") as f:
         f.write("# Limpieza CSV – Hechos (defunciones/urgencias) conservando edad\n\n")
@@ -13,6 +13,9 @@ Limpieza robusta de grafo CIE-10 (nodos y aristas) con detección de sinónimos.
 import pandas as pd
 import unicodedata, os, re, datetime
 
+from lector_csv import leer_csv
+from duplicados import resumen_duplicados, mascara_duplicados, formatear_muestras
+
 IN_NODES = "Data/cie10_f10_f19_nodes.csv"
 IN_EDGES = "Data/cie10_f10_f19_edges_enriched.csv"
 OUT_NODES = "Data/Limpieza/cie10_nodes_dedup.csv"
@@ -45,7 +48,7 @@ def pick_first(cols: list[str], candidates: list[str]) -> str | None:
 # -------------------- Limpieza --------------------
 def limpiar_grafo():
     # ====== NODOS ======
-    nodes = pd.read_csv(IN_NODES, sep=None, engine="python", encoding="utf-8")
+    nodes = leer_csv(IN_NODES)
     nodes = norm_cols(nodes)
 
     # Mapear id de nodo y campos comunes
@@ -61,11 +64,12 @@ def limpiar_grafo():
         nodes[c] = nodes[c].astype(str).apply(norm_text)
 
     before_nodes = len(nodes)
-    nodes = nodes.drop_duplicates(subset=[node_id_col])
+    dups_nodes = resumen_duplicados(nodes, [node_id_col])
+    nodes = nodes[~mascara_duplicados(nodes, [node_id_col])]
     after_nodes = len(nodes)
 
     # ====== ARISTAS ======
-    edges = pd.read_csv(IN_EDGES, sep=None, engine="python", encoding="utf-8")
+    edges = leer_csv(IN_EDGES)
     edges = norm_cols(edges)
 
     # Detectar columnas base
@@ -96,7 +100,8 @@ def limpiar_grafo():
     subset_cols = [source_col, target_col]
     if rel_col in edges.columns:
         subset_cols.append(rel_col)
-    edges = edges.drop_duplicates(subset=subset_cols, keep="first")
+    dups_edges = resumen_duplicados(edges, subset_cols)
+    edges = edges[~mascara_duplicados(edges, subset_cols, keep="first")]
     after_edges = len(edges)
 
     # ====== Consistencia: source/target deben existir en nodes ======
@@ -140,7 +145,11 @@ def limpiar_grafo():
         f.write("## Nodos\n")
         f.write(f"- Archivo original: `{IN_NODES}`\n")
         f.write(f"- ID de nodo detectado: `{node_id_col}` → renombrado como `code`\n")
-        f.write(f"- Filas antes → después: {before_nodes} → {after_nodes}\n\n")
+        f.write(f"- Filas antes → después: {before_nodes} → {after_nodes}\n")
+        f.write(f"- Filas en grupos duplicados: {dups_nodes['filas_en_grupos_duplicados']}\n\n")
+        if dups_nodes["grupos"]:
+            f.write("### Ejemplos de nodos duplicados:\n")
+            f.write(formatear_muestras(dups_nodes["muestras"]) + "\n\n")
 
         f.write("## Aristas\n")
         f.write(f"- Archivo original: `{IN_EDGES}`\n")
@@ -148,7 +157,11 @@ def limpiar_grafo():
         if weight_col:
             f.write(f"- Columna de peso detectada: `{weight_col}`\n")
         f.write(f"- Filas antes → después (dedupe): {before_edges} → {after_edges}\n")
+        f.write(f"- Filas en grupos duplicados: {dups_edges['filas_en_grupos_duplicados']}\n")
         f.write(f"- Aristas inválidas eliminadas (nodo inexistente): {len(bad_edges)}\n\n")
+        if dups_edges["grupos"]:
+            f.write("### Ejemplos de aristas duplicadas:\n")
+            f.write(formatear_muestras(dups_edges["muestras"]) + "\n\n")
         if len(bad_edges):
             f.write("### Ejemplos de aristas inválidas:\n")
             try:
@@ -4,10 +4,16 @@
 # - Parsea 'fecha' a datetime
 # - Valida columnas esperadas
 # - Guarda *_clean.csv en la misma carpeta
+# - Con --chunksize N procesa por bloques de N filas (memoria acotada)
+# - Con --parquet escribe además Data/Parquet/psa_clean/ (fuente=/anio=); sin él
+#   borra el dataset de la fuente que reescribe, para que nadie lea uno viejo
 
+import argparse
 import pandas as pd
 from pathlib import Path
 
+from capa_parquet import DS_PSA_CLEAN, requerir_pyarrow, borrar_fuente, preparar_anio, escribir_particiones
+
 DATA_DIR = Path("./Data")    # ajustar si tu ruta es distinta
 DEF_FILE = DATA_DIR / "defunciones_uso_sustancias.csv"
 URG_FILE = DATA_DIR / "urgencias_uso_sustancias.csv"
@@ -17,33 +23,77 @@ URG_OUT  = DATA_DIR / "urgencias_uso_sustancias_clean.csv"
 
 FX_COLS = ["F10","F11","F12","F13","F14","F15","F16","F17","F18","F19"]
 
+DEF_REQUIRED = ["anio_defuncion","entidad_defuncion","edad_quinquenal","sexo","fecha",
+                "cve_entidad","entidad_defuncion_etq"] + FX_COLS
+DEF_ORDERED  = ["anio_defuncion","entidad_defuncion","edad_quinquenal","sexo"] + FX_COLS + \
+               ["cve_entidad","fecha","entidad_defuncion_etq"]
+URG_REQUIRED = ["anio","entidad","edad_quinquenal","sexo","fecha"] + FX_COLS
+URG_ORDERED  = ["anio","entidad","edad_quinquenal","sexo"] + FX_COLS + ["fecha"]
+
+# Columna de año usada como partición 'anio' en la salida Parquet
+YEAR_COL = {"defunciones": "anio_defuncion", "urgencias": "anio"}
+
+# Modo por bloques: tipos fijos (sin inferencia por bloque). Las dimensiones se
+# leen como texto tal cual y F10..F19 como texto para poder forzar a numérico
+# con errors="coerce" igual que en el modo completo.
+CHUNK_DTYPES = {c: "str" for c in set(DEF_REQUIRED + URG_REQUIRED)}
+
 def check_columns(df, required, name):
     missing = [c for c in required if c not in df.columns]
     if missing:
         raise ValueError(f"[{name}] Faltan columnas: {missing}")
 
-def limpiar_defunciones(path_in: Path, path_out: Path):
+def limpiar_bloque(df, ordered):
+    """Limpieza de un bloque (F10..F19 a int64, fecha a date, orden de columnas)."""
+    for c in FX_COLS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce").dt.date
+    return df[[c for c in ordered if c in df.columns]]
+
+def guardar_parquet(df, name, parte=0):
+    """Escribe el bloque limpio en el dataset psa_clean (fuente=name, anio=*)."""
+    escribir_particiones(preparar_anio(df, YEAR_COL[name]), DS_PSA_CLEAN, name, parte=parte)
+
+def limpiar_por_bloques(path_in: Path, path_out: Path, required, ordered, name, chunksize, parquet=False):
+    """
+    Versión en streaming: lee y escribe de a `chunksize` filas.
+    La memoria pico depende del tamaño del bloque, no del archivo.
+    """
+    print(f"Cargando por bloques ({chunksize:,} filas): {path_in}")
+    header = pd.read_csv(path_in, nrows=0)
+    check_columns(header, required, name)
+
+    dtypes = {c: CHUNK_DTYPES[c] for c in header.columns if c in CHUNK_DTYPES}
+    totales = pd.Series(0, index=FX_COLS, dtype="int64")
+    filas = 0
+    borrar_fuente(DS_PSA_CLEAN, name)   # con o sin --parquet: el CSV pasa a ser la versión vigente
+    with open(path_out, "w", encoding="utf-8", newline="") as out:
+        reader = pd.read_csv(path_in, dtype=dtypes, chunksize=chunksize)
+        for i, chunk in enumerate(reader):
+            chunk = limpiar_bloque(chunk, ordered)
+            totales += chunk[FX_COLS].sum()
+            filas += len(chunk)
+            chunk.to_csv(out, index=False, header=(i == 0))
+            if parquet:
+                guardar_parquet(chunk, name, parte=i)
+
+    # Resumen rápido (mismos totales que el modo completo)
+    print(f"\n[{name}] Resumen FXX:")
+    print(totales.sort_values(ascending=False))
+    print(f"Guardado limpio: {path_out} ({filas:,} filas)")
+
+def limpiar_defunciones(path_in: Path, path_out: Path, chunksize=None, parquet=False):
+    if chunksize:
+        return limpiar_por_bloques(path_in, path_out, DEF_REQUIRED, DEF_ORDERED, "defunciones", chunksize, parquet)
+
     print(f"Cargando: {path_in}")
     df = pd.read_csv(path_in)
 
     # Columnas esperadas mínimas (ajusta si necesitas)
-    required = ["anio_defuncion","entidad_defuncion","edad_quinquenal","sexo","fecha",
-                "cve_entidad","entidad_defuncion_etq"] + FX_COLS
-    check_columns(df, required, "defunciones")
+    check_columns(df, DEF_REQUIRED, "defunciones")
 
-    # Limpiar F10..F19
-    df[FX_COLS] = df[FX_COLS].fillna(0)
-    # Si hay valores no numéricos raros, fuerza a numérico seguro
-    for c in FX_COLS:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
-
-    # Parsear fecha
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce").dt.date
-
-    # Orden sugerido de columnas (opcional)
-    ordered = ["anio_defuncion","entidad_defuncion","edad_quinquenal","sexo"] + FX_COLS + \
-              ["cve_entidad","fecha","entidad_defuncion_etq"]
-    df = df[[c for c in ordered if c in df.columns]]
+    # Limpiar F10..F19 (forzando a numérico seguro), parsear fecha y ordenar
+    df = limpiar_bloque(df, DEF_ORDERED)
 
     # Resumen rápido
     print("\n[defunciones] Resumen FXX:")
@@ -51,26 +101,24 @@ def limpiar_defunciones(path_in: Path, path_out: Path):
 
     df.to_csv(path_out, index=False)
     print(f"Guardado limpio: {path_out}")
+    borrar_fuente(DS_PSA_CLEAN, "defunciones")
+    if parquet:
+        guardar_parquet(df, "defunciones")
+        print(f"Guardado Parquet: {DS_PSA_CLEAN}/fuente=defunciones")
+
+def limpiar_urgencias(path_in: Path, path_out: Path, chunksize=None, parquet=False):
+    if chunksize:
+        print()
+        return limpiar_por_bloques(path_in, path_out, URG_REQUIRED, URG_ORDERED, "urgencias", chunksize, parquet)
 
-def limpiar_urgencias(path_in: Path, path_out: Path):
     print(f"\nCargando: {path_in}")
     df = pd.read_csv(path_in)
 
     # Columnas esperadas mínimas (ajusta si necesitas)
-    required = ["anio","entidad","edad_quinquenal","sexo","fecha"] + FX_COLS
-    check_columns(df, required, "urgencias")
-
-    # Limpiar F10..F19
-    df[FX_COLS] = df[FX_COLS].fillna(0)
-    for c in FX_COLS:
-        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
-
-    # Parsear fecha
-    df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce").dt.date
+    check_columns(df, URG_REQUIRED, "urgencias")
 
-    # Orden sugerido de columnas (opcional)
-    ordered = ["anio","entidad","edad_quinquenal","sexo"] + FX_COLS + ["fecha"]
-    df = df[[c for c in ordered if c in df.columns]]
+    # Limpiar F10..F19, parsear fecha y ordenar
+    df = limpiar_bloque(df, URG_ORDERED)
 
     # Resumen rápido
     print("\n[urgencias] Resumen FXX:")
@@ -78,9 +126,22 @@ def limpiar_urgencias(path_in: Path, path_out: Path):
 
     df.to_csv(path_out, index=False)
     print(f"Guardado limpio: {path_out}")
+    borrar_fuente(DS_PSA_CLEAN, "urgencias")
+    if parquet:
+        guardar_parquet(df, "urgencias")
+        print(f"Guardado Parquet: {DS_PSA_CLEAN}/fuente=urgencias")
 
 if __name__ == "__main__":
-    limpiar_defunciones(DEF_FILE, DEF_OUT)
-    limpiar_urgencias(URG_FILE, URG_OUT)
+    ap = argparse.ArgumentParser(description="Limpieza de defunciones/urgencias (F10..F19).")
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="Procesar por bloques de N filas (memoria acotada para archivos grandes)")
+    ap.add_argument("--parquet", action="store_true",
+                    help="Escribir también el dataset Parquet particionado (Data/Parquet/psa_clean)")
+    args = ap.parse_args()
+    if args.parquet:
+        requerir_pyarrow()
+
+    limpiar_defunciones(DEF_FILE, DEF_OUT, chunksize=args.chunksize, parquet=args.parquet)
+    limpiar_urgencias(URG_FILE, URG_OUT, chunksize=args.chunksize, parquet=args.parquet)
 
     print("\n✓ Listo. Puedes cargar estos archivos a Postgres con \\COPY o usarlos directo en pandas.")
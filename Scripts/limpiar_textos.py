@@ -5,6 +5,8 @@ import os, re, unicodedata, datetime, hashlib, sys
 import pandas as pd
 from pathlib import Path
 
+from lector_csv import leer_csv
+
 # ================== Config ==================
 # Insumo principal (se intenta también la ruta alternativa si no existe)
 IN_PATHS = [
@@ -38,12 +40,7 @@ def read_csv_smart(paths):
     existing = next((Path(p) for p in paths if Path(p).exists()), None)
     if not existing:
         raise FileNotFoundError(f"No se encontró ningún insumo en: {paths}")
-    for enc in ("utf-8", "latin-1"):
-        try:
-            return pd.read_csv(existing, sep=None, engine="python", encoding=enc)
-        except Exception:
-            continue
-    return pd.read_csv(existing, encoding="latin-1")
+    return leer_csv(existing)
 
 def pick_first(df, cands):
     """Devuelve el primer nombre de columna presente (case-insensitive)."""
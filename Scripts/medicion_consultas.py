@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+medicion_consultas.py
+Instrumentación común de las consultas de los scripts de análisis
+(consultas_descriptivas.ejecutar_sql, analisis_mineria.q,
+consultas_llm.ejecutar_respuesta_llm).
+
+- Por sentencia: tiempo de pared, filas devueltas, bytes del resultado
+  (DataFrame en memoria), origen (base o caché de cache_sql) y etiqueta
+  (la función que la pidió: pregunta_3, correlaciones, P2...)
+- Las que tardan UMBRAL_LENTA_MS o más (y no salieron de la caché) se
+  escriben en el registro de consultas lentas docs/perf/consultas_lentas.jsonl
+  (una línea JSON por consulta) con su EXPLAIN QUERY PLAN (EXPLAIN en DuckDB)
+- Los errores también se registran (y se vuelven a lanzar)
+- imprimir_mediciones() al final del script: totales y las consultas más
+  lentas
+
+Uso:
+    from medicion_consultas import medir_consulta, imprimir_mediciones
+    df = medir_consulta(con, sql, lambda: leer_sql(sql, con), etiqueta="pregunta_1")
+    imprimir_mediciones()
+"""
+
+import datetime, json, sys, threading, time
+from pathlib import Path
+
+from cache_sql import origen_ultima_consulta
+from conexiones import plan_consulta, es_duckdb
+
+UMBRAL_LENTA_MS = 100.0   # desde aquí la consulta va al registro de lentas con su plan
+REGISTRO_LENTAS = Path(__file__).resolve().parent.parent / "docs" / "perf" / "consultas_lentas.jsonl"
+TOP_RESUMEN = 10          # consultas más lentas en el resumen
+
+_mediciones = []
+_lock = threading.Lock()
+
+def llamador(nivel=2) -> str:
+    """Nombre de la función que llamó a quien llama a llamador() (etiqueta por defecto)."""
+    return sys._getframe(nivel).f_code.co_name
+
+def _una_linea(sql) -> str:
+    return " ".join(str(sql).split()).rstrip(";")
+
+def _bytes(res) -> int:
+    if hasattr(res, "memory_usage"):
+        return int(res.memory_usage(index=True, deep=True).sum())
+    return 0
+
+def _escribir_lenta(m: dict):
+    with _lock:
+        try:
+            REGISTRO_LENTAS.parent.mkdir(parents=True, exist_ok=True)
+            with open(REGISTRO_LENTAS, "a", encoding="utf-8") as f:
+                f.write(json.dumps(m, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            pass  # el registro es opcional
+
+def medir_consulta(con, sql, ejecutar, params=None, etiqueta=None):
+    """
+    Ejecuta `ejecutar()` (lee `sql` y devuelve un DataFrame), mide y registra.
+    `con` solo se usa para el plan de las consultas lentas (puede ser None).
+    """
+    m = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "script": Path(sys.argv[0] or "?").name,
+        "etiqueta": etiqueta or _una_linea(sql)[:40],
+        "motor": ("duckdb" if es_duckdb(con) else "sqlite") if con is not None else None,
+    }
+    origen_ultima_consulta()   # olvida lo de una consulta anterior del mismo hilo
+    t0 = time.perf_counter()
+    try:
+        res = ejecutar()
+    except Exception as e:
+        m.update(ms=round((time.perf_counter() - t0) * 1000, 3), filas=0, bytes=0, origen="base",
+                 error=str(e).splitlines()[0] if str(e) else type(e).__name__, sql=_una_linea(sql))
+        with _lock:
+            _mediciones.append(m)
+        _escribir_lenta(m)
+        raise
+    m.update(ms=round((time.perf_counter() - t0) * 1000, 3), filas=len(res), bytes=_bytes(res),
+             origen=origen_ultima_consulta() or "base")
+    m["lenta"] = m["ms"] >= UMBRAL_LENTA_MS and m["origen"] == "base"
+    with _lock:
+        _mediciones.append(m)
+    if m["lenta"]:
+        m["umbral_ms"] = UMBRAL_LENTA_MS
+        m["sql"] = _una_linea(sql)
+        m["params"] = list(params or [])
+        try:
+            m["plan"] = plan_consulta(con, sql, params) if con is not None else []
+        except Exception as e:
+            m["plan"] = [f"(sin plan: {e})"]
+        _escribir_lenta(m)
+    return res
+
+def mediciones() -> list[dict]:
+    with _lock:
+        return list(_mediciones)
+
+def imprimir_mediciones(top=TOP_RESUMEN):
+    ms = mediciones()
+    if not ms:
+        return
+    lentas = [m for m in ms if m.get("lenta")]
+    errores = [m for m in ms if "error" in m]
+    print(f"[CONSULTAS] {len(ms)} sentencias | {sum(m['ms'] for m in ms):,.1f} ms"
+          f" | {sum(m['filas'] for m in ms):,} filas | {sum(m['bytes'] for m in ms) / 1e6:.2f} MB"
+          f" | caché: {sum(m['origen'] == 'cache' for m in ms)} | errores: {len(errores)}"
+          f" | lentas (>= {UMBRAL_LENTA_MS:g} ms): {len(lentas)}"
+          + (f" -> {REGISTRO_LENTAS}" if lentas or errores else ""))
+    print(f"  {'ms':>10} {'filas':>8} {'KB':>9}  origen  consulta")
+    for m in sorted(ms, key=lambda m: -m["ms"])[:top]:
+        marca = "ERROR " if "error" in m else ("LENTA " if m.get("lenta") else "")
+        print(f"  {m['ms']:>10,.1f} {m['filas']:>8,} {m['bytes'] / 1024:>9,.1f}  {m['origen']:<6}  {marca}{m['etiqueta']}")
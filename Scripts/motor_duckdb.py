@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+motor_duckdb.py
+Copia columnar (DuckDB) de salud_federada.db para las consultas analíticas.
+
+Casi todo el SQL de análisis son agregados que recorren los hechos
+completos; en SQLite (por filas) eso lee cada fila entera. DuckDB guarda por
+columnas y agrega vectorizado. build_base_final.py --engine duckdb construye
+la base SQLite como siempre (carga, esquema estrella, cubos, build_info) y
+después la exporta aquí:
+- Cada tabla se recrea en DuckDB con tipos equivalentes (INTEGER -> BIGINT,
+  REAL -> DOUBLE, TEXT -> VARCHAR; columnas sin tipo declarado, como las de
+  los cubos, según el tipo de sus valores) y se copia por bloques de
+  FILAS_BLOQUE filas vía Arrow (memoria acotada)
+- Las vistas (fact_*, v_eventos, v_unificado...) se recrean con el mismo
+  SQL; la tabla FTS5 y sus tablas internas no se copian (las vistas que las
+  usan se omiten con aviso)
+- No se copian índices: DuckDB poda por zonemaps al recorrer columnas
+
+La base DuckDB es un derivado: se reescribe completa en cada exportación.
+Requiere duckdb y pyarrow (opcionales).
+
+Uso:
+    from motor_duckdb import exportar_a_duckdb
+    exportar_a_duckdb("salud_federada.db", "salud_federada.duckdb")
+"""
+
+import sqlite3, time
+from pathlib import Path
+
+from conexiones import requerir_duckdb
+
+FILAS_BLOQUE = 200_000
+
+# ------------------ Tipos ------------------
+def tipo_duckdb(declarado: str, muestra: str | None) -> str:
+    """Tipo DuckDB por afinidad SQLite del tipo declarado (o por typeof() de un valor)."""
+    d = (declarado or "").upper()
+    if "INT" in d:
+        return "BIGINT"
+    if any(t in d for t in ("CHAR", "CLOB", "TEXT")):
+        return "VARCHAR"
+    if any(t in d for t in ("REAL", "FLOA", "DOUB")):
+        return "DOUBLE"
+    if d == "BLOB":
+        return "BLOB"
+    return {"integer": "BIGINT", "real": "DOUBLE", "blob": "BLOB"}.get(muestra, "VARCHAR")
+
+def _tipos_arrow(tipos):
+    import pyarrow as pa
+    return [{"BIGINT": pa.int64(), "DOUBLE": pa.float64(), "BLOB": pa.binary()}.get(t, pa.string()) for t in tipos]
+
+# ------------------ Objetos a copiar ------------------
+def tablas_a_copiar(src) -> list[str]:
+    """Tablas normales de la base (sin internas de SQLite ni FTS5 y sus tablas sombra)."""
+    filas = src.execute("SELECT name, sql FROM sqlite_master WHERE type='table' ORDER BY rowid").fetchall()
+    virtuales = [n for n, s in filas if (s or "").upper().startswith("CREATE VIRTUAL TABLE")]
+    return [n for n, _ in filas
+            if not n.startswith("sqlite_") and n not in virtuales
+            and not any(n.startswith(v + "_") for v in virtuales)]
+
+def vistas(src) -> list[tuple[str, str]]:
+    return src.execute("SELECT name, sql FROM sqlite_master WHERE type='view' ORDER BY rowid").fetchall()
+
+# ------------------ Copia ------------------
+def copiar_tabla(src, dst, tabla) -> int:
+    import pyarrow as pa
+    info = src.execute(f"PRAGMA table_info({tabla})").fetchall()
+    cols = [r[1] for r in info]
+    tipos = []
+    for _, col, declarado, *_ in info:
+        muestra = src.execute(f"SELECT typeof({col}) FROM {tabla} WHERE {col} IS NOT NULL LIMIT 1").fetchone()
+        tipos.append(tipo_duckdb(declarado, muestra[0] if muestra else None))
+    dst.execute(f"DROP TABLE IF EXISTS {tabla}")
+    dst.execute(f"CREATE TABLE {tabla} (" + ", ".join(f"{c} {t}" for c, t in zip(cols, tipos)) + ")")
+
+    esquema = pa.schema(list(zip(cols, _tipos_arrow(tipos))))
+    cur = src.execute(f"SELECT {', '.join(cols)} FROM {tabla}")
+    total = 0
+    while True:
+        bloque = cur.fetchmany(FILAS_BLOQUE)
+        if not bloque:
+            break
+        columnas = list(zip(*bloque))
+        lote = pa.Table.from_arrays([pa.array(c, type=t) for c, t in zip(columnas, esquema.types)], schema=esquema)
+        dst.register("_lote", lote)
+        dst.execute(f"INSERT INTO {tabla} SELECT * FROM _lote")
+        dst.unregister("_lote")
+        total += len(bloque)
+    return total
+
+def crear_vistas(dst, lista) -> list[str]:
+    """Crea las vistas en orden; reintenta las que dependen de otra aún no creada."""
+    pendientes, omitidas = list(lista), []
+    while pendientes:
+        fallidas = []
+        for nombre, sql in pendientes:
+            try:
+                dst.execute(f"DROP VIEW IF EXISTS {nombre}")
+                dst.execute(sql)
+            except Exception as e:
+                fallidas.append((nombre, sql, e))
+        if len(fallidas) == len(pendientes):
+            for nombre, _, e in fallidas:
+                print(f"[WARN] Vista {nombre} omitida en DuckDB: {str(e).splitlines()[0]}")
+                omitidas.append(nombre)
+            break
+        pendientes = [(n, s) for n, s, _ in fallidas]
+    return omitidas
+
+def exportar_a_duckdb(ruta_sqlite, ruta_duckdb) -> Path:
+    """Reescribe `ruta_duckdb` con las tablas y vistas de la base SQLite."""
+    requerir_duckdb()
+    import duckdb
+    ruta_duckdb = Path(ruta_duckdb)
+    for p in (ruta_duckdb, ruta_duckdb.with_name(ruta_duckdb.name + ".wal")):
+        p.unlink(missing_ok=True)
+
+    t0 = time.perf_counter()
+    src = sqlite3.connect(str(ruta_sqlite))
+    dst = duckdb.connect(str(ruta_duckdb))
+    try:
+        for tabla in tablas_a_copiar(src):
+            n = copiar_tabla(src, dst, tabla)
+            print(f"[OK] duckdb {tabla}: {n:,} filas")
+        omitidas = crear_vistas(dst, vistas(src))
+        dst.execute("CHECKPOINT")
+    finally:
+        dst.close()
+        src.close()
+    print(f"[OK] Base DuckDB en: {ruta_duckdb.resolve()} ({time.perf_counter() - t0:.1f} s"
+          + (f", {len(omitidas)} vistas omitidas" if omitidas else "") + ")")
+    return ruta_duckdb
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+perfil_streaming.py
+Resúmenes (sketches) combinables para perfilar por bloques en una sola pasada.
+
+Cada bloque produce un resumen pequeño; dos resúmenes se combinan sin volver
+a leer los datos (el orden de combinación no cambia el resultado), así que
+los bloques pueden procesarse en paralelo y el archivo no necesita caber en
+memoria:
+- Conteo exacto de hashes de fila para duplicados: ver duplicados.py
+  (contar_hashes / combinar_conteos / filas_en_duplicados)
+- HyperLogLog (2^14 registros, ~0.8% de error): número de claves distintas
+  con memoria fija de 16 KiB
+"""
+
+import numpy as np
+
+HLL_P = 14                   # bits de índice → 2^14 registros
+HLL_M = 1 << HLL_P
+
+# ------------------ HyperLogLog ------------------
+def hll_nuevo() -> np.ndarray:
+    return np.zeros(HLL_M, dtype=np.uint8)
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Número de bits de cada uint64 (exacto: trabaja por mitades de 32 bits)."""
+    alto = (x >> np.uint64(32)).astype(np.float64)
+    bajo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        bl_alto = np.where(alto > 0, np.floor(np.log2(alto)) + 1, 0)
+        bl_bajo = np.where(bajo > 0, np.floor(np.log2(bajo)) + 1, 0)
+    return np.where(alto > 0, 32 + bl_alto, bl_bajo).astype(np.int64)
+
+def hll_agregar(reg: np.ndarray, h: np.ndarray) -> np.ndarray:
+    if len(h) == 0:
+        return reg
+    idx = (h >> np.uint64(64 - HLL_P)).astype(np.int64)
+    resto = h & np.uint64((1 << (64 - HLL_P)) - 1)
+    rho = ((64 - HLL_P) - _bit_length(resto) + 1).astype(np.uint8)
+    np.maximum.at(reg, idx, rho)
+    return reg
+
+def hll_combinar(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.maximum(a, b)
+
+def hll_estimar(reg: np.ndarray) -> int:
+    alpha = 0.7213 / (1 + 1.079 / HLL_M)
+    est = alpha * HLL_M * HLL_M / np.sum(np.power(2.0, -reg.astype(np.float64)))
+    ceros = int(np.count_nonzero(reg == 0))
+    if est <= 2.5 * HLL_M and ceros:
+        est = HLL_M * np.log(HLL_M / ceros)   # corrección de rango pequeño
+    return int(round(est))
@@ -4,10 +4,20 @@
 Perfilado sobre CSV de hechos (defunciones / urgencias) ANTES de cargar a la BD.
 Lee: Data/defunciones_uso_sustancias_clean.csv, Data/urgencias_uso_sustancias_clean.csv
 Genera métricas en docs/Entrega4_perfilado_csv/sql/
+
+Todas las métricas salen de UNA pasada por tabla (perfil_streaming.py).
+Con --chunksize N el archivo se lee por bloques y los resúmenes de cada
+bloque se combinan (opcional --jobs para procesarlos en paralelo).
 """
 
-import os, re, datetime, unicodedata
+import os, re, datetime, unicodedata, argparse
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from lector_csv import leer_csv
+from ancho_largo import ancho_a_largo, como_categoria
+from duplicados import hash_filas, contar_hashes, combinar_conteos, filas_en_duplicados
+from perfil_streaming import hll_nuevo, hll_agregar, hll_combinar, hll_estimar
 
 IN_DEF = "Data/defunciones_uso_sustancias.csv"
 IN_URG = "Data/urgencias_uso_sustancias.csv"
@@ -16,6 +26,9 @@ OUTDIR = "docs/perfilado/csv"
 F_WIDE_PATTERN = re.compile(r"^f1[0-9]$")    # f10..f19 (normalizados)
 CIE_PATTERN    = re.compile(r"^f1[0-9](\..+)?$", re.IGNORECASE)  # p.ej. F14 o F14.2
 
+LONG_COLS = ["anio","entidad_norm","sexo","cie10_code","valor"]
+KEY = ["anio","entidad_norm","sexo","cie10_code"]
+
 # ---------------- utilidades ----------------
 def ensure_outdir():
     os.makedirs(OUTDIR, exist_ok=True)
@@ -30,14 +43,7 @@ def norm_header(h: str) -> str:
     return s
 
 def read_csv_smart(path: str) -> pd.DataFrame:
-    for enc in ("utf-8", "latin-1"):
-        try:
-            df = pd.read_csv(path, sep=None, engine="python", encoding=enc)
-            break
-        except Exception:
-            continue
-    else:
-        df = pd.read_csv(path, encoding="latin-1")
+    df = leer_csv(path)
     df.columns = [norm_header(c) for c in df.columns]
     return df
 
@@ -82,12 +88,11 @@ def is_wide(df: pd.DataFrame) -> bool:
 def melt_to_long(df: pd.DataFrame) -> pd.DataFrame:
     id_cols = [c for c in df.columns if not F_WIDE_PATTERN.match(c)]
     fcols   = [c for c in df.columns if F_WIDE_PATTERN.match(c)]
-    long_df = df.melt(id_vars=id_cols, value_vars=fcols, var_name="cie10_code", value_name="valor")
-    long_df["cie10_code"] = long_df["cie10_code"].str.upper()
-    if "valor" in long_df.columns:
-        long_df["valor"] = pd.to_numeric(long_df["valor"], errors="coerce")
-        long_df = long_df[long_df["valor"].notna()]
-    return long_df
+    # motor vectorizado (dimensiones/cie10_code como category); valores no
+    # numéricos se descartan en lugar de rellenarse
+    long_df = ancho_a_largo(df, id_cols, fcols, var_name="cie10_code", value_name="valor",
+                            codigos=[c.upper() for c in fcols], fill_value=None)
+    return long_df[long_df["valor"].notna()]
 
 def ensure_long_schema(df: pd.DataFrame, is_def: bool) -> pd.DataFrame:
     df = map_synonyms(df, is_def=is_def)
@@ -114,68 +119,165 @@ def ensure_long_schema(df: pd.DataFrame, is_def: bool) -> pd.DataFrame:
             df[col] = pd.NA
 
     df["anio"] = pd.to_numeric(df["anio"], errors="coerce")
-    df["entidad_norm"] = df["entidad_norm"].astype(str).str.strip()
-    df["sexo"] = df["sexo"].astype(str).str.strip()
-    df["cie10_code"] = df["cie10_code"].astype(str).str.upper().str.strip()
+    df["entidad_norm"] = como_categoria(df["entidad_norm"], lambda s: s.astype(str).str.strip())
+    df["sexo"] = como_categoria(df["sexo"], lambda s: s.astype(str).str.strip())
+    df["cie10_code"] = como_categoria(df["cie10_code"], lambda s: s.astype(str).str.upper().str.strip())
+
+    return df[LONG_COLS]
+
+# ---------------- métricas por bloque (una pasada, combinables) ----------------
+def conteo_sexo(ser: pd.Series) -> dict:
+    """Conteo por sexo normalizado (NULL/strip/upper aplicados a los valores distintos)."""
+    ser = como_categoria(ser, lambda s: s.fillna("NULL").astype(str).str.strip().str.upper())
+    vc = ser.value_counts(dropna=False)
+    return {str(k): int(v) for k, v in vc.items() if v}
+
+def metricas_tabla(df: pd.DataFrame) -> dict:
+    """
+    Todas las métricas del perfilado para un bloque en formato largo.
+    Son combinables con combinar_metricas (conteos, min/max, hashes, HLL).
+    """
+    anio = pd.to_numeric(df["anio"], errors="coerce")
+    h = hash_filas(df, KEY)
+    return {
+        "filas": len(df),
+        "nulos": {c: int(df[c].isna().sum()) for c in KEY},
+        "anio_min": anio.min(),
+        "anio_max": anio.max(),
+        "anio_float": anio.dtype.kind == "f",
+        # cie10_code ya viene normalizado (category): el match se evalúa por categoría
+        "fuera": int((~df["cie10_code"].str.match(CIE_PATTERN, na=False)).sum()),
+        "claves": contar_hashes(h),
+        "hll": hll_agregar(hll_nuevo(), h),
+        "sexo": conteo_sexo(df["sexo"]),
+    }
 
-    return df[["anio","entidad_norm","sexo","cie10_code","valor"]]
+def _min_max(a, b, fn):
+    if pd.isna(a):
+        return b
+    if pd.isna(b):
+        return a
+    return fn(a, b)
+
+def combinar_metricas(a: dict | None, b: dict) -> dict:
+    if a is None:
+        return b
+    sexo = dict(a["sexo"])
+    for k, v in b["sexo"].items():
+        sexo[k] = sexo.get(k, 0) + v
+    return {
+        "filas": a["filas"] + b["filas"],
+        "nulos": {c: a["nulos"][c] + b["nulos"][c] for c in KEY},
+        "anio_min": _min_max(a["anio_min"], b["anio_min"], min),
+        "anio_max": _min_max(a["anio_max"], b["anio_max"], max),
+        "anio_float": a["anio_float"] or b["anio_float"],
+        "fuera": a["fuera"] + b["fuera"],
+        "claves": combinar_conteos(a["claves"], b["claves"]),
+        "hll": hll_combinar(a["hll"], b["hll"]),
+        "sexo": sexo,
+    }
 
-def perfilado(def_df: pd.DataFrame, urg_df: pd.DataFrame):
+def metricas_bloque(chunk: pd.DataFrame, is_def: bool) -> dict:
+    """Trabajo de un proceso: normaliza un bloque crudo y calcula sus métricas."""
+    chunk.columns = [norm_header(c) for c in chunk.columns]
+    return metricas_tabla(ensure_long_schema(chunk, is_def=is_def))
+
+def metricas_streaming(path: str, is_def: bool, chunksize: int, jobs: int = 1) -> dict:
+    """
+    Una sola pasada por bloques de `chunksize` filas. Con jobs > 1 los bloques
+    se procesan en un pool de procesos con a lo más 2×jobs bloques en vuelo
+    (memoria acotada aunque el archivo no quepa en RAM).
+    """
+    reader = leer_csv(path, chunksize=chunksize)
+    total = None
+    if jobs <= 1:
+        for chunk in reader:
+            total = combinar_metricas(total, metricas_bloque(chunk, is_def))
+        return total
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pendientes = set()
+        for chunk in reader:
+            pendientes.add(pool.submit(metricas_bloque, chunk, is_def))
+            if len(pendientes) >= 2 * jobs:
+                listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for f in listos:
+                    total = combinar_metricas(total, f.result())
+        for f in pendientes:
+            total = combinar_metricas(total, f.result())
+    return total
+
+def _valor_anio(m: dict, k: str):
+    v = m[k]
+    return float(v) if m["anio_float"] and not pd.isna(v) else v
+
+# ---------------- salidas ----------------
+def perfilado(def_m: dict, urg_m: dict):
     paths = []
 
     cnt = pd.DataFrame({
         "tabla":["defunciones","urgencias"],
-        "filas":[len(def_df), len(urg_df)]
+        "filas":[def_m["filas"], urg_m["filas"]]
     })
     p = os.path.join(OUTDIR, "01_conteos.csv"); cnt.to_csv(p, index=False); paths.append(p)
 
-    def_nulos = def_df[["anio","entidad_norm","sexo","cie10_code"]].isna().sum().rename("defunciones")
-    urg_nulos = urg_df[["anio","entidad_norm","sexo","cie10_code"]].isna().sum().rename("urgencias")
+    def_nulos = pd.Series(def_m["nulos"], name="defunciones")
+    urg_nulos = pd.Series(urg_m["nulos"], name="urgencias")
     nulos = pd.concat([def_nulos, urg_nulos], axis=1).reset_index(names="campo")
     p = os.path.join(OUTDIR, "02_nulos.csv"); nulos.to_csv(p, index=False); paths.append(p)
 
     rng = pd.DataFrame([
-        {"tabla":"defunciones","min_anio":pd.to_numeric(def_df["anio"], errors="coerce").min(),
-         "max_anio":pd.to_numeric(def_df["anio"], errors="coerce").max()},
-        {"tabla":"urgencias","min_anio":pd.to_numeric(urg_df["anio"], errors="coerce").min(),
-         "max_anio":pd.to_numeric(urg_df["anio"], errors="coerce").max()}
+        {"tabla":"defunciones","min_anio":_valor_anio(def_m, "anio_min"),
+         "max_anio":_valor_anio(def_m, "anio_max")},
+        {"tabla":"urgencias","min_anio":_valor_anio(urg_m, "anio_min"),
+         "max_anio":_valor_anio(urg_m, "anio_max")}
     ])
     p = os.path.join(OUTDIR, "03_rango_anios.csv"); rng.to_csv(p, index=False); paths.append(p)
 
-    def_bad = ~(def_df["cie10_code"].astype(str).str.upper().str.strip().str.match(CIE_PATTERN))
-    urg_bad = ~(urg_df["cie10_code"].astype(str).str.upper().str.strip().str.match(CIE_PATTERN))
     fuera = pd.DataFrame({
         "tabla":["defunciones","urgencias"],
-        "fuera_de_rango":[int(def_bad.sum()), int(urg_bad.sum())]
+        "fuera_de_rango":[def_m["fuera"], urg_m["fuera"]]
     })
     p = os.path.join(OUTDIR, "04_fuera_rango.csv"); fuera.to_csv(p, index=False); paths.append(p)
 
-    key = ["anio","entidad_norm","sexo","cie10_code"]
-    def_dups = def_df[key].astype(str).duplicated(keep=False).sum()
-    urg_dups = urg_df[key].astype(str).duplicated(keep=False).sum()
     dups = pd.DataFrame({
         "tabla":["defunciones","urgencias"],
-        "filas_en_grupos_duplicados":[int(def_dups), int(urg_dups)]
+        "filas_en_grupos_duplicados":[filas_en_duplicados(def_m["claves"]), filas_en_duplicados(urg_m["claves"])]
     })
     p = os.path.join(OUTDIR, "05_duplicados.csv"); dups.to_csv(p, index=False); paths.append(p)
 
-    def_sexo = def_df["sexo"].fillna("NULL").astype(str).str.strip().str.upper().value_counts(dropna=False).rename_axis("sexo").reset_index(name="defunciones")
-    urg_sexo = urg_df["sexo"].fillna("NULL").astype(str).str.strip().str.upper().value_counts(dropna=False).rename_axis("sexo").reset_index(name="urgencias")
+    def_sexo = pd.Series(def_m["sexo"], dtype="int64").rename_axis("sexo").reset_index(name="defunciones")
+    urg_sexo = pd.Series(urg_m["sexo"], dtype="int64").rename_axis("sexo").reset_index(name="urgencias")
     sexo = pd.merge(def_sexo, urg_sexo, on="sexo", how="outer").fillna(0)
     p = os.path.join(OUTDIR, "06_distribucion_sexo.csv"); sexo.to_csv(p, index=False); paths.append(p)
 
+    claves = pd.DataFrame({
+        "tabla":["defunciones","urgencias"],
+        "claves_distintas_aprox":[hll_estimar(def_m["hll"]), hll_estimar(urg_m["hll"])]
+    })
+    p = os.path.join(OUTDIR, "07_claves_distintas.csv"); claves.to_csv(p, index=False); paths.append(p)
+
     return paths
 
 def main_csv():
-    ensure_outdir()
+    ap = argparse.ArgumentParser(description="Perfilado de CSV de hechos (defunciones/urgencias).")
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="Perfilar en streaming por bloques de N filas (archivos más grandes que la RAM)")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Con --chunksize: procesos para los bloques; 0 = todos los núcleos")
+    args = ap.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
-    raw_def = read_csv_smart(IN_DEF)
-    def_df = ensure_long_schema(raw_def, is_def=True)
+    ensure_outdir()
 
-    raw_urg = read_csv_smart(IN_URG)
-    urg_df = ensure_long_schema(raw_urg, is_def=False)
+    if args.chunksize:
+        def_m = metricas_streaming(IN_DEF, True, args.chunksize, jobs)
+        urg_m = metricas_streaming(IN_URG, False, args.chunksize, jobs)
+    else:
+        def_m = metricas_tabla(ensure_long_schema(read_csv_smart(IN_DEF), is_def=True))
+        urg_m = metricas_tabla(ensure_long_schema(read_csv_smart(IN_URG), is_def=False))
 
-    paths = perfilado(def_df, urg_df)
+    paths = perfilado(def_m, urg_m)
 
     md = os.path.join(OUTDIR, "perfilado_csv_sql_resumen.md")
     with open(md, "w", encoding="utf-8") as f:
@@ -186,8 +288,7 @@ def main_csv():
         f.write("\n")
 
     print(f"[OK] CSV perfilado (SQL) → {OUTDIR}")
-    print("[INFO] Columnas procesadas (DEF):", list(def_df.columns))
-    print("[INFO] Columnas procesadas (URG):", list(urg_df.columns))
+    print("[INFO] Columnas procesadas:", LONG_COLS)
 
 if __name__ == "__main__":
     main_csv()
@@ -7,6 +7,8 @@ Lee: Data/cie10_f10_f19_nodes.csv y Data/cie10_f10_f19_edges_enriched.csv
 
 import re, unicodedata, pandas as pd, os, datetime
 
+from lector_csv import leer_csv
+
 IN_NODES = "Data/cie10_f10_f19_nodes.csv"
 IN_EDGES = "Data/cie10_f10_f19_edges_enriched.csv"
 OUTDIR_GRAFO = "docs/perfilado/grafo"
@@ -24,14 +26,7 @@ def norm_header(h: str) -> str:
     return s
 
 def read_csv_smart(path: str) -> pd.DataFrame:
-    for enc in ("utf-8", "latin-1"):
-        try:
-            df = pd.read_csv(path, sep=None, engine="python", encoding=enc)
-            break
-        except Exception:
-            continue
-    else:
-        df = pd.read_csv(path, encoding="latin-1")
+    df = leer_csv(path)
     df.columns = [norm_header(c) for c in df.columns]
     return df
 
@@ -2,7 +2,10 @@
 # Perfilado de datos para salud_federada.db
 # Crea CSVs y un resumen Markdown con métricas de calidad (completitud, consistencia, duplicados, etc.)
 
-import os, csv, sqlite3, datetime
+import os, csv, datetime
+
+from cache_sql import consultar_filas, imprimir_estadisticas
+from conexiones import tomar_conexion, devolver_conexion, imprimir_conexiones
 DB = "salud_federada.db"
 OUTDIR = "docs/Entrega4_perfilado"
 
@@ -10,11 +13,8 @@ def ensure_outdir():
     os.makedirs(OUTDIR, exist_ok=True)
 
 def q(conn, sql, params=()):
-    cur = conn.cursor()
-    cur.execute(sql, params)
-    cols = [c[0] for c in cur.description] if cur.description else []
-    rows = cur.fetchall()
-    return cols, rows
+    # (cols, rows) desde la caché en disco si la base no cambió (cache_sql.py)
+    return consultar_filas(conn, sql, params)
 
 def save_csv(name, cols, rows):
     path = os.path.join(OUTDIR, name)
@@ -29,7 +29,7 @@ def md_heading(f, text, level=2):
 
 def main():
     ensure_outdir()
-    conn = sqlite3.connect(DB)
+    conn = tomar_conexion(DB)   # solo lectura (conexiones.py)
 
     generated = []  # (title, path)
 
@@ -188,7 +188,7 @@ def main():
     cols, rows = q(conn, "SELECT origen, COUNT(*) AS filas FROM v_unificado GROUP BY origen ORDER BY filas DESC;")
     path = save_csv("14_filas_por_origen.csv", cols, rows); generated.append(("Filas por origen (v_unificado)", path))
 
-    conn.close()
+    devolver_conexion(conn)
 
     # ---- Markdown de resumen ----
     md_path = os.path.join(OUTDIR, "perfilado_resumen.md")
@@ -225,6 +225,8 @@ def main():
 - Los duplicados listados son **candidatos** para limpieza (de-duplicación); si alguno es legítimo por diseño, debe documentarse la regla.
 - Para “forzar patrones”, normalizar `cie10_code` a mayúsculas, `sexo` a {Masculino,Femenino,No Especificado} y `entidad_norm` según catálogo.\n""")
 
+    imprimir_estadisticas()
+    imprimir_conexiones()
     print(f"[OK] Perfilado generado en: {OUTDIR}")
     print(f"  - Resumen: {md_path}")
     for title, path in generated:
@@ -7,6 +7,9 @@ Lee: Textos/cowese_matches.csv
 
 import re, unicodedata, pandas as pd, os, datetime
 
+from lector_csv import leer_csv
+from duplicados import resumen_duplicados, formatear_muestras
+
 def strip_accents(s: str) -> str:
     return "".join(c for c in unicodedata.normalize("NFKD", str(s)) if not unicodedata.combining(c))
 
@@ -17,14 +20,7 @@ def norm_header(h: str) -> str:
     return s
 
 def read_csv_smart(path: str) -> pd.DataFrame:
-    for enc in ("utf-8", "latin-1"):
-        try:
-            df = pd.read_csv(path, sep=None, engine="python", encoding=enc)
-            break
-        except Exception:
-            continue
-    else:
-        df = pd.read_csv(path, encoding="latin-1")
+    df = leer_csv(path)
     df.columns = [norm_header(c) for c in df.columns]
     return df
 
@@ -72,8 +68,8 @@ def main_texto():
     })
     df_conteos.to_csv(os.path.join(OUTDIR_TEXTO, "01_conteos_frases.csv"), index=False, encoding="utf-8")
 
-    dup = t.duplicated(subset=["sentence","cie10_code"], keep=False)
-    df_dups = pd.DataFrame({"filas_en_grupos_duplicados":[int(dup.sum())]})
+    dups = resumen_duplicados(t, ["sentence","cie10_code"])
+    df_dups = pd.DataFrame({"filas_en_grupos_duplicados":[dups["filas_en_grupos_duplicados"]]})
     df_dups.to_csv(os.path.join(OUTDIR_TEXTO, "02_duplicados.csv"), index=False, encoding="utf-8")
 
     fuera = ~(t["cie10_code"].fillna("").str.match(CIE_PATTERN))
@@ -91,6 +87,9 @@ def main_texto():
         f.write(f"- Columnas detectadas: {list(t.columns)}\n")
         f.write(f"- ¿Tenía 'sentence' original?: {has_sentence}\n")
         f.write(f"- ¿Tenía 'cie10_code' original?: {has_cie}\n")
+        if dups["grupos"]:
+            f.write("\n## Ejemplos de frases duplicadas (sentence, cie10_code)\n")
+            f.write(formatear_muestras(dups["muestras"]) + "\n")
 
     print("[OK] CSV perfilado (Texto) →", OUTDIR_TEXTO)
     print("[INFO] TEXTO cols:", list(t.columns))
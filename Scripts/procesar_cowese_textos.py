@@ -5,10 +5,23 @@ Procesamiento de textos (CoWeSe) para la BD heterogénea federada
 - Lee CoWeSe.txt (o cualquier texto grande en español)
 - Divide en oraciones (split básico)
 - Detecta menciones relacionadas con consumo de sustancias (F10..F19) via diccionario de palabras clave
-- Exporta matches a CSV (cowese_matches.csv)
-- Construye un índice TF-IDF de oraciones (cowese_tfidf.pkl, cowese_vectorizer.pkl) para búsquedas rápidas
+  (compilado en un trie, una pasada por oración; cada clave debe empezar una palabra y las siglas
+  cortas de CLAVES_PALABRA_COMPLETA deben además terminarla)
+- Exporta oraciones y matches a CSV (cowese_sentences.csv, cowese_matches.csv) en streaming,
+  por lotes de LOTE_FILAS filas: la memoria no crece con el corpus
+- Construye un índice TF-IDF de oraciones (directorio cowese_tfidf/) para búsquedas rápidas
+  fuera de memoria: df por bloques en disco con vocabulario podado (min_df/max_df) y matriz
+  normalizada escrita en bloques de filas
+- El índice son arreglos .npy (CSR por término, vocabulario ordenado en UTF-8 con sus
+  posiciones, idf, posición de cada oración en el CSV) con un encabezado versionado; --query los abre con mmap, sin pickles ni
+  sklearn, y rechaza índices de otra versión o que ya no corresponden a las oraciones
+- Con --jobs N el corpus se parte en fragmentos por rangos de bytes que
+  empiezan en un límite de oración; cada fragmento se segmenta y se buscan sus
+  menciones en un proceso propio, que escribe sus propios archivos. Al
+  unirlos, sent_id se renumera en orden global (mismos CSV que con un proceso)
 Uso:
     python procesar_cowese_textos.py --cowese /ruta/CoWeSe.txt --outdir ./Textos
+    python procesar_cowese_textos.py --cowese /ruta/CoWeSe.txt --outdir ./Textos --jobs 0   # todos los núcleos
     # Consulta posterior del índice:
     python procesar_cowese_textos.py --query "intoxicación por alcohol en jóvenes"
 Requisitos:
@@ -16,11 +29,15 @@ Requisitos:
 """
 import argparse
 import csv
+import itertools
+import json
+import os
 import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Tuple, Iterable, Optional
 import pandas as pd
-import pickle
 
 # ============ Palabras clave -> CIE-10 ============
 KEYS_TO_CIE10 = {
@@ -73,6 +90,11 @@ KEYS_TO_CIE10 = {
     "multiples sustancias": "F19",
 }
 
+# Siglas cortas que solo cuentan como palabra completa ("thc" no en "kthcx"). Las
+# demás claves cuentan al inicio de una palabra, con sus flexiones: "alcohol" en
+# "alcoholismo", "cigarrillo" en "cigarrillos", "alcohólico" en "alcohólicos".
+CLAVES_PALABRA_COMPLETA = {"thc", "lsd", "mdma", "crack"}
+
 # ============ Utilidades de texto ============
 SENT_SPLIT_RE = re.compile(r'(?<=[\.\!\?;:])\s+(?=[A-ZÁÉÍÓÚÑ])')
 
@@ -95,7 +117,98 @@ def iter_sentences(stream: Iterable[str]) -> Iterable[str]:
     if buf.strip():
         yield buf.strip()
 
+# ============ Léxico compilado (trie) ============
+# En lugar de un `in` por clave (~50 recorridos de la oración, y "thc" o "lsd"
+# cuentan dentro de otra palabra) las claves se compilan en UNA expresión
+# regular con forma de trie (alcoh(?:ol(?:ico)?|ólico)|...): el motor de `re`
+# la recorre en C en una sola pasada por la oración y en cada posición solo
+# sigue las ramas que coinciden. Una clave cuenta al inicio de una palabra
+# ((?<!\w) antes); las de CLAVES_PALABRA_COMPLETA llevan además (?!\w) después.
+def _trie_regex(claves: List[str], completas=frozenset()) -> str:
+    trie = {}
+    for k in claves:
+        nodo = trie
+        for ch in k:
+            nodo = nodo.setdefault(ch, {})
+        nodo[""] = k in completas   # fin de clave (True: debe terminar la palabra)
+
+    def a_regex(nodo) -> str:
+        ramas = [re.escape(ch) + a_regex(hijo) for ch, hijo in sorted(nodo.items()) if ch]
+        if "" in nodo and nodo[""]:
+            ramas.append(r"(?!\w)")
+        if not ramas:
+            return ""
+        cuerpo = ramas[0] if len(ramas) == 1 else "(?:" + "|".join(ramas) + ")"
+        if "" in nodo and not nodo[""]:   # la clave termina aquí y también sigue (alcohol / alcoholico)
+            return "(?:" + cuerpo + ")?" if len(ramas) == 1 else cuerpo + "?"
+        return cuerpo
+    return a_regex(trie)
+
+def _palabra(k: str, completas=frozenset()) -> re.Pattern:
+    return re.compile(r"(?<!\w)" + re.escape(k) + (r"(?!\w)" if k in completas else ""))
+
+def _se_traslapan(claves: List[str]) -> bool:
+    """True si una clave, desde una de sus palabras, es el inicio de otra más larga ("a alc" / "alcohol")."""
+    return any(b != a and len(b) > len(a) - i and b.startswith(a[i:])
+               for a in claves for i in (m.start() for m in re.finditer(r"(?<= )\w", a))
+               for b in claves)
+
+def compilar_lexico(keys_to_cie10: Dict[str,str]) -> Dict:
+    """
+    Patrón único del léxico. Cada coincidencia captura una clave; las claves
+    contenidas en ella (al inicio de una de sus palabras) también están en la oración y se
+    agregan desde `contenidas`. Si dos claves pueden traslaparse sin que una
+    contenga a la otra, el patrón prueba cada posición con un lookahead
+    (?=(...)), un poco más lento.
+    """
+    claves = list(keys_to_cie10)
+    completas = frozenset(CLAVES_PALABRA_COMPLETA)
+    trie = _trie_regex(claves, completas)
+    if _se_traslapan(claves):
+        patron = re.compile(r"(?<!\w)(?=(" + trie + r"))")
+    else:
+        patron = re.compile(r"(?<!\w)(" + trie + r")")
+    orden = {k: i for i, k in enumerate(claves)}
+    contenidas = {k: [orden[j] for j in claves if _palabra(j, completas).search(k)] for k in claves}
+    lex = {"patron": patron, "claves": claves, "codigos": list(keys_to_cie10.values()),
+           "contenidas": contenidas}
+    lex["sola"] = {k: _por_codigo(lex, contenidas[k]) for k in claves}   # oración con una sola clave (lo común)
+    return lex
+
+def _por_codigo(lex: Dict, indices) -> List[Tuple[str,str]]:
+    """(clave, código) por orden de clave, la primera de cada código."""
+    result, seen = [], set()
+    for i in sorted(indices):
+        code = lex["codigos"][i]
+        if code not in seen:
+            result.append((lex["claves"][i], code))
+            seen.add(code)
+    return result
+
+_LEXICOS = {}   # id del diccionario -> (diccionario, léxico)
+
+def _lexico(keys_to_cie10: Dict[str,str]) -> Dict:
+    guardado = _LEXICOS.get(id(keys_to_cie10))
+    if guardado is None or guardado[0] is not keys_to_cie10:
+        guardado = (keys_to_cie10, compilar_lexico(keys_to_cie10))
+        _LEXICOS[id(keys_to_cie10)] = guardado
+    return guardado[1]
+
 def find_mentions(sentence: str, keys_to_cie10: Dict[str,str]) -> List[Tuple[str,str]]:
+    """
+    (clave, código) presentes en la oración: una por código, la primera clave
+    en el orden de keys_to_cie10 (mismo criterio que find_mentions_lineal).
+    """
+    lex = _lexico(keys_to_cie10)
+    encontradas = lex["patron"].findall(sentence.lower())
+    if not encontradas:
+        return []
+    if len(encontradas) == 1:
+        return list(lex["sola"][encontradas[0]])
+    return _por_codigo(lex, {i for k in encontradas for i in lex["contenidas"][k]})
+
+def find_mentions_lineal(sentence: str, keys_to_cie10: Dict[str,str]) -> List[Tuple[str,str]]:
+    """Versión anterior (un `in` por clave, subcadenas); referencia para benchmark_menciones.py."""
     low = sentence.lower()
     hits = []
     for k, code in keys_to_cie10.items():
@@ -109,77 +222,497 @@ def find_mentions(sentence: str, keys_to_cie10: Dict[str,str]) -> List[Tuple[str
             seen.add(code)
     return result
 
+# ============ Escritura en streaming ============
+LOTE_FILAS = 10_000   # filas que se juntan antes de cada escritura
+
+def escribir_en_lotes(oraciones: Iterable[str], ws, wm, fila_oracion, fila_mencion) -> Tuple[int, int]:
+    """
+    Recorre las oraciones una vez: busca sus menciones y escribe oraciones y
+    menciones por lotes de LOTE_FILAS filas. Devuelve (oraciones, menciones).
+    """
+    lote_s, lote_m = [], []
+    n_sent = n_match = 0
+    for sent_id, sentence in enumerate(oraciones):
+        lote_s.append(fila_oracion(sent_id, sentence))
+        for k, code in find_mentions(sentence, KEYS_TO_CIE10):
+            lote_m.append(fila_mencion(sent_id, sentence, k, code))
+        if len(lote_s) >= LOTE_FILAS:
+            ws.writerows(lote_s)
+            n_sent += len(lote_s)
+            lote_s.clear()
+        if len(lote_m) >= LOTE_FILAS:
+            wm.writerows(lote_m)
+            n_match += len(lote_m)
+            lote_m.clear()
+    ws.writerows(lote_s)
+    wm.writerows(lote_m)
+    return n_sent + len(lote_s), n_match + len(lote_m)
+
+def leer_oraciones(outdir: Path) -> Iterable[str]:
+    """Columna sentence de cowese_sentences.csv, en streaming."""
+    with open(outdir / "cowese_sentences.csv", newline="", encoding="utf-8") as f:
+        lector = csv.reader(f)
+        next(lector)
+        for _, _, sentence in lector:
+            yield sentence
+
+# ============ Fragmentos (modo paralelo) ============
+FRAGMENTOS_POR_PROCESO = 4   # más fragmentos que procesos: reparto más parejo
+INICIO_ORACION = re.compile(r"[A-ZÁÉÍÓÚÑ]")
+FIN_ORACION = (".", "!", "?", ";", ":")
+
+def _lineas_texto(linea_bytes: bytes) -> List[str]:
+    """Una línea binaria -> líneas como las da open(..., "r", errors="ignore") (\r, \r\n y \n)."""
+    texto = linea_bytes.decode("utf-8", errors="ignore")
+    return texto.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+
+def lineas_rango(ruta: Path, inicio: int, fin: int) -> Iterable[str]:
+    """Líneas de texto del rango de bytes [inicio, fin) (empieza y termina en inicio de línea)."""
+    with ruta.open("rb") as f:
+        f.seek(inicio)
+        while f.tell() < fin:
+            linea = f.readline()
+            if not linea:
+                break
+            yield from (l for l in _lineas_texto(linea) if l)
+
+def _siguiente_limite(f, desde: int, tamano: int) -> int:
+    """
+    Primer inicio de línea después de `desde` donde iter_sentences corta
+    oración sí o sí: la línea no vacía anterior termina en . ! ? ; : y esta
+    empieza con mayúscula (el espacio con que se unen es el de SENT_SPLIT_RE).
+    """
+    f.seek(desde)
+    f.readline()   # resto de la línea a medias
+    anterior = None
+    while True:
+        pos = f.tell()
+        linea = f.readline()
+        if not linea:
+            return tamano
+        partes = [l.strip() for l in _lineas_texto(linea)]
+        primera = next((l for l in partes if l), None)
+        if primera is None:
+            continue
+        if anterior is not None and anterior.endswith(FIN_ORACION) and INICIO_ORACION.match(primera):
+            return pos
+        anterior = next(l for l in reversed(partes) if l)
+
+def rangos_fragmentos(ruta: Path, n: int) -> List[Tuple[int,int]]:
+    """Hasta n rangos de bytes [inicio, fin) que empiezan en límite de oración."""
+    tamano = ruta.stat().st_size
+    limites = [0]
+    with ruta.open("rb") as f:
+        for i in range(1, n):
+            objetivo = tamano * i // n
+            if objetivo <= limites[-1]:
+                continue
+            lim = _siguiente_limite(f, objetivo, tamano)
+            if limites[-1] < lim < tamano:
+                limites.append(lim)
+    limites.append(tamano)
+    return list(zip(limites[:-1], limites[1:]))
+
+def procesar_fragmento(args) -> Tuple[int, int]:
+    """
+    Segmenta un rango y busca menciones. Escribe oraciones_NNNN.csv (sentence)
+    y menciones_NNNN.csv (id local, sentence, keyword, cie10); devuelve
+    (oraciones, menciones).
+    """
+    ruta, inicio, fin, num, dir_frag = args
+    with open(dir_frag / f"oraciones_{num:04d}.csv", "w", newline="", encoding="utf-8") as fs, \
+         open(dir_frag / f"menciones_{num:04d}.csv", "w", newline="", encoding="utf-8") as fm:
+        return escribir_en_lotes(
+            iter_sentences(lineas_rango(ruta, inicio, fin)), csv.writer(fs), csv.writer(fm),
+            fila_oracion=lambda i, s: (s,),
+            fila_mencion=lambda i, s, k, code: (i, s, k, code))
+
+def unir_fragmentos(dir_frag: Path, conteos: List[Tuple[int,int]], outdir: Path) -> Tuple[int, int]:
+    """Concatena los fragmentos en cowese_sentences.csv / cowese_matches.csv con sent_id global."""
+    total_sent = total_match = 0
+    with open(outdir / "cowese_sentences.csv", "w", newline="", encoding="utf-8") as fs, \
+         open(outdir / "cowese_matches.csv", "w", newline="", encoding="utf-8") as fm:
+        ws, wm = csv.writer(fs, lineterminator="\n"), csv.writer(fm, lineterminator="\n")
+        ws.writerow(["doc_id", "sent_id", "sentence"])
+        wm.writerow(["doc_id", "sent_id", "sentence", "keyword", "cie10"])
+        for num, (n_sent, n_match) in enumerate(conteos):
+            with open(dir_frag / f"oraciones_{num:04d}.csv", newline="", encoding="utf-8") as f:
+                for i, (sentence,) in enumerate(csv.reader(f)):
+                    ws.writerow([0, total_sent + i, sentence])
+            with open(dir_frag / f"menciones_{num:04d}.csv", newline="", encoding="utf-8") as f:
+                for local, sentence, k, code in csv.reader(f):
+                    wm.writerow([0, total_sent + int(local), sentence, k, code])
+            total_sent += n_sent
+            total_match += n_match
+    return total_sent, total_match
+
+def process_cowese_paralelo(cowese_path: Path, outdir: Path, jobs: int):
+    outdir.mkdir(parents=True, exist_ok=True)
+    rangos = rangos_fragmentos(cowese_path, jobs * FRAGMENTOS_POR_PROCESO)
+    dir_frag = outdir / "_fragmentos"
+    shutil.rmtree(dir_frag, ignore_errors=True)
+    dir_frag.mkdir()
+    print(f"[INFO] {len(rangos)} fragmentos en {jobs} procesos")
+    try:
+        tareas = [(cowese_path, ini, fin, num, dir_frag) for num, (ini, fin) in enumerate(rangos)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            conteos = list(pool.map(procesar_fragmento, tareas))
+        n_sent, n_match = unir_fragmentos(dir_frag, conteos, outdir)
+    finally:
+        shutil.rmtree(dir_frag, ignore_errors=True)
+    print(f"[OK] Se extrajeron {n_sent} oraciones")
+    print(f"[OK] Matches guardados: {n_match} filas en {outdir/'cowese_matches.csv'}")
+
+    build_tfidf_index(outdir)
+
 # ============ TF-IDF Index ============
-def build_tfidf_index(sentences: List[str], outdir: Path) -> None:
+BLOQUE_TFIDF = 50_000   # oraciones por bloque (conteo de df y filas de la matriz)
+MAX_ARCHIVOS_MEZCLA = 64   # archivos df abiertos a la vez al mezclar (límite de descriptores)
+
+# Índice en disco: outdir/DIR_INDICE/ con arreglos .npy que se abren con mmap
+DIR_INDICE = "cowese_tfidf"
+VERSION_INDICE = 2   # subir si cambia el formato: los índices anteriores se rechazan
+
+STOP_WORDS_ES = [
+    "de","la","que","el","en","y","a","los","del","se","las","por","un","para","con",
+    "no","una","su","al","lo","como","más","mas","pero","sus","le","ya","o","este","sí","si","porque","esta",
+    "entre","cuando","muy","sin","sobre","también","tambien","me","hasta","hay","donde","quien"
+]
+TOKEN_RE = r"(?u)\b\w\w+\b"   # token_pattern por defecto de TfidfVectorizer
+NGRAMAS = (1, 2)
+MIN_DF, MAX_DF = 2, 0.8
+
+_TOKEN = re.compile(TOKEN_RE)
+_STOP = frozenset(STOP_WORDS_ES)
+
+def _vectorizador():
     from sklearn.feature_extraction.text import TfidfVectorizer
-    spanish_sw = [
-        "de","la","que","el","en","y","a","los","del","se","las","por","un","para","con",
-        "no","una","su","al","lo","como","más","mas","pero","sus","le","ya","o","este","sí","si","porque","esta",
-        "entre","cuando","muy","sin","sobre","también","tambien","me","hasta","hay","donde","quien"
-    ]
-    vectorizer = TfidfVectorizer(
+    return TfidfVectorizer(
         lowercase=True,
-        stop_words=spanish_sw,
-        max_df=0.8,
-        min_df=2,
-        ngram_range=(1,2)
+        stop_words=STOP_WORDS_ES,
+        token_pattern=TOKEN_RE,
+        max_df=MAX_DF,
+        min_df=MIN_DF,
+        ngram_range=NGRAMAS
     )
-    X = vectorizer.fit_transform(sentences)
-    with open(outdir / "cowese_vectorizer.pkl", "wb") as f:
-        pickle.dump(vectorizer, f)
-    with open(outdir / "cowese_tfidf.pkl", "wb") as f:
-        pickle.dump(X, f)
-    print(f"[OK] Índice TF-IDF creado. {X.shape[0]} oraciones, vocab {len(vectorizer.vocabulary_)}")
+
+def _params_analizador() -> dict:
+    """Parámetros que fijan los términos y el idf; van en el encabezado del índice."""
+    return {"lowercase": True, "token_pattern": TOKEN_RE, "ngram_range": list(NGRAMAS),
+            "stop_words": STOP_WORDS_ES, "min_df": MIN_DF, "max_df": MAX_DF}
+
+def analizar(texto: str) -> List[str]:
+    """
+    Términos de `texto` como el analizador de _vectorizador() (minúsculas,
+    tokens de 2+ caracteres sin stop words, n-gramas de NGRAMAS) sin importar
+    sklearn: la consulta no carga el vectorizador.
+    """
+    tokens = [t for t in _TOKEN.findall(texto.lower()) if t not in _STOP]
+    terminos = []
+    for n in range(NGRAMAS[0], NGRAMAS[1] + 1):
+        terminos += [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+    return terminos
+
+def _bloques(oraciones: Iterable[str], tamano: int = BLOQUE_TFIDF) -> Iterable[List[str]]:
+    it = iter(oraciones)
+    return iter(lambda: list(itertools.islice(it, tamano)), [])
+
+def _leer_df(ruta: Path) -> Iterable[Tuple[str, int]]:
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            termino, n = linea.rstrip("\n").split("\t")
+            yield termino, int(n)
+
+def contar_df(oraciones: Iterable[str], analizador, dir_tmp: Path) -> Tuple[int, List[Path]]:
+    """
+    Primera pasada: frecuencia de documento de cada término (unigramas y
+    bigramas) por bloque; cada bloque se escribe ordenado por término en
+    df_NNNN.tsv, así el vocabulario completo nunca está en memoria.
+    """
+    n_docs, archivos = 0, []
+    for num, bloque in enumerate(_bloques(oraciones)):
+        df = {}
+        for sentence in bloque:
+            for termino in set(analizador(sentence)):
+                df[termino] = df.get(termino, 0) + 1
+        ruta = dir_tmp / f"df_{num:04d}.tsv"
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.writelines(f"{t}\t{n}\n" for t, n in sorted(df.items()))
+        archivos.append(ruta)
+        n_docs += len(bloque)
+    return n_docs, archivos
+
+def _mezcla(archivos: List[Path]) -> Iterable[Tuple[str, int]]:
+    """(término, df sumado) en orden alfabético a partir de archivos df ordenados."""
+    import heapq
+    flujos = [_leer_df(r) for r in archivos]
+    for termino, grupo in itertools.groupby(heapq.merge(*flujos), key=lambda x: x[0]):
+        yield termino, sum(c for _, c in grupo)
+
+def reducir_corridas(archivos: List[Path], dir_tmp: Path, max_abiertos: int = MAX_ARCHIVOS_MEZCLA) -> List[Path]:
+    """
+    Mezcla por pasadas, de a `max_abiertos` archivos, en corridas intermedias
+    (df sumado, sin podar) hasta que quedan `max_abiertos` o menos: un corpus
+    con miles de bloques no abre miles de archivos a la vez.
+    """
+    pasada = 0
+    while len(archivos) > max_abiertos:
+        nuevos = []
+        for i in range(0, len(archivos), max_abiertos):
+            grupo = archivos[i:i + max_abiertos]
+            if len(grupo) == 1:
+                nuevos.append(grupo[0])
+                continue
+            ruta = dir_tmp / f"df_p{pasada}_{i // max_abiertos:04d}.tsv"
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.writelines(f"{t}\t{n}\n" for t, n in _mezcla(grupo))
+            for r in grupo:
+                r.unlink()
+            nuevos.append(ruta)
+        archivos = nuevos
+        pasada += 1
+    return archivos
+
+def vocabulario_podado(archivos: List[Path], n_docs: int, min_df, max_df, destino: Path):
+    """
+    Mezcla los archivos df (heapq.merge: ya vienen ordenados; a lo más
+    MAX_ARCHIVOS_MEZCLA, ver reducir_corridas) y se queda con
+    los términos con min_df <= df <= max_df, igual que TfidfVectorizer
+    (entero = número de oraciones, float = proporción). Mientras mezcla
+    escribe en `destino` el vocabulario del índice: vocabulario.bin (términos
+    en UTF-8, uno tras otro en orden) y vocabulario_pos.npy (int64, inicio de
+    cada término más el final). Devuelve (vocabulario término -> columna en
+    orden alfabético, df por columna).
+    """
+    import numpy as np
+    from array import array
+    alto = max_df if isinstance(max_df, int) else max_df * n_docs
+    bajo = min_df if isinstance(min_df, int) else min_df * n_docs
+    if alto < bajo:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    vocab, dfs, pos = {}, array("q"), array("q", [0])
+    with open(destino / "vocabulario.bin", "wb") as f:
+        for termino, n in _mezcla(archivos):
+            if bajo <= n <= alto:
+                vocab[termino] = len(vocab)
+                dfs.append(n)
+                pos.append(pos[-1] + f.write(termino.encode("utf-8")))
+    if not vocab:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+    np.save(destino / "vocabulario_pos.npy", np.frombuffer(pos, dtype=np.int64))
+    return vocab, np.frombuffer(dfs, dtype=np.int64).astype(np.float64)
+
+def buscar_termino(blob, pos, termino: str) -> int:
+    """
+    Columna de `termino` por búsqueda binaria sobre vocabulario.bin /
+    vocabulario_pos.npy (el orden de bytes UTF-8 es el de los códigos, el
+    mismo de sorted()); -1 si no está. Solo toca log2(n) términos.
+    """
+    clave = termino.encode("utf-8")
+    lo, hi = 0, len(pos) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if bytes(blob[pos[mid]:pos[mid + 1]]) < clave:
+            lo = mid + 1
+        else:
+            hi = mid
+    if lo < len(pos) - 1 and bytes(blob[pos[lo]:pos[lo + 1]]) == clave:
+        return lo
+    return -1
+
+def _posiciones_oraciones(ruta: Path, destino) -> int:
+    """
+    Byte donde empieza cada fila de cowese_sentences.csv (sin encabezado) en
+    `destino`. Cada fila es una línea: las oraciones no traen saltos de línea.
+    """
+    import numpy as np
+    i = 0
+    with open(ruta, "rb") as f:
+        inicio = len(f.readline())
+        for lote in _bloques(f):
+            largos = np.fromiter(map(len, lote), dtype=np.int64, count=len(lote))
+            destino[i:i + len(lote)] = inicio + np.cumsum(largos) - largos
+            inicio += int(largos.sum())
+            i += len(lote)
+    return i
+
+def build_tfidf_index(outdir: Path) -> None:
+    """
+    Índice TF-IDF fuera de memoria sobre cowese_sentences.csv (dos pasadas):
+    1) df por bloques en disco y vocabulario podado (contar_df, vocabulario_podado)
+    2) idf suavizado como TfidfVectorizer y matriz normalizada L2 por bloques
+       de filas (bloque_NNNN.npz)
+    Los bloques se trasponen sobre arreglos .npy mapeados en memoria: CSR por
+    término (data / indices = oración / indptr), así una consulta solo lee las
+    listas de sus términos. Más vocabulario.bin + vocabulario_pos.npy (términos
+    ordenados en UTF-8, columna = posición; ver vocabulario_podado), idf.npy, posiciones.npy (byte de cada oración en el CSV) y
+    encabezado.json con la versión del formato, que se escribe al final.
+    """
+    import numpy as np
+    import scipy.sparse as sp
+    from numpy.lib.format import open_memmap
+    vectorizer = _vectorizador()
+    ruta_oraciones = outdir / "cowese_sentences.csv"
+    destino = outdir / DIR_INDICE
+    dir_tmp = outdir / "_tfidf"
+    shutil.rmtree(dir_tmp, ignore_errors=True)
+    dir_tmp.mkdir(parents=True)
+    try:
+        n_docs, archivos = contar_df(leer_oraciones(outdir), vectorizer.build_analyzer(), dir_tmp)
+        archivos = reducir_corridas(archivos, dir_tmp)
+        nuevo = dir_tmp / DIR_INDICE
+        nuevo.mkdir()
+        vocab, df = vocabulario_podado(archivos, n_docs, vectorizer.min_df, vectorizer.max_df, nuevo)
+        for r in archivos:
+            r.unlink()
+        # idf = ln((1 + n) / (1 + df)) + 1, mismas operaciones que TfidfTransformer
+        idf = np.full_like(df, fill_value=n_docs + 1)
+        idf /= df + 1
+        np.log(idf, out=idf)
+        idf += 1.0
+        vectorizer.vocabulary_ = vocab
+        vectorizer.idf_ = idf
+
+        bloques, por_termino = [], np.zeros(len(vocab), dtype=np.int64)
+        for num, bloque in enumerate(_bloques(leer_oraciones(outdir))):
+            Xb = vectorizer.transform(bloque).tocsc()
+            por_termino += np.diff(Xb.indptr)
+            ruta = dir_tmp / f"bloque_{num:04d}.npz"
+            sp.save_npz(ruta, Xb)
+            bloques.append(ruta)
+
+        indptr = open_memmap(nuevo / "indptr.npy", mode="w+", dtype=np.int64, shape=(len(vocab) + 1,))
+        indptr[0] = 0
+        np.cumsum(por_termino, out=indptr[1:])
+        nnz = int(indptr[-1])
+        data = open_memmap(nuevo / "data.npy", mode="w+", dtype=np.float64, shape=(nnz,))
+        indices = open_memmap(nuevo / "indices.npy", mode="w+",
+                              dtype=np.int32 if n_docs < 2**31 else np.int64, shape=(nnz,))
+        cursor = np.array(indptr[:-1])
+        fila0 = 0
+        for ruta in bloques:
+            Xb = sp.load_npz(ruta)   # CSC: por término, oraciones en orden
+            cuantos = np.diff(Xb.indptr)
+            col = np.repeat(np.arange(len(vocab)), cuantos)
+            dest = cursor[col] + (np.arange(Xb.nnz) - Xb.indptr[col])
+            data[dest] = Xb.data
+            indices[dest] = Xb.indices + fila0
+            cursor += cuantos
+            fila0 += Xb.shape[0]
+            ruta.unlink()
+        posiciones = open_memmap(nuevo / "posiciones.npy", mode="w+", dtype=np.int64, shape=(n_docs,))
+        if _posiciones_oraciones(ruta_oraciones, posiciones) != n_docs:
+            raise RuntimeError(f"{ruta_oraciones}: filas distintas de las oraciones indexadas")
+        for arr in (indptr, data, indices, posiciones):
+            arr.flush()
+        del indptr, data, indices, posiciones
+        np.save(nuevo / "idf.npy", idf)
+        encabezado = {"formato": "cowese_tfidf", "version": VERSION_INDICE, "orientacion": "termino",
+                      "analizador": _params_analizador(), "n_oraciones": n_docs,
+                      "n_terminos": len(vocab), "nnz": nnz,
+                      "bytes_oraciones": ruta_oraciones.stat().st_size}
+        with open(nuevo / "encabezado.json", "w", encoding="utf-8") as f:
+            json.dump(encabezado, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(destino, ignore_errors=True)
+        nuevo.rename(destino)
+    finally:
+        shutil.rmtree(dir_tmp, ignore_errors=True)
+    print(f"[OK] Índice TF-IDF creado. {n_docs} oraciones, vocab {len(vocab)} en {destino}")
+
+def abrir_indice(outdir: Path) -> dict:
+    """
+    Arreglos del índice con np.load(mmap_mode="r"): abrirlo no lee la matriz,
+    solo se cargan las páginas que toca la consulta. SystemExit si falta, es
+    de otra versión del formato o ya no corresponde a cowese_sentences.csv.
+    """
+    import numpy as np
+    d = outdir / DIR_INDICE
+    try:
+        enc = json.loads((d / "encabezado.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        previo = " (hay un cowese_tfidf.pkl de una versión anterior)" if (outdir / "cowese_tfidf.pkl").exists() else ""
+        raise SystemExit(f"[ERROR] No hay índice TF-IDF en {d}{previo}: reconstrúyelo con --cowese")
+    if enc.get("formato") != "cowese_tfidf" or enc.get("version") != VERSION_INDICE:
+        raise SystemExit(f"[ERROR] Índice TF-IDF en {d} con formato versión {enc.get('version')} "
+                         f"(se espera {VERSION_INDICE}): reconstrúyelo con --cowese")
+    if enc.get("analizador") != _params_analizador():
+        raise SystemExit(f"[ERROR] Índice TF-IDF en {d} creado con otro analizador: reconstrúyelo con --cowese")
+    idx = {n: np.load(d / f"{n}.npy", mmap_mode="r")
+           for n in ("vocabulario_pos", "idf", "indptr", "indices", "data", "posiciones")}
+    idx["vocabulario"] = np.memmap(d / "vocabulario.bin", dtype=np.uint8, mode="r")
+    ruta_oraciones = outdir / "cowese_sentences.csv"
+    if (len(idx["vocabulario_pos"]) != enc["n_terminos"] + 1
+            or idx["vocabulario_pos"][-1] != len(idx["vocabulario"]) or len(idx["data"]) != enc["nnz"]
+            or len(idx["posiciones"]) != enc["n_oraciones"]
+            or (ruta_oraciones.exists() and ruta_oraciones.stat().st_size != enc["bytes_oraciones"])):
+        raise SystemExit(f"[ERROR] Índice TF-IDF en {d} no corresponde a {ruta_oraciones}: reconstrúyelo con --cowese")
+    idx["encabezado"] = enc
+    return idx
 
 def tfidf_search(query: str, outdir: Path, topk: int = 10) -> pd.DataFrame:
-    with open(outdir / "cowese_vectorizer.pkl", "rb") as f:
-        vectorizer = pickle.load(f)
-    with open(outdir / "cowese_tfidf.pkl", "rb") as f:
-        X = pickle.load(f)
-    qv = vectorizer.transform([query])
     import numpy as np
-    sims = (X @ qv.T).toarray().ravel()
-    top_idx = np.argsort(-sims)[:topk]
+    idx = abrir_indice(outdir)
+    indptr = idx["indptr"]
+    # vector de la consulta: tf * idf normalizado L2, como vectorizer.transform
+    tf = {}
+    for termino in analizar(query):
+        j = buscar_termino(idx["vocabulario"], idx["vocabulario_pos"], termino)
+        if j >= 0:
+            tf[j] = tf.get(j, 0) + 1
+    cols = sorted(tf)
+    pesos = np.array([tf[j] for j in cols], dtype=np.float64) * idx["idf"][cols]
+    if len(cols):
+        pesos /= np.sqrt(np.sum(pesos * pesos))
+    # similitud coseno: solo las listas de oraciones de los términos de la consulta
+    filas = [idx["indices"][indptr[j]:indptr[j + 1]] for j in cols]
+    if filas:
+        filas, inv = np.unique(np.concatenate(filas), return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(
+            [idx["data"][indptr[j]:indptr[j + 1]] * w for j, w in zip(cols, pesos)]))
+    else:
+        filas, scores = np.array([], dtype=np.int64), np.array([])
+    orden = np.lexsort((filas, -scores))[:topk]
+    top_idx, top_scores = filas[orden].astype(np.int64), scores[orden]
+    faltan = min(topk, idx["encabezado"]["n_oraciones"]) - len(top_idx)
+    if faltan > 0:   # menos coincidencias que topk: se completa con oraciones de score 0
+        ceros = np.setdiff1d(np.arange(len(top_idx) + faltan), top_idx)[:faltan]
+        top_idx, top_scores = np.concatenate([top_idx, ceros]), np.concatenate([top_scores, np.zeros(faltan)])
     sentences_csv = outdir / "cowese_sentences.csv"
     if sentences_csv.exists():
-        df_sent = pd.read_csv(sentences_csv)
-        subset = df_sent.iloc[top_idx][["doc_id","sent_id","sentence"]].copy()
+        filas_csv = []
+        with open(sentences_csv, "rb") as f:
+            for i in top_idx:
+                f.seek(int(idx["posiciones"][i]))
+                filas_csv.append(next(csv.reader([f.readline().decode("utf-8")])))
+        subset = pd.DataFrame(filas_csv, columns=["doc_id","sent_id","sentence"]).astype({"doc_id": "int64", "sent_id": "int64"})
     else:
-        subset = pd.DataFrame({"idx": top_idx, "score": sims[top_idx]})
-    subset["score"] = sims[top_idx]
+        subset = pd.DataFrame({"idx": top_idx})
+    subset["score"] = top_scores
     return subset.reset_index(drop=True)
 
 # ============ Pipeline principal ============
 def process_cowese(cowese_path: Path, outdir: Path, limit_docs: Optional[int] = None):
+    """
+    Una pasada en streaming: cada oración se escribe (con sus menciones) por
+    lotes de LOTE_FILAS filas; la memoria no depende del tamaño del corpus.
+    """
     outdir.mkdir(parents=True, exist_ok=True)
-    sentences = []
-    with cowese_path.open("r", encoding="utf-8", errors="ignore") as f:
+    with cowese_path.open("r", encoding="utf-8", errors="ignore") as f, \
+         open(outdir / "cowese_sentences.csv", "w", newline="", encoding="utf-8") as fs, \
+         open(outdir / "cowese_matches.csv", "w", newline="", encoding="utf-8") as fm:
+        ws, wm = csv.writer(fs, lineterminator="\n"), csv.writer(fm, lineterminator="\n")
+        ws.writerow(["doc_id", "sent_id", "sentence"])
+        wm.writerow(["doc_id", "sent_id", "sentence", "keyword", "cie10"])
         doc_id = 0
-        for sentence in iter_sentences(f):
-            sentences.append((doc_id, len(sentences), sentence))
-            if limit_docs and len(sentences) >= limit_docs:
-                break
-        print(f"[OK] Se extrajeron {len(sentences)} oraciones")
-    df_sent = pd.DataFrame(sentences, columns=["doc_id","sent_id","sentence"])
-    df_sent.to_csv(outdir / "cowese_sentences.csv", index=False)
-
-    rows = []
-    for _, row in df_sent.iterrows():
-        s = row["sentence"]
-        hits = find_mentions(s, KEYS_TO_CIE10)
-        for k, code in hits:
-            rows.append({
-                "doc_id": row["doc_id"],
-                "sent_id": row["sent_id"],
-                "sentence": s,
-                "keyword": k,
-                "cie10": code
-            })
-    df_matches = pd.DataFrame(rows, columns=["doc_id","sent_id","sentence","keyword","cie10"])
-    df_matches.to_csv(outdir / "cowese_matches.csv", index=False, quoting=csv.QUOTE_MINIMAL)
-    print(f"[OK] Matches guardados: {len(df_matches)} filas en {outdir/'cowese_matches.csv'}")
-
-    build_tfidf_index(df_sent["sentence"].tolist(), outdir)
+        oraciones = itertools.islice(iter_sentences(f), limit_docs) if limit_docs else iter_sentences(f)
+        n_sent, n_match = escribir_en_lotes(
+            oraciones, ws, wm,
+            fila_oracion=lambda i, s: (doc_id, i, s),
+            fila_mencion=lambda i, s, k, code: (doc_id, i, s, k, code))
+    print(f"[OK] Se extrajeron {n_sent} oraciones")
+    print(f"[OK] Matches guardados: {n_match} filas en {outdir/'cowese_matches.csv'}")
+
+    build_tfidf_index(outdir)
 
 def main():
     ap = argparse.ArgumentParser(description="Procesar CoWeSe.txt para BD heterogénea.")
@@ -187,7 +720,10 @@ def main():
     ap.add_argument("--outdir", type=str, default="./Textos")
     ap.add_argument("--limit", type=int, default=None, help="Limitar número de oraciones")
     ap.add_argument("--query", type=str, default=None, help="Consulta sobre el índice TF-IDF ya creado")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="Procesos para segmentar y buscar menciones por fragmentos; 0 = todos los núcleos")
     args = ap.parse_args()
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
 
     outdir = Path(args.outdir).resolve()
     if args.query:
@@ -202,7 +738,12 @@ def main():
     if not cowese_path.exists():
         raise SystemExit(f"No existe el archivo: {cowese_path}")
 
-    process_cowese(cowese_path, outdir, limit_docs=args.limit)
+    if jobs > 1 and args.limit:
+        print("[INFO] --limit corta el corpus en orden: se procesa en un solo proceso")
+    if jobs > 1 and not args.limit:
+        process_cowese_paralelo(cowese_path, outdir, jobs)
+    else:
+        process_cowese(cowese_path, outdir, limit_docs=args.limit)
 
 if __name__ == "__main__":
     main()
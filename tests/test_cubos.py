@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Enrutamiento a cubos (Scripts/cubos.py): solo se reescriben las consultas que
+agregan; las que piden filas sueltas van a los hechos.
+
+    python -m pytest -q tests
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Scripts"))
+from cubos import crear_cubos, enrutar_sql
+
+FILAS = [   # anio, entidad_norm, edad_quinquenal, sexo, cie10_code, valor
+    (2015, "JALISCO", "20-24", "H", "F10", 3),
+    (2015, "JALISCO", "20-24", "H", "F10", 3),
+    (2015, "SONORA",  "25-29", "M", "F10", 1),
+    (2015, "SONORA",  "25-29", "M", "F12", 2),
+    (2016, "JALISCO", "30-34", "H", "F10", 5),
+    (2016, "SONORA",  "20-24", "M", "F14", 4),
+]
+
+@pytest.fixture
+def con():
+    con = sqlite3.connect(":memory:")
+    for tabla in ("fact_defunciones", "fact_urgencias"):
+        con.execute(f"CREATE TABLE {tabla} (anio INTEGER, entidad_norm TEXT, edad_quinquenal TEXT, "
+                    "sexo TEXT, cie10_code TEXT, valor INTEGER)")
+        con.executemany(f"INSERT INTO {tabla} VALUES (?,?,?,?,?,?)", FILAS)
+    con.execute("""CREATE VIEW v_eventos AS
+        SELECT anio, entidad_norm, edad_quinquenal, sexo, cie10_code, valor, 'defunciones' AS fuente
+          FROM fact_defunciones
+        UNION ALL
+        SELECT anio, entidad_norm, edad_quinquenal, sexo, cie10_code, valor, 'urgencias' AS fuente
+          FROM fact_urgencias""")
+    crear_cubos(con)
+    yield con
+    con.close()
+
+@pytest.mark.parametrize("sql", [
+    "SELECT anio, cie10_code FROM v_eventos WHERE anio=2015",
+    "SELECT anio FROM v_eventos WHERE cie10_code='F10'",
+    "SELECT * FROM fact_defunciones LIMIT 3",
+    "SELECT anio, SUM(valor) FROM v_eventos",
+    "SELECT anio, SUM(valor) FROM v_eventos GROUP BY cie10_code",
+    "SELECT valor FROM fact_urgencias WHERE anio=2016",
+])
+def test_filas_sueltas_no_se_enrutan(con, sql):
+    assert enrutar_sql(sql, con) == sql
+
+@pytest.mark.parametrize("sql", [
+    "SELECT anio, SUM(valor) AS total FROM v_eventos WHERE cie10_code='F10' GROUP BY anio ORDER BY anio",
+    "SELECT sexo, COUNT(*) AS n FROM fact_defunciones GROUP BY sexo ORDER BY sexo",
+    "SELECT SUM(valor) AS total, COUNT(*) AS n FROM fact_urgencias WHERE anio=2015",
+])
+def test_agregaciones_mismo_resultado(con, sql):
+    enrutada = enrutar_sql(sql, con)
+    assert "cubo_" in enrutada
+    assert con.execute(enrutada).fetchall() == con.execute(sql).fetchall()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Refresco de mv_unificado (Scripts/crear_vista_unificada.py): las filas
+repetidas se comparan por copia, no solo por existencia.
+
+    python -m pytest -q tests
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Scripts"))
+from crear_vista_unificada import TABLA_MAT, VISTA_CALCULO, crear_vistas, materializar_unificado, refrescar_unificado
+
+FILA = (2015, "JALISCO", "20-24", "H", "F10", 3, "defunciones")
+
+@pytest.fixture
+def con():
+    con = sqlite3.connect(":memory:")
+    con.execute("CREATE TABLE cie10_nodes (code TEXT, descripcion TEXT)")
+    con.execute("CREATE TABLE cie10_edges (source TEXT, target TEXT, rel_type TEXT)")
+    for tabla in ("fact_defunciones", "fact_urgencias"):
+        con.execute(f"CREATE TABLE {tabla} (anio INTEGER, entidad_norm TEXT, edad_quinquenal TEXT, "
+                    "sexo TEXT, cie10_code TEXT, valor INTEGER, fuente TEXT)")
+    con.executemany("INSERT INTO fact_defunciones VALUES (?,?,?,?,?,?,?)", [FILA] * 3)
+    crear_vistas(con.cursor(), VISTA_CALCULO)
+    materializar_unificado(con)
+    yield con
+    con.close()
+
+def _filas(con, tabla):
+    return sorted(con.execute(f"SELECT origen, id_origen, valor FROM {tabla} WHERE origen='sql_defunciones'"))
+
+@pytest.mark.parametrize("copias, cambio", [(2, (1, 0)), (5, (0, 2)), (0, (3, 0))])
+def test_refresco_respeta_repetidas(con, copias, cambio):
+    con.execute("DELETE FROM fact_defunciones")
+    con.executemany("INSERT INTO fact_defunciones VALUES (?,?,?,?,?,?,?)", [FILA] * copias)
+    ids = {r[0] for r in con.execute(f"SELECT id_fila FROM {TABLA_MAT}")}
+    assert refrescar_unificado(con, ["sql_defunciones"], [2015]) == {"sql_defunciones": cambio}
+    assert _filas(con, TABLA_MAT) == _filas(con, VISTA_CALCULO)
+    conservadas = {r[0] for r in con.execute(f"SELECT id_fila FROM {TABLA_MAT}")} & ids
+    assert len(conservadas) == min(copias, 3)